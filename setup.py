@@ -102,6 +102,11 @@ Xeda can assists hardware developers during verification, evaluation, and deploy
     entry_points={
         'console_scripts': [
             'xeda=xeda:cli.run_xeda',
+            'xeda-agent=xeda.flow_runner.remote:agent_main',
+            'xeda-gc=xeda.flow_runner.store:gc_main',
+            'xeda-archive=xeda.flow_runner.archive:archive_main',
+            'xeda-util=xeda.flows.vivado.utilization:utilization_main',
+            'xeda-timing=xeda.flows.vivado.timing:timing_main',
         ],
     },
     cmdclass=dict(install=InstallWrapper, develop=DevelopWrapper),
@@ -0,0 +1,52 @@
+from types import SimpleNamespace
+
+from xeda.debug import DebugLevel
+from xeda.flow_runner.archive import archive_run_dir
+from xeda.flow_runner.default_runner import DefaultRunner
+from xeda.flows.flow import RUN_ARCHIVE, Flow
+
+
+class NetlistFlow(Flow):
+    def run(self):
+        (self.flow_run_dir / 'output').mkdir()
+        (self.flow_run_dir / 'output' / 'netlist.v').write_text('module top; endmodule\n')
+        (self.flow_run_dir / 'netlist.log').write_text('done\n')
+        self.results['success'] = True
+
+
+class NetlistSimFlow(Flow):
+    @classmethod
+    def prerequisite_flows(cls, flow_settings, design_settings):
+        return {NetlistFlow: ({}, {})}
+
+    def consumed_artifacts(self):
+        return [self.completed_dependencies[0].flow_run_dir / 'output' / 'netlist.v']
+
+    def run(self):
+        self.results['netlist'] = self.consumed_artifacts()[0].read_text()
+        self.results['success'] = True
+
+
+def make_runner(tmp_path):
+    runner = object.__new__(DefaultRunner)
+    runner.args = SimpleNamespace(xeda_run_dir=str(tmp_path / 'xeda_run'), debug=DebugLevel.NONE, force_run_dir=None,
+                                  force_rerun=False, use_stale=False, quiet=True, verbose=False)
+    runner.xeda_project = None
+    runner.all_settings = dict(flows={})
+    runner.artifact_store = None
+    runner.run_cache = None
+    return runner
+
+
+def test_dependent_of_archived_run(tmp_path):
+    design = {'name': 'test', 'rtl': {'sources': []}}
+    upstream = make_runner(tmp_path).launch_flow(NetlistFlow, {}, design, True)
+    assert archive_run_dir(upstream.flow_run_dir)['files'] == 2
+    assert not (upstream.flow_run_dir / 'output' / 'netlist.v').exists()
+
+    flow = make_runner(tmp_path).launch_flow(NetlistSimFlow, {}, design, True)
+    assert flow.results['success'] and flow.results['netlist'] == 'module top; endmodule\n'
+    # the archived upstream run was reused, not re-run
+    assert flow.completed_dependencies[0].results['timestamp'] == upstream.results['timestamp']
+    assert (upstream.flow_run_dir / 'netlist.log').exists()
+    assert not (upstream.flow_run_dir / RUN_ARCHIVE).exists()
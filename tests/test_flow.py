@@ -0,0 +1,60 @@
+from xeda.flows.flow import file_digest, stable_digest
+
+
+def test_stable_digest_ignores_timestamps(tmp_path):
+    a, b, c = tmp_path / 'a.saif', tmp_path / 'b.saif', tmp_path / 'c.saif'
+    a.write_text('(SAIFILE\n(SAIFVERSION "2.0")\n(DATE "Mon Oct 19 10:00:00 2026")\n(DURATION 100)\n)\n')
+    b.write_text('(SAIFILE\n(SAIFVERSION "2.0")\n(DATE "Tue Oct 20 11:30:00 2026")\n(DURATION 100)\n)\n')
+    c.write_text('(SAIFILE\n(SAIFVERSION "2.0")\n(DATE "Mon Oct 19 10:00:00 2026")\n(DURATION 200)\n)\n')
+    assert file_digest(a) != file_digest(b)
+    assert stable_digest(a) == stable_digest(b)
+    assert stable_digest(a) != stable_digest(c)
+
+
+def test_stable_digest_netlist_header(tmp_path):
+    a, b = tmp_path / 'a.v', tmp_path / 'b.v'
+    a.write_text('// Date        : Mon Oct 19 10:00:00 2026\n// Design      : top\nmodule top; endmodule\n')
+    b.write_text('// Date        : Tue Oct 20 11:30:00 2026\n// Design      : top\nmodule top; endmodule\n')
+    assert stable_digest(a) == stable_digest(b)
+
+
+def watchdog_limits(tmp_path, monkeypatch, flow_settings):
+    from tests.test_vivado_sim import make_sim_flow
+    from xeda.flows import flow as flow_module
+
+    limits = []
+
+    class Watchdog(flow_module.ProcessWatchdog):
+        def __init__(self, pgid, deadline=None, stall_timeout=None, **kwargs) -> None:
+            limits.append((deadline, stall_timeout))
+            super().__init__(pgid, deadline, stall_timeout, **kwargs)
+
+    monkeypatch.setattr(flow_module, 'ProcessWatchdog', Watchdog)
+    flow = make_sim_flow(tmp_path, flow_settings)
+    flow.args.quiet = True
+    flow.args.verbose = False
+    flow.run_process('true', [])
+    return limits
+
+
+def test_run_process_no_limits_by_default(tmp_path, monkeypatch):
+    assert watchdog_limits(tmp_path, monkeypatch, {}) == [(None, None)]
+
+
+def test_run_process_limits_from_settings(tmp_path, monkeypatch):
+    [(deadline, stall_timeout)] = watchdog_limits(tmp_path, monkeypatch, {'timeout': 60, 'stall_timeout': 30})
+    assert deadline is not None and stall_timeout == 30
+
+
+def test_sync_outputs_only_declared(tmp_path):
+    from tests.test_vivado_sim import make_sim_flow
+
+    flow = make_sim_flow(tmp_path, {'run_configs': [dict(name='rc1', generics={'G_FNAME_LOG': 'rc1_LWCTB_log.txt', 'G_MAX': '8'})]})
+    src, dst = tmp_path / 'scratch', tmp_path / 'run'
+    for rel in ('settings.json', 'xsim_rc1.log', 'rc1_LWCTB_log.txt', 'rc1.saif', 'reports/summary.rpt', 'xsim.dir/work/top.vdb',
+                'webtalk.jou', '8'):
+        (src / rel).parent.mkdir(parents=True, exist_ok=True)
+        (src / rel).write_text(rel)
+    flow.sync_outputs(src, dst)
+    assert sorted(str(p.relative_to(dst)) for p in dst.rglob('*') if p.is_file()) == \
+        ['rc1.saif', 'rc1_LWCTB_log.txt', 'reports/summary.rpt', 'settings.json', 'xsim_rc1.log']
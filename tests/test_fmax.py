@@ -0,0 +1,82 @@
+from concurrent.futures import Future, TimeoutError
+
+from xeda.flow_runner.fmax import AdaptiveTimeout, FmaxRunner
+
+
+def test_adaptive_timeout_follows_slowest_run():
+    timeout = AdaptiveTimeout(3600, factor=3, min_timeout=10, min_samples=4)
+    for d in (100, 110, 120):
+        timeout.add(d)
+    assert timeout.value == 3600
+    timeout.add(900)
+    assert timeout.value == 2700
+    assert timeout.is_adaptive(2700)
+    assert not timeout.is_adaptive(3600)
+
+
+class FakePool:
+    """runs which are scheduled with a timeout smaller than their duration time out"""
+    capacity = 1
+    poll_interval = 0.01
+    admission = None
+
+    def __init__(self, durations):
+        self.durations = durations
+        self.scheduled = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def can_schedule(self):
+        return True
+
+    def schedule(self, fn, flow, timeout=None):
+        self.scheduled.append((flow, timeout))
+        future = Future()
+        if timeout is not None and self.durations[flow] > timeout:
+            future.set_exception(TimeoutError('timeout', timeout))
+        else:
+            future.set_result(({'success': True}, None, None))
+        return future
+
+
+def test_adaptive_timeout_kill_is_retried_with_max_timeout():
+    runner = object.__new__(FmaxRunner)
+    runner.ingest_artifacts = lambda *args: None
+    runner.load_flowclass = lambda name: None
+    runner.args = type('Args', (), {'flow': 'vivado_synth'})()
+
+    timeout = AdaptiveTimeout(3600, factor=1, min_timeout=1, min_samples=1)
+    timeout.add(100)
+    pool = FakePool({'slow': 1000})
+    candidates = ['slow']
+    done, retried = [], []
+    runner.run_pool(pool, timeout, lambda: (candidates[0], candidates.pop()) if candidates else None,
+                    on_done=lambda key, results, *args: done.append((key, results)), on_cancel=lambda key: None,
+                    on_retry=retried.append)
+    assert pool.scheduled == [('slow', 100), ('slow', 3600)]
+    assert retried == ['slow']
+    assert done == [('slow', {'success': True})]
+
+
+def test_redundant_runs_are_not_retried():
+    runner = object.__new__(FmaxRunner)
+    runner.ingest_artifacts = lambda *args: None
+    runner.load_flowclass = lambda name: None
+    runner.args = type('Args', (), {'flow': 'vivado_synth'})()
+
+    timeout = AdaptiveTimeout(3600, factor=1, min_timeout=1, min_samples=1)
+    timeout.add(100)
+    pool = FakePool({'slow': 1000, 'fast': 10})
+    pool.capacity = 2
+    candidates = ['fast', 'slow']
+    done, cancelled = [], []
+    runner.run_pool(pool, timeout, lambda: (candidates[-1], candidates.pop()) if candidates else None,
+                    on_done=lambda key, results, *args: done.append(key), on_cancel=cancelled.append,
+                    is_redundant=lambda key: key == 'slow' and 'fast' in done, on_retry=lambda key: None)
+    assert [flow for flow, _ in pool.scheduled].count('slow') == 1
+    assert done == ['fast']
+    assert cancelled == ['slow']
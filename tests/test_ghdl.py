@@ -0,0 +1,48 @@
+import threading
+from types import SimpleNamespace
+
+from xeda.debug import DebugLevel
+from xeda.flows.flow import DesignSource
+from xeda.flows.ghdl import GhdlSim
+from xeda.flows.settings import Settings
+
+
+def make_ghdl_flow(tmp_path, name):
+    (tmp_path / 'top.vhd').write_text('entity top is\nend entity;\n')
+    settings = Settings()
+    settings.design = {'name': 'test', 'language': {'vhdl': {'standard': '08'}},
+                       'rtl': {'sources': [DesignSource(str(tmp_path / 'top.vhd'))]}, 'tb': {'sources': [], 'top': 'top'}}
+    settings.flow = {'incremental': True}
+    args = SimpleNamespace(xeda_run_dir=str(tmp_path / 'xeda_run'), debug=DebugLevel.NONE, force_run_dir=None, verbose=False, quiet=True)
+    flow = GhdlSim(settings, args, [])
+    flow.flow_run_dir = tmp_path / name
+    flow.flow_run_dir.mkdir()
+    return flow
+
+
+def test_incremental_workdir_is_locked(tmp_path, monkeypatch):
+    """concurrent runs of the same design don't use the shared work library at the same time"""
+    flows = [make_ghdl_flow(tmp_path, f'run{i}') for i in range(2)]
+    active = []
+    overlaps = []
+    workdirs = set()
+
+    def run_process(prog, args, **kwargs):
+        workdirs.update(a for a in args if a.startswith('--workdir='))
+        active.append(prog)
+        if len(active) > 1:
+            overlaps.append(list(active))
+        threading.Event().wait(0.05)
+        active.remove(prog)
+
+    for flow in flows:
+        monkeypatch.setattr(flow, 'run_process', run_process)
+    threads = [threading.Thread(target=flow.run) for flow in flows]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(30)
+    assert len(workdirs) == 1
+    assert not overlaps
+    workdir = flows[0].incremental_workdir([])
+    assert not list(workdir.parent.glob('*.lock'))
@@ -0,0 +1,34 @@
+from xeda.flows.flow import DesignSource
+from xeda.flows.hdl_deps import order_sources
+
+
+def sources(tmp_path, files):
+    result = []
+    for name, text in files:
+        (tmp_path / name).write_text(text)
+        result.append(DesignSource(str(tmp_path / name)))
+    return result
+
+
+def names(srcs):
+    return [src.file.name for src in srcs]
+
+
+def test_order_sources(tmp_path):
+    srcs = sources(tmp_path, [('top.vhd', 'use work.pkg.all;\nentity top is\nend entity;\n'),
+                              ('pkg.vhd', 'package pkg is\nend package;\n')])
+    assert names(order_sources(srcs)) == ['pkg.vhd', 'top.vhd']
+
+
+def test_order_sources_keeps_order_on_ambiguity(tmp_path):
+    srcs = sources(tmp_path, [('top.vhd', 'use work.pkg.all;\nentity top is\nend entity;\n'),
+                              ('pkg.vhd', 'package pkg is\nend package;\n'),
+                              ('pkg_alt.vhd', 'package pkg is\nend package;\n')])
+    assert names(order_sources(srcs)) == ['top.vhd', 'pkg.vhd', 'pkg_alt.vhd']
+
+
+def test_order_sources_keeps_order_on_cycle(tmp_path):
+    srcs = sources(tmp_path, [('c.v', 'module c;\n  a u_a ();\nendmodule\n'),
+                              ('a.v', 'module a;\n  b u_b ();\nendmodule\n'),
+                              ('b.v', 'module b;\n  a u_a ();\nendmodule\n')])
+    assert names(order_sources(srcs)) == ['c.v', 'a.v', 'b.v']
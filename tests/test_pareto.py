@@ -0,0 +1,36 @@
+import os
+from types import SimpleNamespace
+
+from xeda.flow_runner.default_runner import FlowRunner
+from xeda.flow_runner.fmax import FmaxRunner
+from xeda.flow_runner.pareto import ParetoRunner
+from xeda.flow_runner.retention import RetentionPolicy
+
+
+def test_run_dir_names(monkeypatch):
+    monkeypatch.setattr(FlowRunner, '__init__', lambda self, args, xeda_project, timestamp: setattr(self, 'args', args))
+    for cls, name in ((FmaxRunner, 'fmax'), (ParetoRunner, 'pareto')):
+        runner = cls(SimpleNamespace(xeda_run_dir='xeda_run', force_run_dir=None), None, None)
+        assert runner.args.xeda_run_dir == os.path.join('xeda_run', name)
+
+
+def make_run(path):
+    (path / 'reports').mkdir(parents=True)
+    (path / 'results.json').write_text('{}')
+    (path / 'reports' / 'utilization.rpt').write_text('report')
+    (path / 'top.dcp').write_bytes(b'checkpoint')
+    return path
+
+
+def test_unranked_retention(tmp_path):
+    retention = RetentionPolicy(None)
+    runs = [make_run(tmp_path / f'run{i}') for i in range(3)]
+    for i, run in enumerate(runs):
+        assert retention.add_successful(100.0 + i, run) == []
+    assert all((run / 'top.dcp').exists() for run in runs)
+
+    retention.prune_dominated(runs[0])
+    assert [d for _, d in retention.top] == [runs[2], runs[1]]
+    assert not (runs[0] / 'top.dcp').exists()
+    assert (runs[0] / 'reports' / 'utilization.rpt.gz').exists()
+    assert (runs[0] / 'results.json').exists()
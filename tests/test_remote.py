@@ -0,0 +1,93 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from xeda.flow_runner import remote
+from xeda.flow_runner.remote import DEFAULT_ARTIFACTS, WorkerAgent, WorkerPool, is_loopback, run_job
+from xeda.flows.flow import Flow
+
+
+class EchoFlow(Flow):
+    def run(self):
+        (self.flow_run_dir / 'echo.log').write_text(self.settings.flow['message'])
+
+    def parse_reports(self):
+        self.results['message'] = (self.flow_run_dir / 'echo.log').read_text()
+        self.results['success'] = True
+
+
+def fake_run_job(spec, xeda_run_dir=None):
+    return dict(results={'success': True, 'index': spec['flow_settings']['index']}, run_hash=spec['run_hash'], artifacts={})
+
+
+def fake_flow(tmp_path, index):
+    return SimpleNamespace(name=f'flow{index}', flow_run_dir=tmp_path / f'run{index}', xedahash=f'hash{index}', xeda_run_dir=tmp_path,
+                           settings=SimpleNamespace(flow={'index': index}, design={}))
+
+
+def wait_for(condition, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, 'timed out'
+        time.sleep(0.05)
+
+
+def start_agent(address, token):
+    agent = WorkerAgent(f'{address[0]}:{address[1]}', cpus=1, token=token, once=True, retry_interval=0.1)
+    thread = threading.Thread(target=agent.run, daemon=True)
+    thread.start()
+    return thread
+
+
+def test_run_job(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    spec = dict(flow_class=f'{EchoFlow.__module__}:EchoFlow', flow_settings={'message': 'hello'},
+                design_settings={'name': 'echo', 'rtl': {'sources': []}}, xeda_run_dir=str(tmp_path / 'xeda_run'),
+                cwd=str(tmp_path), artifacts=DEFAULT_ARTIFACTS)
+    job = run_job(spec)
+    assert job['results']['success'] and job['results']['message'] == 'hello'
+    assert job['results']['flow.run_hash'] == job['run_hash']
+    assert {'echo.log', 'settings.json'} <= set(job['artifacts'])
+
+
+def test_is_loopback():
+    assert is_loopback('127.0.0.1')
+    assert is_loopback('::1')
+    assert is_loopback('localhost')
+    assert not is_loopback('0.0.0.0')
+    assert not is_loopback('10.1.2.3')
+
+
+def test_token_required_on_non_loopback():
+    with pytest.raises(ValueError):
+        WorkerPool(0, 1, listen='0.0.0.0:0')
+    with WorkerPool(0, 1, listen='0.0.0.0:0', token='secret') as pool:
+        assert pool.address[1] > 0
+    with WorkerPool(0, 1, listen='127.0.0.1:0') as pool:
+        assert pool.address[1] > 0
+
+
+def test_agents_on_localhost(tmp_path, monkeypatch):
+    monkeypatch.setattr(remote, 'run_job', fake_run_job)
+    with WorkerPool(0, 1, listen='127.0.0.1:0', token='secret') as pool:
+        agents = [start_agent(pool.address, 'secret') for _ in range(2)]
+        wait_for(lambda: len(pool.agents) == 2)
+        intruder = start_agent(pool.address, 'wrong')
+        intruder.join(10)
+        assert not intruder.is_alive()
+        assert pool.capacity == 2
+
+        futures = [pool.schedule(None, fake_flow(tmp_path, i)) for i in range(2)]
+        # one run on each agent
+        assert all(a.free_slots == 0 for a in pool.agents)
+        assert not pool.can_schedule()
+        for i, future in enumerate(futures):
+            results, settings, flow_run_dir = future.result(timeout=60)
+            assert results == {'success': True, 'index': i}
+            assert flow_run_dir == tmp_path / f'run{i}'
+        wait_for(pool.can_schedule)
+    for agent in agents:
+        agent.join(10)
+        assert not agent.is_alive()
@@ -0,0 +1,115 @@
+from pathlib import Path
+from types import SimpleNamespace
+
+from xeda.debug import DebugLevel
+from xeda.flows.flow import DesignSource
+from xeda.flows.settings import Settings
+from xeda.flows.vivado.vivado_sim import VivadoPostsynthSim, VivadoSim
+from xeda.flows.vivado.vivado_synth import VivadoSynth
+
+
+def make_args(tmp_path):
+    return SimpleNamespace(xeda_run_dir=str(tmp_path / 'xeda_run'), debug=DebugLevel.NONE, force_run_dir=None)
+
+
+def make_settings():
+    settings = Settings()
+    settings.design = {'name': 'test', 'rtl': {'sources': ['top.vhd']}, 'tb': {'sources': ['tb.vhd'], 'top': 'tb'}}
+    settings.flow = {}
+    return settings
+
+
+def test_postsynth_sim_init(tmp_path):
+    synth_run_dir = tmp_path / 'vivado_synth'
+    netlist = synth_run_dir / VivadoSynth.synth_output_dir / 'impl_timesim.v'
+    netlist.parent.mkdir(parents=True)
+    netlist.write_text('module top; endmodule\n')
+    synth_flow = SimpleNamespace(settings=SimpleNamespace(flow={'clock_period': 10.0}), results={'success': True},
+                                 flow_run_dir=synth_run_dir)
+    flow = VivadoPostsynthSim(make_settings(), make_args(tmp_path), [synth_flow])
+
+    # the base constructor has run
+    assert flow.results == {'success': False}
+    assert flow.args.debug == DebugLevel.NONE
+    assert flow.completed_dependencies == [synth_flow]
+
+    assert [Path(str(s.file)) for s in flow.settings.design['rtl']['sources']] == [netlist]
+    assert flow.settings.flow['elab_flags'][:2] == ['-relax', '-maxdelay']
+    assert flow.settings.design['tb']['top'] == ['tb', 'glbl']
+    assert flow.settings.design['tb']['generics']['G_PERIOD_PS'] == 10000
+    assert flow.consumed_artifacts() == [netlist.with_suffix('.sdf')]
+
+
+def make_sim_flow(tmp_path, flow_settings):
+    (tmp_path / 'pkg.vhd').write_text('package pkg is\nend package;\n')
+    (tmp_path / 'top.vhd').write_text('use work.pkg.all;\nentity top is\nend entity;\n')
+    (tmp_path / 'tb.vhd').write_text('entity tb is\nend entity;\narchitecture a of tb is\nbegin\n  uut: entity work.top;\nend architecture;\n')
+    (tmp_path / 'glue.v').write_text('module glue; endmodule\n')
+    settings = make_settings()
+    settings.design['rtl']['sources'] = [DesignSource(str(tmp_path / f)) for f in ('top.vhd', 'glue.v', 'pkg.vhd')]
+    settings.design['tb']['sources'] = [DesignSource(str(tmp_path / 'tb.vhd'))]
+    settings.flow = flow_settings
+    flow = VivadoSim(settings, make_args(tmp_path), [])
+    flow.flow_run_dir = tmp_path
+    return flow
+
+
+def analyze(flow, monkeypatch):
+    running = []
+    calls = []
+
+    def run_process(prog, args, **kwargs):
+        running.append(prog)
+        assert len(running) == 1, 'analysis processes must not run concurrently'
+        calls.append((prog, [Path(a).name for a in args if a.endswith(('.vhd', '.v'))]))
+        running.pop()
+
+    monkeypatch.setattr(flow, 'run_process', run_process)
+    flow.analyze_sources(['-relax'])
+    return calls
+
+
+def test_analyze_sources_keeps_given_order(tmp_path, monkeypatch):
+    flow = make_sim_flow(tmp_path, {})
+    assert analyze(flow, monkeypatch) == [('xvhdl', ['top.vhd']), ('xvlog', ['glue.v']), ('xvhdl', ['pkg.vhd', 'tb.vhd'])]
+
+
+def test_analyze_sources_ordered(tmp_path, monkeypatch):
+    flow = make_sim_flow(tmp_path, {'order_sources': True})
+    assert analyze(flow, monkeypatch) == [('xvhdl', ['pkg.vhd', 'top.vhd']), ('xvlog', ['glue.v']), ('xvhdl', ['tb.vhd'])]
+
+
+def run_parallel(flow, monkeypatch):
+    calls = []
+
+    def run_process(prog, args, **kwargs):
+        calls.append((prog, [str(a) for a in args], kwargs.get('cwd')))
+
+    monkeypatch.setattr(flow, 'run_process', run_process)
+    monkeypatch.setattr(flow, 'copy_from_template', lambda template, script_filename=None, **kwargs: script_filename)
+    run_configs = [dict(name=name, generics={'G_MAX': 8, 'G_FNAME_PDI': f'{name}_pdi.txt', 'G_FNAME_LOG': f'{name}.log'})
+                   for name in ('rc1', 'rc2')]
+    flow.run_parallel(run_configs, ['-relax'], 2, None)
+    return calls, run_configs
+
+
+def test_run_parallel_separate_elaborations_by_default(tmp_path, monkeypatch):
+    flow = make_sim_flow(tmp_path, {})
+    calls, run_configs = run_parallel(flow, monkeypatch)
+    elaborations = [args for prog, args, _ in calls if prog == 'xelab']
+    assert len(elaborations) == 2
+    for rc in run_configs:
+        elab = next(args for args in elaborations if f"tb_{rc['name']}" in args)
+        assert f"G_FNAME_PDI={rc['name']}_pdi.txt" in elab
+    assert all(cwd == tmp_path for prog, _, cwd in calls if prog == 'xsim')
+    assert set(flow.results['run_configs']) == {'rc1', 'rc2'}
+
+
+def test_run_parallel_shared_elaboration(tmp_path, monkeypatch):
+    flow = make_sim_flow(tmp_path, {'share_elaboration': True})
+    calls, run_configs = run_parallel(flow, monkeypatch)
+    elaborations = [args for prog, args, _ in calls if prog == 'xelab']
+    assert len(elaborations) == 1
+    assert 'G_FNAME_PDI=G_FNAME_PDI' in elaborations[0] and 'G_MAX=8' in elaborations[0]
+    assert sorted(cwd.name for prog, _, cwd in calls if prog == 'xsim') == ['xsim_rc1', 'xsim_rc2']
+    assert all(r['snapshot'] == 'tb_shared_rc1' for r in flow.results['run_configs'].values())
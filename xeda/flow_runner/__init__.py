@@ -1,2 +1,3 @@
 from .default_runner import *
 from .fmax import FmaxRunner
+from .pareto import ParetoRunner
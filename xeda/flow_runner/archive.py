@@ -0,0 +1,159 @@
+"""
+Archival of completed run directories.
+
+All files of a run directory, except results.json and settings.json, are packed into a single zip archive (RUN_ARCHIVE) inside the
+run directory, whose central directory indexes the archived files. Reports remain readable through open_run_file, so old runs stay
+queryable. Archived runs are listed in `<xeda_run_dir>/archive_index.json`.
+Flows read the outputs of their prerequisites directly: the runner unpacks an archived prerequisite which is reused (see extract_run_dir).
+"""
+
+import argparse
+import json
+import logging
+import os
+import shutil
+import time
+import zipfile
+from pathlib import Path
+from typing import Optional
+
+from ..flows.flow import RUN_ARCHIVE
+from .lock import RunLock
+from .store import format_size
+
+logger = logging.getLogger()
+
+KEEP_FILES = ('results.json', 'settings.json', RUN_ARCHIVE)
+STORED_SUFFIXES = ('.gz', '.zst', '.zip', '.fst', '.dcp')  # already compressed
+
+
+def run_dirs(xeda_run_dir):
+    """completed run directories (with a results.json) under xeda_run_dir"""
+    for results_json in Path(xeda_run_dir).glob('**/.xeda_run/*/*/results.json'):
+        yield results_json.parent
+
+
+def last_modified(run_dir: Path) -> float:
+    return max((p.lstat().st_mtime for p in run_dir.rglob('*')), default=run_dir.stat().st_mtime)
+
+
+def archive_run_dir(run_dir, dry_run=False) -> Optional[dict]:
+    """
+    Pack the files of a completed run directory into RUN_ARCHIVE and remove them.
+    Files which were already archived are kept in the archive, e.g. if the run directory was later reused for parsing.
+    Returns the index entry of the run or None if there was nothing to archive.
+    """
+    run_dir = Path(run_dir)
+    archive = run_dir / RUN_ARCHIVE
+    files = sorted(p for p in run_dir.rglob('*') if p.is_file() and not p.is_symlink() and
+                   p.relative_to(run_dir).as_posix() not in KEEP_FILES)
+    if not files:
+        return None
+    size = sum(p.stat().st_size for p in files)
+    entry = dict(files=len(files), size=size)
+    if dry_run:
+        return entry
+    tmp = archive.with_name(f'.{archive.name}.tmp')
+    with zipfile.ZipFile(tmp, 'w', zipfile.ZIP_DEFLATED, allowZip64=True) as zf:
+        new_members = {p.relative_to(run_dir).as_posix() for p in files}
+        if archive.exists():
+            with zipfile.ZipFile(archive) as old:
+                for info in old.infolist():
+                    if info.filename not in new_members:
+                        with old.open(info) as src, zf.open(info, 'w') as dst:
+                            shutil.copyfileobj(src, dst)
+        for p in files:
+            compress_type = zipfile.ZIP_STORED if p.suffix in STORED_SUFFIXES else zipfile.ZIP_DEFLATED
+            zf.write(p, p.relative_to(run_dir).as_posix(), compress_type=compress_type)
+    os.replace(tmp, archive)
+    for p in files:
+        p.unlink()
+    for d in sorted((d for d in run_dir.rglob('*') if d.is_dir() and not d.is_symlink()), key=lambda d: -len(d.parts)):
+        try:
+            d.rmdir()
+        except OSError:
+            pass
+    entry['archive_size'] = archive.stat().st_size
+    try:
+        with open(run_dir / 'results.json') as f:
+            results = json.load(f)
+        entry.update({k: results.get(k) for k in ('design.name', 'flow.name', 'flow.run_hash', 'timestamp', 'success')})
+    except (OSError, ValueError):
+        pass
+    entry['archived'] = time.strftime('%Y-%m-%d-%H%M%S')
+    return entry
+
+
+def extract_run_dir(run_dir) -> int:
+    """
+    Unpack RUN_ARCHIVE of a run directory back in place and remove it. Files which exist outside of the archive are kept as is.
+    Returns the number of extracted files.
+    """
+    run_dir = Path(run_dir)
+    archive = run_dir / RUN_ARCHIVE
+    if not archive.exists():
+        return 0
+    num_files = 0
+    with zipfile.ZipFile(archive) as zf:
+        for info in zf.infolist():
+            if info.is_dir() or (run_dir / info.filename).exists():
+                continue
+            zf.extract(info, run_dir)
+            num_files += 1
+    archive.unlink()
+    logger.info(f"[Archive] Extracted {num_files} file(s) of {run_dir}")
+    return num_files
+
+
+def update_index(index_path: Path, entries: dict):
+    index = {}
+    try:
+        with open(index_path) as f:
+            index = json.load(f)
+    except FileNotFoundError:
+        pass
+    except ValueError as e:
+        logger.warning(f"[Archive] Ignoring corrupted index {index_path}: {e}")
+    index.update(entries)
+    tmp = index_path.with_name(index_path.name + '.tmp')
+    with open(tmp, 'w') as f:
+        json.dump(index, f, indent=1, sort_keys=True)
+    os.replace(tmp, index_path)
+
+
+def archive_main(args=None):
+    parser = argparse.ArgumentParser(prog='xeda-archive', description='Pack completed run directories into compressed archives')
+    parser.add_argument('--xeda-run-dir', default=os.environ.get('xeda_run_dir', 'xeda_run'),
+                        help='xeda run directory (default: xeda_run)')
+    parser.add_argument('--older-than', type=float, default=7,
+                        help='only archive runs which were not modified during this many days (default: 7)')
+    parser.add_argument('--dry-run', action='store_true', help='only report what would be archived')
+    parsed_args = parser.parse_args(args)
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+
+    xeda_run_dir = Path(parsed_args.xeda_run_dir)
+    cutoff = time.time() - parsed_args.older_than * 24 * 3600
+    entries = {}
+    for run_dir in run_dirs(xeda_run_dir):
+        if last_modified(run_dir) > cutoff:
+            continue
+        # skip runs in progress, and keep new runs from starting in the run directory while it's archived
+        lock = RunLock(run_dir.with_name(f'{run_dir.name}.lock'))
+        if not lock.acquire(timeout=0):
+            continue
+        try:
+            entry = archive_run_dir(run_dir, parsed_args.dry_run)
+        except (OSError, zipfile.BadZipFile) as e:
+            logger.warning(f"[Archive] Failed to archive {run_dir}: {e}")
+            continue
+        finally:
+            lock.release()
+        if entry:
+            entries[str(run_dir.resolve())] = entry
+            logger.info(f"[Archive] {'Would archive' if parsed_args.dry_run else 'Archived'} {run_dir}: {entry['files']} file(s), "
+                        f"{format_size(entry['size'])}" + (f" -> {format_size(entry['archive_size'])}" if 'archive_size' in entry else ''))
+    if entries and not parsed_args.dry_run:
+        update_index(xeda_run_dir / 'archive_index.json', entries)
+    total = sum(e['size'] for e in entries.values())
+    freed = total - sum(e.get('archive_size', 0) for e in entries.values())
+    logger.info(f"[Archive] {len(entries)} run(s), {format_size(total)}" + ('' if parsed_args.dry_run else f", {format_size(freed)} freed"))
@@ -0,0 +1,95 @@
+"""
+Cache of completed runs shared between machines and users, e.g. in a directory on a shared filesystem.
+
+Entries are keyed by the run hash of the flow (Flow.gen_xeda_hash) and the version of its tools (Flow.tool_version):
+    <cache_dir>/<flow name>/<run hash>-<tool version hash>/
+        results.json
+        files/...  (declared artifacts and reports, relative to flow_run_dir)
+Entries are written to a temporary directory which is then renamed, so readers never see a partial entry.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import uuid
+from pathlib import Path
+from typing import List, Optional
+
+from ..flows.flow import Flow
+
+logger = logging.getLogger()
+
+
+class RunCache:
+    def __init__(self, root) -> None:
+        self.root = Path(root)
+
+    def entry_path(self, flow: Flow) -> Optional[Path]:
+        """None if the version of the tools of the flow is unknown: the entry could have been produced by a different version"""
+        version = flow.tool_version()
+        if not version:
+            logger.debug(f"[Cache] {flow.name}: unknown tool version, not using the shared cache")
+            return None
+        version_hash = hashlib.sha1(version.encode('utf-8')).hexdigest()[:12]
+        return self.root / flow.name / f'{flow.xedahash}-{version_hash}'
+
+    @staticmethod
+    def cached_files(flow: Flow) -> List[Path]:
+        run_dir = flow.flow_run_dir
+        return sorted({p for pattern in flow.output_patterns() for p in run_dir.glob(pattern) if p.is_file()})
+
+    def restore(self, flow: Flow) -> bool:
+        """copy a cached run into flow_run_dir and load its results. Returns False on a cache miss."""
+        entry = self.entry_path(flow)
+        if entry is None or not (entry / 'results.json').exists():
+            return False
+        try:
+            with open(entry / 'results.json') as f:
+                results = json.load(f)
+            files_dir = entry / 'files'
+            flow.flow_run_dir.mkdir(parents=True, exist_ok=True)
+            for src in files_dir.glob('**/*'):
+                if src.is_file():
+                    dst = flow.flow_run_dir / src.relative_to(files_dir)
+                    dst.parent.mkdir(parents=True, exist_ok=True)
+                    tmp = dst.with_name(f'.{dst.name}.tmp')
+                    shutil.copy2(src, tmp)
+                    os.replace(tmp, dst)
+        except (OSError, ValueError) as e:
+            logger.warning(f"[Cache] Failed to restore {entry}: {e}")
+            return False
+        flow.results = results
+        # written last: an interrupted restore is not mistaken for a completed run
+        flow.dump_results()
+        try:
+            os.utime(entry)  # for pruning the least recently used entries
+        except OSError:
+            pass
+        logger.info(f"[Cache] Restored {flow.name} from {entry}")
+        return True
+
+    def store(self, flow: Flow):
+        """add a successful run to the cache, unless it's already there"""
+        if not flow.results.get('success'):
+            return
+        entry = self.entry_path(flow)
+        if entry is None or entry.exists():
+            return
+        tmp = entry.with_name(f'.{entry.name}.{uuid.uuid4().hex}.tmp')
+        try:
+            (tmp / 'files').mkdir(parents=True)
+            for src in self.cached_files(flow):
+                dst = tmp / 'files' / src.relative_to(flow.flow_run_dir)
+                dst.parent.mkdir(parents=True, exist_ok=True)
+                shutil.copy2(src, dst)
+            flow.dump_json(flow.results, tmp / 'results.json')
+            os.rename(tmp, entry)
+            logger.info(f"[Cache] Stored {flow.name} in {entry}")
+        except OSError as e:
+            # another machine might have stored the same run in the meantime
+            if not entry.exists():
+                logger.warning(f"[Cache] Failed to store {flow.flow_run_dir} in {entry}: {e}")
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
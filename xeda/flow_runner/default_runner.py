@@ -1,13 +1,20 @@
 import multiprocessing
+import os
 import sys
 import re
 import logging
 import pkg_resources
 import json
+from pathlib import Path
 
 from ..flows.settings import Settings
-from ..flows.flow import Flow, FlowFatalException, my_print
+from ..flows.flow import (Flow, FlowFatalException, KILL_TIMEOUT, RUN_ARCHIVE, my_print, process_group_alive, process_table,
+                          running_process_groups, terminate_process_groups)
 from ..utils import camelcase_to_snakecase, load_class, dict_merge, try_convert
+from .archive import extract_run_dir
+from .cache import RunCache
+from .lock import RunLock
+from .store import ArtifactStore, parse_size
 
 logger = logging.getLogger()
 
@@ -80,6 +87,8 @@ class FlowRunner:
             self.args.override_settings = None
 
         self.all_settings = self.get_all_settings()
+        self.artifact_store = self.get_artifact_store()
+        self.run_cache = self.get_run_cache()
 
     def get_default_settings(self):
         defaults_data = pkg_resources.resource_string('xeda', "defaults.json")
@@ -89,6 +98,36 @@ class FlowRunner:
             self.fatal(
                 f"Failed to parse defaults settings file (defaults.json): {' '.join(e.args)}", e)
 
+    def project_settings(self) -> dict:
+        if not self.xeda_project:
+            return {}
+        project = self.xeda_project.get('project', {})
+        if isinstance(project, list):
+            project = project[0]
+        return project
+
+    def get_artifact_store(self):
+        """
+        Enabled by `artifact_store` in the [project] section of xedaproject: true, 'reflink', or 'hardlink' (see ArtifactStore).
+        The store is shared by all runners using the same xeda_run_dir.
+        """
+        project = self.project_settings()
+        link = project.get('artifact_store')
+        if not link:
+            return None
+        return ArtifactStore(Path(self.args.xeda_run_dir) / '.xeda_store', link=link if isinstance(link, str) else 'auto',
+                             min_size=int(project.get('artifact_store_min_size', 64 << 10)))
+
+    def get_run_cache(self):
+        """shared cache of completed runs (see RunCache), in `artifact_cache` of the [project] section or $XEDA_CACHE_DIR"""
+        cache_dir = self.project_settings().get('artifact_cache', os.environ.get('XEDA_CACHE_DIR'))
+        return RunCache(cache_dir) if cache_dir else None
+
+    def ingest_artifacts(self, flow_cls, flow_run_dir):
+        """replace the declared artifacts (Flow.artifacts) of a completed run by links into the artifact store"""
+        if self.artifact_store and flow_run_dir:
+            self.artifact_store.ingest_run(flow_run_dir, flow_cls.artifacts)
+
     def fatal(self, msg=None, exception=None):
         if msg:
             logger.critical(msg)
@@ -176,6 +215,8 @@ class FlowRunner:
                 f"Running post-results hook from {hook.__class__.__name__}")
             hook(flow)
 
+        flow.compress_logs()
+
     def load_flowclass(self, name: str) -> Flow:
         splitted = name.split('.')
         package = ".flows"
@@ -208,6 +249,11 @@ class FlowRunner:
         flow: Flow = flow_cls(effective_settings,
                               self.args, completed_dependencies)
 
+        project = self.project_settings()
+        flow.scratch_dir = project.get('scratch_dir', os.environ.get('XEDA_SCRATCH_DIR'))
+        if 'scratch_min_free' in project:
+            flow.scratch_min_free = parse_size(project['scratch_min_free'])
+
         max_threads = effective_settings.flow.get('nthreads')
         if not max_threads:
             max_threads = multiprocessing.cpu_count()
@@ -249,46 +295,62 @@ class DefaultRunner(FlowRunner):
             completed_prereq = self.launch_flow(
                 prereq, prereq_flowsettings, prereq_design, self.args.force_rerun
             )
+            # the outputs of a reused prerequisite might have been archived (see `xeda-archive`)
+            if (completed_prereq.flow_run_dir / RUN_ARCHIVE).exists():
+                with RunLock(completed_prereq.flow_run_dir.with_name(f'{completed_prereq.name}.lock')):
+                    extract_run_dir(completed_prereq.flow_run_dir)
             completed_dependencies.append(completed_prereq)
 
         flow = self.setup_flow(flow_settings, design_settings, flow_class,
                                completed_dependencies)
 
-        results_json = flow.flow_run_dir / 'results.json'
-
-        if not force_run:
-            try:
-                with open(results_json) as f:
-                    flow.results = json.load(f)
-            except FileNotFoundError:
-                force_run = True
-                logger.info(
-                    f"Running flow {flow.name} as {results_json} does not exist.")
-            except Exception as e:
-                force_run = True
-                logger.info(f"running flow {flow.name} due to {e}")
-
-            if not force_run and not flow.results.get('success'):
-                force_run = True
-                logger.info(
-                    f"Re-running flow {flow.name} as the previous run was not successful")
-
-            prev_hash = flow.results.get('flow.run_hash')
-            if not force_run and prev_hash != flow.xedahash:
-                force_run = True
-                logger.info(
-                    f"Re-running flow {flow.name} as the previous run hash ({prev_hash}) did not match the current one ({flow.xedahash})")
-
-        if force_run:
-            flow.run_flow()
-            self.post_run(flow)
-            if not flow.results.get('success'):
-                logger.critical(f"{flow.name} failed")
-                exit(1)
-        else:
-            logger.warning(
-                f"Previous results in {results_json} are already up-to-date. Will skip running {flow.name}.")
-            flow.print_results()
+        # concurrent xeda processes running the same flow with the same settings share a single run
+        with RunLock(flow.flow_run_dir.with_name(f'{flow.name}.lock')) as lock:
+            results_json = flow.flow_run_dir / 'results.json'
+            if lock.waited and not self.args.force_rerun:
+                logger.info(f"Reusing the results of {flow.name} run by another process, if up-to-date")
+                force_run = False
+
+            if not force_run:
+                try:
+                    with open(results_json) as f:
+                        flow.results = json.load(f)
+                except FileNotFoundError:
+                    force_run = True
+                    logger.info(
+                        f"Running flow {flow.name} as {results_json} does not exist.")
+                except Exception as e:
+                    force_run = True
+                    logger.info(f"running flow {flow.name} due to {e}")
+
+                if not force_run and not flow.results.get('success'):
+                    force_run = True
+                    logger.info(
+                        f"Re-running flow {flow.name} as the previous run was not successful")
+
+                prev_hash = flow.results.get('flow.run_hash')
+                if not force_run and prev_hash != flow.xedahash:
+                    force_run = True
+                    logger.info(
+                        f"Re-running flow {flow.name} as the previous run hash ({prev_hash}) did not match the current one ({flow.xedahash})")
+
+            # --force-rerun bypasses the shared cache as well
+            if force_run and not self.args.force_rerun and self.run_cache and self.run_cache.restore(flow):
+                flow.print_results()
+                self.ingest_artifacts(flow_class, flow.flow_run_dir)
+            elif force_run:
+                flow.run_flow()
+                self.post_run(flow)
+                if self.run_cache:
+                    self.run_cache.store(flow)
+                self.ingest_artifacts(flow_class, flow.flow_run_dir)
+                if not flow.results.get('success'):
+                    logger.critical(f"{flow.name} failed")
+                    exit(1)
+            else:
+                logger.warning(
+                    f"Previous results in {results_json} are already up-to-date. Will skip running {flow.name}.")
+                flow.print_results()
 
         return flow
 
@@ -299,21 +361,58 @@ class DefaultRunner(FlowRunner):
                          self.all_settings['design'], not self.args.use_stale)
 
 
-def nukemall():
-    def on_terminate(proc):
-        logger.warning(
-            f"Child process {proc.info['name']}[{proc}] terminated with exit code {proc.returncode}")
-
+def become_subreaper():
+    """
+    Make this process the child subreaper of its descendants (Linux only):
+    orphaned processes, e.g. the tools of a worker which was killed, are re-parented to it instead of init, so that nukemall can find them.
+    """
     try:
-        pass
-        # procs = psutil.Process().children(recursive=True)
-        # print(f"killing {len(procs)} child processes")
-        # for p in procs:
-        #     p.terminate()
-        # gone, alive = psutil.wait_procs(procs, timeout=3, callback=on_terminate)
-        # for p in alive:
-        #     p.kill()
-        # on nix: negative number means the process group with that PGID
-        # os.kill(-os.getpgid(0), signal.SIGINT)
-    except:
+        import ctypes
+        PR_SET_CHILD_SUBREAPER = 36
+        libc = ctypes.CDLL(None, use_errno=True)
+        return libc.prctl(PR_SET_CHILD_SUBREAPER, 1, 0, 0, 0) == 0
+    except (OSError, AttributeError):
+        return False
+
+
+def nukemall(orphans_only=False, timeout=KILL_TIMEOUT):
+    """
+    Tear down the process groups of the tools left behind by this process and its workers.
+    Tools run in their own session, see Flow.run_process.
+    orphans_only: only the sessions which were re-parented to this process (see become_subreaper), e.g. tools of a cancelled or timed-out worker,
+        otherwise every descendant which is not in the process group of this process.
+    """
+    try:
+        table = process_table()
+        me = os.getpid()
+        my_pgid = os.getpgid(0)
+        my_sid = os.getsid(0)
+        running = running_process_groups()
+        if orphans_only:
+            sessions = {sid for pid, (ppid, pgid, sid, _) in table.items()
+                        if ppid == me and sid != my_sid and pgid not in running}
+            pgids = {pgid for pid, (_, pgid, sid, _) in table.items() if sid in sessions}
+        else:
+            children = {}
+            for pid, (ppid, _, _, _) in table.items():
+                children.setdefault(ppid, []).append(pid)
+            pgids = set()
+            stack = list(children.get(me, []))
+            while stack:
+                pid = stack.pop()
+                if table[pid][1] != my_pgid:
+                    pgids.add(table[pid][1])
+                stack.extend(children.get(pid, []))
+        alive = [pg for pg in pgids if process_group_alive(pg)]
+        if alive:
+            logger.warning(f"Terminating {len(alive)} lingering process group(s)")
+            terminate_process_groups(alive, timeout)
+        # reap the processes which were re-parented to this process
+        for pid, (ppid, pgid, _, _) in table.items():
+            if ppid == me and pgid in pgids and pgid not in running:
+                try:
+                    os.waitpid(pid, os.WNOHANG)
+                except ChildProcessError:
+                    pass
+    except Exception:
         logger.exception('exception during killing')
@@ -1,25 +1,66 @@
 import copy
 import os
 from pebble.common import ProcessExpired
-from pebble.pool.process import ProcessPool
-import random
 import logging
-from concurrent.futures import CancelledError, TimeoutError
+from concurrent.futures import CancelledError, TimeoutError, wait, FIRST_COMPLETED
 import time
 from pathlib import Path
 import json
 import traceback
-# a heavy overkill, but have plans with in the future
-import numpy
 from math import ceil
-
-from ..utils import unique
-from .default_runner import FlowRunner, print_results
+from typing import Optional
+
+from .default_runner import FlowRunner, nukemall, print_results
+from .memory import MemoryAdmission, MemoryHistory
+from .placement import CpuPlacement
+from .remote import AgentLost, WorkerPool
+from .lock import RunLock
+from .retention import RetentionPolicy
 from ..flows.flow import Flow, FlowFatalException, NonZeroExit
 
 
 logger = logging.getLogger()
 
+ONE_THOUSAND = 1000.0
+
+
+def freq_to_period(freq: float) -> float:
+    """clock period in nanoseconds, rounded to picoseconds"""
+    return round(ONE_THOUSAND / freq, 3)
+
+
+def period_to_freq(period: float) -> float:
+    return ONE_THOUSAND / period
+
+
+class AdaptiveTimeout:
+    """
+    Timeout of the next run: `factor` times the duration of the slowest completed run, limited to [min_timeout, max_timeout].
+    max_timeout is used until `min_samples` runs have completed, or if factor is not set.
+    Runs get slower closer to fmax, so a run killed by the adaptive timeout (see is_adaptive) is not a failure: it's retried with max_timeout.
+    """
+
+    def __init__(self, max_timeout, factor=None, min_timeout=300, min_samples=4) -> None:
+        self.max_timeout = max_timeout
+        self.factor = factor
+        self.min_timeout = min(min_timeout, max_timeout) if max_timeout else min_timeout
+        self.min_samples = min_samples
+        self.durations = []
+
+    def add(self, duration):
+        self.durations.append(duration)
+
+    @property
+    def value(self):
+        if not self.factor or len(self.durations) < self.min_samples:
+            return self.max_timeout
+        timeout = max(self.min_timeout, max(self.durations) * self.factor)
+        return min(timeout, self.max_timeout) if self.max_timeout else timeout
+
+    def is_adaptive(self, timeout) -> bool:
+        """whether a run with `timeout` was limited by the adaptive timeout rather than by max_timeout"""
+        return timeout is not None and (not self.max_timeout or timeout < self.max_timeout)
+
 
 class Best:
     def __init__(self, freq, results, settings):
@@ -28,14 +69,122 @@ class Best:
         self.settings = copy.deepcopy(settings)
 
 
-def run_flow_fmax(arg):
-    idx: int
-    flow: Flow
-    idx, flow = arg
+class FmaxSearch:
+    """
+    State of the Fmax search, updated as soon as each candidate run completes.
+    Search interval is (lo_freq, hi_freq): lo_freq is the best passing frequency (or the lower limit if none passed yet)
+    and hi_freq is the lowest failing frequency above lo_freq (or the upper limit if none failed yet).
+    All candidates are tracked by their clock period, rounded to picoseconds.
+    """
+
+    max_floor_shrinks = 4
+
+    def __init__(self, lo_freq: float, hi_freq: float, resolution: float) -> None:
+        self.floor = lo_freq
+        self.ceiling = hi_freq
+        self.resolution = resolution
+        self.best: Optional[Best] = None
+        self.tried_periods = set()
+        self.failed_periods = set()
+        self.inflight_periods = set()
+        self.floor_shrinks = 0
+
+    @property
+    def lo_freq(self) -> float:
+        return self.best.freq if self.best else self.floor
+
+    @property
+    def hi_freq(self) -> float:
+        failed_above = [period_to_freq(p) for p in self.failed_periods if period_to_freq(p) > self.lo_freq]
+        return min(failed_above, default=self.ceiling)
+
+    def next_period(self) -> Optional[float]:
+        """Bisect the largest unexplored gap of the search interval. Returns None if there's nothing left to try"""
+        while True:
+            lo_freq, hi_freq = self.lo_freq, self.hi_freq
+            occupied = [period_to_freq(p) for p in self.tried_periods | self.inflight_periods]
+            points = sorted({lo_freq, hi_freq} | {f for f in occupied if lo_freq < f < hi_freq})
+            gaps = sorted(zip(points, points[1:]), key=lambda g: g[1] - g[0], reverse=True)
+            for lo, hi in gaps:
+                if hi - lo < self.resolution:
+                    break
+                period = freq_to_period((lo + hi) / 2)
+                if period not in self.tried_periods and period not in self.inflight_periods:
+                    return period
+            # nothing passed so far: move the lower limit down, but only after all in-flight runs are back
+            if not self.best and not self.inflight_periods and self.floor_shrinks < self.max_floor_shrinks:
+                self.floor_shrinks += 1
+                self.floor /= 2
+                logger.info(f"[Fmax] No passing frequencies found yet. Lowering the lower limit to {self.floor:.2f} MHz")
+                continue
+            return None
+
+    def start(self, period: float):
+        self.inflight_periods.add(period)
+
+    def discard(self, period: float):
+        """forget about an in-flight period which was cancelled before producing any results"""
+        self.inflight_periods.discard(period)
+
+    def update(self, period: float, results, settings) -> bool:
+        """record results of a completed run. Returns True if best was improved"""
+        self.inflight_periods.discard(period)
+        self.tried_periods.add(period)
+        if not results:
+            # crashed, timed out, or otherwise unusable: occupies its point but does not move the bounds
+            return False
+        freq = period_to_freq(period)
+        if not results.get('success') or results.get('exceeds_max_luts'):
+            if not results.get('exceeds_max_luts'):
+                self.failed_periods.add(period)
+            return False
+        if self.best and freq <= self.best.freq:
+            return False
+        self.best = Best(freq, results, settings)
+        wns = results.get('wns')
+        if wns is not None and wns > 0:
+            # room for further improvement beyond the current upper limit?
+            min_plausible_period = period - wns - 0.001
+            if min_plausible_period > 0:
+                self.ceiling = max(self.ceiling, ceil(period_to_freq(min_plausible_period)) + 1)
+        if freq >= self.ceiling - self.resolution:
+            self.ceiling = freq + max(1.0, self.resolution)
+        return True
+
+    def is_redundant(self, period: float) -> bool:
+        """a candidate is redundant if it can't improve the best result"""
+        return self.best is not None and period_to_freq(period) <= self.best.freq
+
+    def to_dict(self):
+        return dict(
+            floor=self.floor,
+            ceiling=self.ceiling,
+            resolution=self.resolution,
+            floor_shrinks=self.floor_shrinks,
+            lo_freq=self.lo_freq,
+            hi_freq=self.hi_freq,
+            best=self.best,
+            tried_periods=sorted(self.tried_periods),
+            failed_periods=sorted(self.failed_periods),
+        )
+
+
+def run_flow_fmax(flow: Flow):
+    # another xeda process might be running the same candidate
+    lock = RunLock(flow.flow_run_dir.with_name(f'{flow.name}.lock'))
     try:
+        lock.acquire()
+        if lock.waited:
+            try:
+                with open(flow.flow_run_dir / 'results.json') as f:
+                    results = json.load(f)
+                if results.get('flow.run_hash') == flow.xedahash:
+                    logger.info(f'[Run Thread] Reusing the results of {flow.flow_run_dir} run by another process')
+                    return results, flow.settings, flow.flow_run_dir
+            except (OSError, ValueError):
+                pass
         flow.run_flow()
         flow.parse_reports()
-        flow.dump_results()
         flow.results['timestamp'] = flow.timestamp
         flow.results['design.name'] = flow.settings.design['name']
         flow.results['flow.name'] = flow.name
@@ -44,8 +193,9 @@ def run_flow_fmax(arg):
         lut = flow.results.get('lut')
         if max_luts and lut and int(lut) > int(max_luts):
             flow.results['exceeds_max_luts'] = True
-            idx = None
-        return idx, flow.results, flow.settings, flow.flow_run_dir
+        flow.dump_results()
+        flow.compress_logs()
+        return flow.results, flow.settings, flow.flow_run_dir
 
     except FlowFatalException as e:
         logger.warning(
@@ -60,20 +210,238 @@ def run_flow_fmax(arg):
         logger.warning(f'[Run Thread] {e}')
     except Exception as e:
         logger.exception(f"Exception: {e}")
+    finally:
+        lock.release()
 
-    return None, None, flow.settings, flow.flow_run_dir
+    return None, flow.settings, flow.flow_run_dir
 
 
 class FmaxRunner(FlowRunner):
+    # settings only used by the runner, removed before passing flow settings to each candidate flow
+    runner_settings = ('fmax_low', 'fmax_high', 'fmax_low_freq', 'fmax_high_freq', 'fmax_resume', 'fmax_keep_top',
+                       'remote_listen', 'remote_token', 'remote_artifacts', 'local_workers',
+                       'memory_admission', 'memory_per_run', 'memory_reserve', 'cpu_affinity', 'timeout_factor')
+    # flow settings which distinguish candidates of this runner
+    variant_keys = ('clock_period',)
+    # runs of this runner are kept in this subdirectory of xeda_run_dir
+    run_dir_name = 'fmax'
+
     def __init__(self, args, xeda_project, timestamp) -> None:
         super().__init__(args, xeda_project, timestamp)
         if self.args.force_run_dir:
             logger.warning("force_run_dir will be disabled in FmaxRunner")
             self.args.force_run_dir = None
 
-        self.args.xeda_run_dir = os.path.join(self.args.xeda_run_dir, "fmax")
+        self.args.xeda_run_dir = os.path.join(self.args.xeda_run_dir, self.run_dir_name)
         logger.warning(f"xeda_run_dir was changed to {self.args.xeda_run_dir}")
 
+    def setup_candidate(self, flow_settings, design_settings, flow_name, nthreads, variant) -> Flow:
+        flow_settings = {k: v for k, v in flow_settings.items() if k not in self.runner_settings}
+        flow_settings.update({k: v for k, v in variant.items() if v is not None})
+        flow_settings['nthreads'] = nthreads
+        flow = self.setup_flow(flow_settings, design_settings, flow_name)
+        flow.no_console = True
+        return flow
+
+    def state_path(self, flow_name) -> Path:
+        return Path(self.args.xeda_run_dir) / f'fmax_{self.all_settings["design"]["name"]}_{flow_name}.state.json'
+
+    def harvest(self, flow_settings, design_settings, flow_name, nthreads, previous_runs):
+        """
+        Collect results of previous runs whose run hash matches the hash of a candidate with the same variant settings (e.g. clock_period),
+        i.e., the run would be identical if executed now.
+        previous_runs: list of (variant, run record) from a previous state file
+        Returns a list of (variant, results, settings, flow_run_dir, run_record)
+        """
+        flow_class = self.load_flowclass(flow_name)
+        run_root = Path(self.args.xeda_run_dir) / '.xeda_run'
+        candidates = {}
+
+        for settings_json in run_root.glob(f'*/{flow_class.name}/settings.json'):
+            try:
+                with open(settings_json) as f:
+                    fs = json.load(f)['flow']
+                variant = tuple((k, fs.get(k)) for k in self.variant_keys)
+                candidates[variant] = None
+            except Exception as e:
+                logger.debug(f"[Fmax] skipping {settings_json}: {e}")
+        for variant, run in previous_runs:
+            candidates[tuple((k, variant.get(k)) for k in self.variant_keys)] = run
+
+        harvested = []
+        for variant, run in candidates.items():
+            variant = dict(variant)
+            flow = self.setup_candidate(flow_settings, design_settings, flow_name, nthreads, variant)
+            results = None
+            try:
+                with open(flow.flow_run_dir / 'results.json') as f:
+                    results = json.load(f)
+            except FileNotFoundError:
+                pass
+            except Exception as e:
+                logger.warning(f"[Fmax] Failed to load previous results from {flow.flow_run_dir}: {e}")
+            # flow_run_dir is derived from the run hash, older results.json files might lack 'flow.run_hash'
+            if results and results.get('flow.run_hash', flow.xedahash) == flow.xedahash:
+                run = dict(run_hash=flow.xedahash, flow_run_dir=str(flow.flow_run_dir),
+                           status='passed' if results.get('success') else 'failed')
+                harvested.append((variant, results, flow.settings, flow.flow_run_dir, run))
+            elif run and run.get('run_hash') == flow.xedahash and run.get('status') == 'error':
+                # errored, crashed, or timed-out (after `timeout`) run with unchanged settings: don't try again.
+                # Runs killed by the adaptive timeout have status 'timeout' and are retried.
+                harvested.append((variant, None, flow.settings, flow.flow_run_dir, run))
+        return harvested
+
+    def worker_pool(self, flow_settings, max_workers, nthreads) -> WorkerPool:
+        """
+        Local worker processes and (optionally) remote worker agents connecting to `remote_listen`.
+        See remote.WorkerPool and `xeda-agent --help`.
+        """
+        listen = flow_settings.get('remote_listen')
+        local_workers = flow_settings.get('local_workers', max_workers) if listen else max_workers
+        return WorkerPool(local_workers, nthreads, listen=listen,
+                          token=flow_settings.get('remote_token', os.environ.get('XEDA_AGENT_TOKEN')),
+                          artifacts=flow_settings.get('remote_artifacts'),
+                          admission=self.memory_admission(flow_settings),
+                          placement=CpuPlacement() if flow_settings.get('cpu_affinity') else None)
+
+    def memory_admission(self, flow_settings) -> Optional[MemoryAdmission]:
+        """
+        Only start new local runs when their projected peak memory fits (see MemoryAdmission), unless flow setting `memory_admission` is false.
+            memory_per_run: estimated peak memory (MB) of a run, until the peak memory of actual runs is known
+            memory_reserve: memory (MB) which is left for the rest of the system (default: 1024)
+        """
+        if not flow_settings.get('memory_admission', True):
+            return None
+        history = MemoryHistory(Path(self.args.xeda_run_dir) / 'memory_history.json')
+        return MemoryAdmission(history, f'{self.all_settings["design"]["name"]}/{self.args.flow}',
+                               default_mb=flow_settings.get('memory_per_run'),
+                               reserve_mb=float(flow_settings.get('memory_reserve', 1024)))
+
+    def adaptive_timeout(self, flow_settings) -> AdaptiveTimeout:
+        """
+        Flow setting `timeout` (default: 3600 seconds) is the upper limit of each run.
+        Unless flow setting `timeout_factor` is 0, the timeout of new runs adapts to the runtime of the completed ones:
+        timeout_factor (default: 3) * the runtime of the slowest one. Runs killed by the adaptive timeout are retried with `timeout`.
+        """
+        timeout = AdaptiveTimeout(flow_settings.get('timeout', 3600), float(flow_settings.get('timeout_factor', 3.0)))
+        logger.info(f'[Fmax] Timeout set to: {timeout.max_timeout} seconds' +
+                    (f', adapting to {timeout.factor} x the runtime of the slowest completed run.' if timeout.factor else '.'))
+        return timeout
+
+    def run_pool(self, pool: WorkerPool, timeout, next_candidate, on_done, on_cancel, is_redundant=None, on_retry=None):
+        """
+        Keep all workers of the pool busy. Every free worker immediately receives the next candidate.
+            next_candidate() -> (key, flow) or None if there's nothing to run at the moment
+            on_done(key, results, settings, flow_run_dir) is called as soon as each run completes,
+                results is None if the run failed to produce results
+            on_cancel(key) is called for every run which was cancelled before completion (including runs on lost remote agents)
+            is_redundant(key) is checked for all in-flight and to-be-retried runs after each completion and redundant ones are cancelled
+            on_retry(key) is called when a run was killed by the adaptive timeout, before it's scheduled again with max_timeout
+        Returns when no candidates are in flight and next_candidate has nothing more to run.
+        timeout: seconds or AdaptiveTimeout
+        """
+        if not isinstance(timeout, AdaptiveTimeout):
+            timeout = AdaptiveTimeout(timeout)
+        pending = {}  # future -> key
+        start_times = {}  # future -> time.monotonic()
+        scheduled = {}  # future -> (flow, timeout)
+        retries = []  # (key, flow) of runs killed by the adaptive timeout
+        with pool:
+            try:
+                while True:
+                    # fill every free worker, capacity changes as remote agents come and go
+                    exhausted = False
+                    while len(pending) < pool.capacity and pool.can_schedule():
+                        if retries:
+                            key, flow = retries.pop(0)
+                            run_timeout = timeout.max_timeout
+                        else:
+                            candidate = next_candidate()
+                            if candidate is None:
+                                exhausted = True
+                                break
+                            key, flow = candidate
+                            run_timeout = timeout.value
+                        try:
+                            future = pool.schedule(run_flow_fmax, flow, timeout=run_timeout)
+                            pending[future] = key
+                            start_times[future] = time.monotonic()
+                            scheduled[future] = (flow, run_timeout)
+                        except RuntimeError as e:
+                            logger.warning(f"[Fmax] Could not schedule run {key}: {e}")
+                            on_cancel(key)
+                            break
+
+                    if not pending:
+                        if pool.capacity == 0:
+                            logger.info("[Fmax] Waiting for worker agents to connect...")
+                            time.sleep(pool.poll_interval * 5)
+                            continue
+                        if exhausted:
+                            break
+                        # a worker is still being released (or waiting for memory)
+                        time.sleep(pool.poll_interval)
+                        continue
+
+                    done, _ = wait(list(pending.keys()), timeout=pool.poll_interval, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        key = pending.pop(future, None)
+                        if key is None:
+                            continue
+                        results = None
+                        fs = None
+                        flow_run_dir = None
+                        start_time = start_times.pop(future, None)
+                        flow, run_timeout = scheduled.pop(future, (None, None))
+                        try:
+                            results, fs, flow_run_dir = future.result()
+                            if results is not None and start_time:
+                                timeout.add(time.monotonic() - start_time)
+                        except TimeoutError as e:
+                            if is_redundant and is_redundant(key):
+                                logger.info(f"[Fmax] Run {key} timed out and is redundant, not retrying it")
+                                on_cancel(key)
+                                continue
+                            if flow is not None and timeout.is_adaptive(run_timeout):
+                                logger.warning(f"[Fmax] Run {key} took longer than the adaptive timeout of {run_timeout:.0f} seconds, "
+                                               f"retrying with a timeout of {timeout.max_timeout} seconds")
+                                if on_retry:
+                                    on_retry(key)
+                                retries.append((key, flow))
+                                continue
+                            logger.critical(
+                                f"Flow run {key} took longer than {e.args[1]} seconds and was cancelled.")
+                        except ProcessExpired as e:
+                            logger.critical(f"{e}. Exit code: {e.exitcode}")
+                        except (CancelledError, AgentLost) as e:
+                            logger.warning(f"[Fmax] Run {key} was cancelled{': ' + str(e) if str(e) else ''}")
+                            on_cancel(key)
+                            continue
+                        if pool.admission:
+                            pool.admission.record(results)
+                        if results is not None:
+                            self.ingest_artifacts(self.load_flowclass(self.args.flow), flow_run_dir)
+                        on_done(key, results, fs, flow_run_dir)
+                        if is_redundant:
+                            for f, k in list(pending.items()):
+                                if is_redundant(k):
+                                    logger.info(f"[Fmax] Cancelling redundant run {k}")
+                                    f.cancel()
+                                    del pending[f]
+                                    on_cancel(k)
+                            for retry in [r for r in retries if is_redundant(r[0])]:
+                                logger.info(f"[Fmax] Dropping the retry of redundant run {retry[0]}")
+                                retries.remove(retry)
+                                on_cancel(retry[0])
+                    # tools of cancelled, timed-out, or crashed workers run in their own session and outlive the worker
+                    nukemall(orphans_only=True)
+            except KeyboardInterrupt:
+                pool.stop()
+                raise
+            finally:
+                for future in pending:
+                    future.cancel()
+
     def launch(self):
         start_time = time.monotonic()
 
@@ -95,198 +463,141 @@ class FmaxRunner(FlowRunner):
         flow_settings['fmax_high'] = hi_freq
         flow_settings.pop('fmax_low_freq', None)
         flow_settings.pop('fmax_high_freq', None)
-        
+
         assert lo_freq < hi_freq, "fmax_low_freq should be less than fmax_high_freq"
         resolution = 0.09
-        delta_increment = resolution / 2
-
-        ONE_THOUSAND = 1000.0
 
         nthreads = int(flow_settings.get('nthreads', 4))
+        resume = flow_settings.get('fmax_resume', True)
+        # keep all artifacts only for this many of the highest-frequency runs, prune the rest as soon as they are dominated
+        keep_top = flow_settings.get('fmax_keep_top')
+        retention = RetentionPolicy(keep_top, self.load_flowclass(flow_name).reports_subdir_name) if keep_top else None
 
         max_workers = max(2, args.max_cpus // nthreads)
         logger.info(f'nthreads={nthreads} num_workers={max_workers}')
         args.quiet = True
 
-        best = None
+        search = FmaxSearch(lo_freq, hi_freq, resolution)
         flow_run_dirs = []
         successful_results = []
-        future = None
-        num_iterations = 0
-        pool = None
-        no_improvements = 0
-
-        previously_tried_frequencies = set()
-        # can be different due to rounding errors, TODO only keep track of periods?
-        previously_tried_periods = set()
-
-        # TODO adaptive tweeking of timeout?
-        proc_timeout_seconds = flow_settings.get('timeout', 3600)
-        logger.info(f'[Fmax] Timeout set to: {proc_timeout_seconds} seconds.')
-
-        error_retries = 0
+        num_runs = 0
+
+        proc_timeout = self.adaptive_timeout(flow_settings)
+
+        state_path = self.state_path(flow_name)
+        runs = {}  # clock_period -> dict(run_hash, flow_run_dir, status)
+
+        def save_state():
+            state = dict(search=search.to_dict(), runs={str(p): r for p, r in runs.items()})
+            state_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = state_path.with_suffix('.tmp')
+            with open(tmp_path, 'w') as f:
+                json.dump(state, f, default=lambda x: x.__dict__ if hasattr(
+                    x, '__dict__') else str(x), indent=4)
+            os.replace(tmp_path, state_path)
+
+        def apply_retention(clock_period, results, run):
+            run_dir = run.get('flow_run_dir')
+            if not run_dir:
+                return
+            if results and results.get('success') and not results.get('exceeds_max_luts'):
+                run['retention'] = 'full'
+                for pruned_dir in retention.add_successful(period_to_freq(clock_period), run_dir):
+                    for r in runs.values():
+                        if r.get('flow_run_dir') == str(pruned_dir):
+                            r['retention'] = 'dominated'
+            elif results and results.get('success'):
+                retention.prune_dominated(run_dir)
+                run['retention'] = 'dominated'
+            else:
+                retention.prune_failed(run_dir)
+                run['retention'] = 'failed'
+
+        def record(clock_period, results, fs, flow_run_dir, run):
+            runs[clock_period] = run
+            if flow_run_dir:
+                flow_run_dirs.append(flow_run_dir)
+            if results and results.get('success'):
+                r = {k: results.get(k) for k in (
+                    'clock_period', 'clock_frequency', 'wns', 'lut', 'ff', 'slice')}
+                r['flow_run_dir'] = flow_run_dir
+                successful_results.append(r)
+            improved = search.update(clock_period, results, fs)
+            if retention:
+                apply_retention(clock_period, results, run)
+            return improved
+
+        if resume:
+            previous_runs = []
+            if state_path.exists():
+                try:
+                    with open(state_path) as f:
+                        previous_runs = [(dict(clock_period=float(p)), r) for p, r in json.load(f).get('runs', {}).items()]
+                except Exception as e:
+                    logger.warning(f"[Fmax] Ignoring unreadable state file {state_path}: {e}")
+            harvested = self.harvest(flow_settings, design_settings, flow_name, nthreads, previous_runs)
+            for variant, results, fs, flow_run_dir, run in sorted(harvested, key=lambda h: h[0]['clock_period']):
+                record(variant['clock_period'], results, fs, flow_run_dir, run)
+            if harvested:
+                logger.info(f"[Fmax] Reusing {len(harvested)} previous run(s) with matching run hashes.")
+                if search.best:
+                    logger.info(f"[Fmax] Warm start from best frequency {search.best.freq:.2f} MHz")
+                save_state()
+
+        def next_candidate():
+            clock_period = search.next_period()
+            if clock_period is None:
+                return None
+            flow = self.setup_candidate(flow_settings, design_settings, flow_name, nthreads, dict(clock_period=clock_period))
+            runs[clock_period] = dict(run_hash=flow.xedahash, flow_run_dir=str(flow.flow_run_dir), status='running')
+            logger.info(f"[Fmax] Trying {period_to_freq(clock_period):.2f} MHz (clock_period={clock_period})")
+            search.start(clock_period)
+            return clock_period, flow
+
+        def on_cancel(clock_period):
+            search.discard(clock_period)
+            run = runs.pop(clock_period, {})
+            if retention and run.get('flow_run_dir'):
+                retention.prune_dominated(run['flow_run_dir'])
+
+        def on_retry(clock_period):
+            run = runs.get(clock_period)
+            if run:
+                # not a failure: retried on resume if interrupted before the retry completes
+                run['status'] = 'timeout'
+                save_state()
+
+        def on_done(clock_period, results, fs, flow_run_dir):
+            nonlocal num_runs
+            num_runs += 1
+            run = runs.get(clock_period, {})
+            run['status'] = 'error' if not results else 'passed' if results.get('success') else 'failed'
+            improved = record(clock_period, results, fs, flow_run_dir, run)
+            save_state()
+            if improved:
+                logger.info(f"[Fmax] Improved best frequency to {search.best.freq:.2f} MHz")
+                print_results(search.best.results, title='Best so far', subset=[
+                    'clock_period', 'clock_frequency', 'wns', 'lut', 'ff', 'slice'])
+            logger.info(
+                f'[Fmax] Completed runs: {num_runs}. Execution Time so far: {int(time.monotonic() - start_time) // 60} minute(s)')
+            logger.info(f"[Fmax] Search interval: [{search.lo_freq:.2f} ... {search.hi_freq:.2f}]")
 
-        def round_freq_to_ps(freq: float) -> float:
-            period = round(ONE_THOUSAND / freq, 3)
-            return ONE_THOUSAND / period
         try:
-            with ProcessPool(max_workers=max_workers) as pool:
-                while hi_freq - lo_freq >= resolution:
-
-                    finder_retries = 0
-                    while True:
-                        frequencies_to_try, freq_step = numpy.linspace(
-                            lo_freq, hi_freq, num=max_workers, dtype=float, retstep=True)
-
-                        frequencies_to_try = unique([round_freq_to_ps(
-                            f) for f in frequencies_to_try if f not in previously_tried_frequencies])
-
-                        clock_periods_to_try = []
-                        frequencies = []
-                        for freq in frequencies_to_try:
-                            clock_period = round(ONE_THOUSAND / freq, 3)
-                            if clock_period not in previously_tried_periods:
-                                clock_periods_to_try.append(clock_period)
-                                frequencies.append(freq)
-                        frequencies_to_try = frequencies
-
-                        min_required = (
-                            max_workers - max(2, max_workers / 4)) if finder_retries > 20 else max_workers
-
-                        if len(frequencies_to_try) >= max(1, min_required):
-                            break
-                        hi_freq += random.random() * delta_increment
-                        min_lo_freq = best.freq + delta_increment if best else lo_freq
-                        lo_freq = max(min_lo_freq, lo_freq - 0.1 * random.random())
-                        finder_retries += 1
-
-                    logger.info(
-                        f"[Fmax] Trying following frequencies (MHz): {[f'{freq:.2f}' for freq in frequencies_to_try]}")
-
-                    # TODO Just keep clock_periods!
-                    previously_tried_frequencies.update(frequencies_to_try)
-                    previously_tried_periods.update(clock_periods_to_try)
-
-                    flows_to_run = []
-                    for clock_period in clock_periods_to_try:
-                        flow_settings['clock_period'] = clock_period
-                        flow_settings['nthreads'] = nthreads
-                        flow = self.setup_flow(
-                            flow_settings, design_settings, flow_name)
-
-                        flow.no_console = True
-                        flows_to_run.append(flow)
-
-                    future = pool.map(run_flow_fmax, enumerate(
-                        flows_to_run), timeout=proc_timeout_seconds)
-                    num_iterations += 1
-
-                    improved_idx = None
-
-                    try:
-                        iterator = future.result()
-                        if not iterator:
-                            logger.error("iterator is None! Retrying")
-                            if error_retries < 4:
-                                error_retries += 1
-                                continue  # retry
-                            else:
-                                logger.error("error_retries > MAX, exiting")
-                                break
-                        while True:
-                            try:
-                                idx, results, fs, flow_run_dir = next(iterator)
-                                flow_run_dirs.append(flow_run_dir)
-                                if idx and results:
-                                    freq = frequencies_to_try[idx]
-                                    if results['success']:
-                                        error_retries = 0
-                                        r = {k: results.get(k) for k in (
-                                            'clock_period', 'clock_frequency', 'wns', 'lut', 'ff', 'slice')}
-                                        r['flow_run_dir'] = flow_run_dir
-                                        successful_results.append(r)
-                                        if not best or freq > best.freq:
-                                            best = Best(freq, results, fs)
-                                            improved_idx = idx
-                            except StopIteration:
-                                break # inner while True
-                            except TimeoutError as e:
-                                logger.critical(
-                                    f"Flow run took longer than {e.args[1]} seconds. Cancelling remaining tasks.")
-                                future.cancel()
-                            except ProcessExpired as e:
-                                logger.critical(
-                                    f"{e}. Exit code: {e.exitcode}")
-                    except CancelledError:
-                        logger.warning("[Fmax] CancelledError")
-                    except KeyboardInterrupt:
-                        pool.stop()
-                        pool.join()
-                        raise
-
-                    if freq_step < resolution * 0.5:
-                        logger.info(
-                            f"Stopping: freq_step={freq_step} is below the limit")
-                        break
-
-                    if not best or improved_idx is None:
-                        no_improvements += 1
-                        if no_improvements > 4:
-                            logger.info(
-                                f"Stopping no viable frequencies found after {no_improvements} tries.")
-                            break
-                        logger.info(f"No improvements during this iteration.")
-                        if not best:
-                            hi_freq = lo_freq + resolution
-                            shrink_factor = 0.7 + no_improvements
-                            lo_freq /= shrink_factor
-                        else:
-                            if no_improvements > 2 and freq_step < no_improvements * resolution:
-                                logger.info(
-                                    f"Stopping as there were no improvements in {no_improvements} consecutive iterations.")
-                                break
-                            hi_freq = best.freq + 1.5 * max(freq_step, 1 + max_workers * resolution)
-                            lo_freq = (lo_freq + best.freq) / 2
-                    else:
-                        lo_freq = best.freq + delta_increment + delta_increment * random.random()
-                        no_improvements = 0
-                        # last or one before last
-                        if improved_idx >= (len(frequencies_to_try) // 2) or frequencies_to_try[-1] - best.freq <= freq_step:
-                            min_plausible_period = (
-                                ONE_THOUSAND / best.freq) - best.results['wns'] - 0.001
-                            lo_point_choice = frequencies_to_try[1] if len(
-                                frequencies_to_try) > 4 else frequencies_to_try[0]
-                            hi_freq = max(best.freq + min(max_workers * 1.0, best.freq -
-                                                          lo_point_choice),  ceil(ONE_THOUSAND / min_plausible_period))
-                        else:
-                            hi_freq = (hi_freq + best.freq + freq_step) / 2
-
-                        hi_freq += 1
-
-                    hi_freq = ceil(hi_freq)
-
-                    logger.info(f'[Fmax] End of iteration #{num_iterations}')
-                    logger.info(
-                        f'[Fmax] Execution Time so far: {int(time.monotonic() - start_time) // 60} minute(s)')
-                    if best and best.results:
-                        print_results(best.results, title='Best so far', subset=[
-                                      'clock_period', 'clock_frequency', 'wns', 'lut', 'ff', 'slice'])
-                    logger.info(f"Next iteration: [{lo_freq} ... {hi_freq}] resolution={resolution}")
-
+            self.run_pool(self.worker_pool(flow_settings, max_workers, nthreads), proc_timeout,
+                          next_candidate, on_done, on_cancel, is_redundant=search.is_redundant, on_retry=on_retry)
+            logger.info(
+                f"[Fmax] Stopping: no candidates left in [{search.lo_freq:.2f} ... {search.hi_freq:.2f}] at resolution={resolution}")
         except KeyboardInterrupt:
             logger.exception('Received Keyboard Interrupt')
         except Exception as e:
             logger.exception(f'Received exception: {e}')
             traceback.print_exc()
         finally:
-            if future and not future.cancelled():
-                future.cancel()
-            if pool:
-                pool.close()
-                pool.join()
+            save_state()
             runtime_minutes = int(time.monotonic() - start_time) // 60
+            best = search.best
             if best:
-                best.iterations = num_iterations
+                best.iterations = num_runs
                 best.runtime_minutes = runtime_minutes
                 print_results(best.results, title='Best Results', subset=[
                     'clock_period', 'clock_frequency', 'lut', 'ff', 'slice'])
@@ -301,4 +612,6 @@ class FmaxRunner(FlowRunner):
                 logger.warning("No successful results.")
             logger.info(
                 f'[Fmax] Total Execution Time: {runtime_minutes} minute(s)')
-            logger.info(f'[Fmax] Total Iterations: {num_iterations}')
+            logger.info(f'[Fmax] Total Runs: {num_runs}')
+            if retention:
+                logger.info(f'[Fmax] Disk space freed by retention policy: {retention.freed_bytes / (1 << 20):.1f} MiB')
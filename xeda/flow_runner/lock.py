@@ -0,0 +1,131 @@
+import json
+import logging
+import os
+import socket
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+logger = logging.getLogger()
+
+
+def pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class RunLock:
+    """
+    Exclusive lock of a run (i.e. of a run hash), shared by all xeda processes using the same xeda_run_dir, possibly on different hosts.
+    The lock is a file created with O_EXCL, holding the host and pid of its owner. The owner refreshes its modification time every
+    `stale_timeout / 4` seconds. A lock is stale, and is broken, if its owner is a dead process on the same host or if it wasn't refreshed
+    for `stale_timeout` seconds.
+    `waited` is True if the lock was held by another process when we tried to acquire it: the run might have been completed in the meantime.
+    """
+
+    def __init__(self, path, stale_timeout: float = 300, poll_interval: float = 1.0) -> None:
+        self.path = Path(path)
+        self.stale_timeout = stale_timeout
+        self.poll_interval = poll_interval
+        self.waited = False
+        self.owner = dict(host=socket.gethostname(), pid=os.getpid())
+        self.content = None
+        self._stop = threading.Event()
+        self._heartbeat: Optional[threading.Thread] = None
+
+    def _try_create(self) -> bool:
+        try:
+            fd = os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+        except FileExistsError:
+            return False
+        self.content = dict(self.owner, time=time.time())
+        with os.fdopen(fd, 'w') as f:
+            json.dump(self.content, f)
+        return True
+
+    def _read(self, path=None) -> Optional[dict]:
+        try:
+            with open(path or self.path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _is_stale(self, owner: Optional[dict]) -> bool:
+        try:
+            age = time.time() - self.path.stat().st_mtime
+        except FileNotFoundError:
+            return False
+        if age > self.stale_timeout:
+            return True
+        if owner and owner.get('host') == self.owner['host'] and isinstance(owner.get('pid'), int):
+            return not pid_alive(owner['pid'])
+        # unreadable lock (being written) or lock of another host
+        return False
+
+    def _break(self, owner: Optional[dict]):
+        """remove a stale lock, unless it was replaced by another process in the meantime"""
+        broken = self.path.with_name(f'{self.path.name}.stale.{os.getpid()}')
+        try:
+            os.rename(self.path, broken)
+        except FileNotFoundError:
+            return
+        if self._read(broken) != owner:
+            # someone else broke the stale lock and acquired a new one before us: put it back
+            try:
+                os.link(broken, self.path)
+            except FileExistsError:
+                pass
+        else:
+            logger.warning(f"[Lock] Broke stale lock {self.path} of {owner}")
+        os.unlink(broken)
+
+    def acquire(self, timeout: Optional[float] = None) -> bool:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self._try_create():
+            owner = self._read()
+            if self._is_stale(owner):
+                self._break(owner)
+                continue
+            if not self.waited:
+                logger.info(f"[Lock] Waiting for the run in progress by {owner or 'another process'} ({self.path})")
+                self.waited = True
+            if deadline is not None and time.monotonic() > deadline:
+                return False
+            time.sleep(self.poll_interval)
+        self._stop.clear()
+        self._heartbeat = threading.Thread(target=self._refresh, daemon=True)
+        self._heartbeat.start()
+        return True
+
+    def _refresh(self):
+        while not self._stop.wait(self.stale_timeout / 4):
+            try:
+                os.utime(self.path)
+            except OSError as e:
+                logger.warning(f"[Lock] Failed to refresh {self.path}: {e}")
+
+    def release(self):
+        self._stop.set()
+        if self._heartbeat:
+            self._heartbeat.join()
+            self._heartbeat = None
+        # our lock might have been broken as stale, e.g. after a long suspend
+        if self.content and self._read() == self.content:
+            try:
+                self.path.unlink()
+            except FileNotFoundError:
+                pass
+
+    def __enter__(self) -> 'RunLock':
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
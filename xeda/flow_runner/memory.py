@@ -0,0 +1,144 @@
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from ..flows.flow import process_rss, process_table
+
+logger = logging.getLogger()
+
+MB = 1 << 20
+
+
+def meminfo() -> Dict[str, int]:
+    """/proc/meminfo in bytes (Linux only, empty otherwise)"""
+    info = {}
+    try:
+        with open('/proc/meminfo') as f:
+            for line in f:
+                key, value = line.split(':', 1)
+                value = value.split()
+                info[key] = int(value[0]) * (1024 if value[1:] == ['kB'] else 1)
+    except (OSError, ValueError, IndexError):
+        pass
+    return info
+
+
+def available_memory() -> Optional[int]:
+    """memory (bytes) available for starting new applications without swapping"""
+    info = meminfo()
+    if 'MemAvailable' in info:
+        return info['MemAvailable']
+    if 'MemFree' in info:  # kernels older than 3.14
+        return info['MemFree'] + info.get('Cached', 0)
+    return None
+
+
+def tools_rss() -> int:
+    """
+    total resident memory (bytes) of the tools run by this process and its workers,
+    i.e. of its descendants outside of its process group (tools run in their own session, see Flow.run_process)
+    """
+    table = process_table()
+    children = {}
+    for p, (ppid, _, _, _) in table.items():
+        children.setdefault(ppid, []).append(p)
+    my_pgid = os.getpgid(0)
+    total = 0
+    stack = list(children.get(os.getpid(), []))
+    while stack:
+        p = stack.pop()
+        if table[p][1] != my_pgid:
+            total += process_rss(p)
+        stack.extend(children.get(p, []))
+    return total
+
+
+class MemoryHistory:
+    """Peak memory usage (MB) of recent runs of each design/flow, persisted in a JSON file"""
+
+    max_entries = 20
+
+    def __init__(self, path) -> None:
+        self.path = Path(path)
+        self.peaks: Dict[str, List[float]] = {}
+        try:
+            with open(self.path) as f:
+                self.peaks = json.load(f)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f"[Memory] Failed to load {self.path}: {e}")
+
+    def record(self, key: str, peak_mb: float):
+        self.peaks[key] = (self.peaks.get(key, []) + [float(peak_mb)])[-self.max_entries:]
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_name(self.path.name + '.tmp')
+            with open(tmp, 'w') as f:
+                json.dump(self.peaks, f, indent=1)
+            os.replace(tmp, self.path)
+        except OSError as e:
+            logger.warning(f"[Memory] Failed to save {self.path}: {e}")
+
+    def estimate(self, key: str, recent: int = 10) -> Optional[float]:
+        """largest peak (MB) of the most recent runs"""
+        peaks = self.peaks.get(key)
+        return max(peaks[-recent:]) if peaks else None
+
+
+class MemoryAdmission:
+    """
+    Admission control of concurrent local runs based on their projected memory usage.
+    A new run is only started if its estimated peak memory fits in the available memory, after setting aside
+    the memory which the already running runs are still expected to grow into and `reserve_mb`.
+    The estimate (MB) of a run is the largest of:
+        the peak memory usage of recent runs of the same design and flow (scaled by `margin`)
+        `default_mb` (flow setting `memory_per_run`)
+        the average current memory usage of the running runs
+    A run is always admitted when nothing else is running, so that jobs are queued and never fail for lack of memory.
+    """
+
+    def __init__(self, history: MemoryHistory, key: str, default_mb: Optional[float] = None, reserve_mb: float = 1024,
+                 margin: float = 1.1) -> None:
+        self.history = history
+        self.key = key
+        self.default_mb = default_mb
+        self.reserve_mb = reserve_mb
+        self.margin = margin
+        self.waiting = False
+
+    def estimate(self, num_running: int, running_mb: float) -> float:
+        estimates = [self.default_mb or 0]
+        history = self.history.estimate(self.key)
+        if history:
+            estimates.append(history * self.margin)
+        if num_running:
+            estimates.append(running_mb / num_running)
+        return max(estimates)
+
+    def admit(self, num_running: int) -> bool:
+        if num_running == 0:
+            return True
+        available = available_memory()
+        if available is None:
+            return True
+        available_mb = available / MB
+        running_mb = tools_rss() / MB
+        estimate = self.estimate(num_running, running_mb)
+        outstanding = max(0.0, num_running * estimate - running_mb)
+        admitted = available_mb - outstanding - self.reserve_mb >= estimate
+        if admitted != (not self.waiting):
+            self.waiting = not admitted
+            if self.waiting:
+                logger.info(f"[Memory] Queuing new runs: {available_mb:.0f} MB available, {outstanding:.0f} MB still expected "
+                            f"by {num_running} running run(s), {estimate:.0f} MB estimated per run")
+            else:
+                logger.info(f"[Memory] Resuming new runs: {available_mb:.0f} MB available")
+        return admitted
+
+    def record(self, results):
+        peak = results.get('peak_memory_mb') if results else None
+        if peak:
+            self.history.record(self.key, peak)
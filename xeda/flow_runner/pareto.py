@@ -0,0 +1,287 @@
+import heapq
+import json
+import logging
+import time
+import traceback
+from pathlib import Path
+from typing import Any, Dict, List
+
+from ..flows.flow import my_print
+from .fmax import FmaxRunner, FmaxSearch, freq_to_period, period_to_freq
+from .retention import RetentionPolicy
+
+logger = logging.getLogger()
+
+
+def _to_float(v):
+    try:
+        return float(v)
+    except (TypeError, ValueError):
+        return None
+
+
+class ParetoFront:
+    """
+    Non-dominated set of implementation points. Frequency ('freq') is maximized, all other objectives are minimized.
+    Objectives which are not available for either of the two compared points are ignored.
+    """
+
+    def __init__(self, objectives: List[str]) -> None:
+        self.objectives = objectives
+        self.points: List[Dict[str, Any]] = []
+
+    def dominates(self, a, b) -> bool:
+        if a['freq'] < b['freq']:
+            return False
+        strictly_better = a['freq'] > b['freq']
+        for obj in self.objectives:
+            va, vb = a.get(obj), b.get(obj)
+            if va is None or vb is None:
+                continue
+            if va > vb:
+                return False
+            if va < vb:
+                strictly_better = True
+        return strictly_better
+
+    def add(self, point):
+        """
+        Returns (added, removed) where added is True if point is non-dominated and removed is the list of the points
+        that the new point dominates and were removed from the front
+        """
+        if any(self.dominates(p, point) or self._same(p, point) for p in self.points):
+            return False, []
+        removed = [p for p in self.points if self.dominates(point, p)]
+        self.points = [p for p in self.points if p not in removed] + [point]
+        return True, removed
+
+    def _same(self, a, b):
+        return a['freq'] == b['freq'] and all(a.get(obj) == b.get(obj) for obj in self.objectives)
+
+    def sorted(self):
+        return sorted(self.points, key=lambda p: p['freq'], reverse=True)
+
+
+class ParetoSearch:
+    """
+    Chooses (clock_period, strategy) candidates that are most likely to extend the Pareto front:
+        1. the front is extended towards higher frequencies through a separate Fmax search per strategy
+        2. the largest (relative) frequency gaps between points of the front are bisected, trying every strategy
+    """
+
+    def __init__(self, lo_freq, hi_freq, strategies, objectives, resolution, min_gap) -> None:
+        self.strategies = strategies
+        self.min_gap = min_gap
+        self.searches = {s: FmaxSearch(lo_freq, hi_freq, resolution) for s in strategies}
+        self.front = ParetoFront(objectives)
+        self.tried = set()  # (clock_period, strategy) of completed or in-flight runs
+        self._round_robin = 0
+
+    def next_candidate(self):
+        n = len(self.strategies)
+        for _ in range(n):
+            strategy = self.strategies[self._round_robin % n]
+            self._round_robin += 1
+            period = self.searches[strategy].next_period()
+            if period is not None and (period, strategy) not in self.tried:
+                return period, strategy
+
+        freqs = sorted({p['freq'] for p in self.front.points})
+        gaps = [(-(hi - lo) / hi, lo, hi) for lo, hi in zip(freqs, freqs[1:])]
+        heapq.heapify(gaps)
+        while gaps:
+            neg_rel_gap, lo, hi = heapq.heappop(gaps)
+            if -neg_rel_gap < self.min_gap:
+                break
+            mid = (lo + hi) / 2
+            period = freq_to_period(mid)
+            for strategy in self.strategies:
+                if (period, strategy) not in self.tried:
+                    return period, strategy
+            # every strategy was already tried in the middle of this gap, go one level deeper
+            heapq.heappush(gaps, (-(mid - lo) / mid, lo, mid))
+            heapq.heappush(gaps, (-(hi - mid) / hi, mid, hi))
+        return None
+
+    def start(self, period, strategy):
+        self.tried.add((period, strategy))
+        self.searches[strategy].start(period)
+
+    def discard(self, period, strategy):
+        self.tried.discard((period, strategy))
+        self.searches[strategy].discard(period)
+
+    def update(self, period, strategy, results, settings, point):
+        """returns (added, removed) for the Pareto front"""
+        self.tried.add((period, strategy))
+        self.searches[strategy].update(period, results, settings)
+        if point is None:
+            return False, []
+        return self.front.add(point)
+
+
+class ParetoRunner(FmaxRunner):
+    """
+    Multi-objective exploration of frequency vs. resource utilization (and power, if reported by the flow).
+    Explores clock periods and implementation strategies and keeps the set of non-dominated results.
+
+    Flow settings used by the runner:
+        fmax_low, fmax_high: initial frequency range (MHz)
+        pareto_strategies: list of strategies to explore (default: the flow's `strategy`)
+        pareto_objectives: results to minimize (default: lut, ff, slice, power). Frequency is always maximized.
+        pareto_resolution: frequency resolution (MHz) of the per-strategy Fmax searches
+        pareto_min_gap: smallest relative frequency gap between points of the front that is worth exploring
+        pareto_max_runs: maximum number of flow runs
+        pareto_prune: prune run directories of dominated and failed runs (see RetentionPolicy)
+    Runs are kept in the `pareto` subdirectory of xeda_run_dir.
+    """
+
+    runner_settings = FmaxRunner.runner_settings + \
+        ('pareto_strategies', 'pareto_objectives', 'pareto_resolution', 'pareto_min_gap', 'pareto_max_runs', 'pareto_prune')
+    variant_keys = ('clock_period', 'strategy')
+    run_dir_name = 'pareto'
+    default_objectives = ['lut', 'ff', 'slice', 'power']
+    table_columns = ['freq', 'clock_period', 'strategy']
+
+    def make_point(self, variant, results, flow_run_dir, objectives):
+        if not results or not results.get('success') or results.get('exceeds_max_luts'):
+            return None
+        point = dict(freq=period_to_freq(variant['clock_period']), **variant)
+        for obj in objectives:
+            point[obj] = _to_float(results.get(obj))
+        point['flow_run_dir'] = str(flow_run_dir)
+        return point
+
+    def print_front(self, points, objectives):
+        columns = self.table_columns + objectives
+        widths = [max(12, len(c) + 2) for c in columns]
+        hline = '-' * sum(widths)
+        my_print('\n' + hline)
+        my_print(f"{'Pareto Front':^{len(hline)}s}")
+        my_print(hline)
+        my_print(''.join(f'{c:>{w}}' for c, w in zip(columns, widths)))
+        my_print(hline)
+        for p in points:
+            cells = []
+            for c, w in zip(columns, widths):
+                v = p.get(c)
+                cells.append(f'{v:>{w}.3f}' if isinstance(v, float) else f'{str(v):>{w}}')
+            my_print(''.join(cells))
+        my_print(hline + '\n')
+
+    def launch(self):
+        start_time = time.monotonic()
+
+        args = self.args
+        settings = self.all_settings
+        flow_name = args.flow
+        flow_settings = settings['flows'].get(flow_name)
+        design_settings = settings['design']
+
+        lo_freq = float(flow_settings.get('fmax_low', flow_settings.get('fmax_low_freq', 10.0)))
+        hi_freq = float(flow_settings.get('fmax_high', flow_settings.get('fmax_high_freq', 500.0)))
+        assert lo_freq < hi_freq, "fmax_low should be less than fmax_high"
+
+        strategies = flow_settings.get('pareto_strategies') or [flow_settings.get('strategy')]
+        if isinstance(strategies, str):
+            strategies = [strategies]
+        objectives = flow_settings.get('pareto_objectives', self.default_objectives)
+        resolution = float(flow_settings.get('pareto_resolution', 1.0))
+        min_gap = float(flow_settings.get('pareto_min_gap', 0.05))
+        max_runs = int(flow_settings.get('pareto_max_runs', 100))
+        # points of the front are kept until they are dominated, there's no ranking by a single score
+        retention = RetentionPolicy(None, self.load_flowclass(flow_name).reports_subdir_name) \
+            if flow_settings.get('pareto_prune') else None
+
+        nthreads = int(flow_settings.get('nthreads', 4))
+        max_workers = max(2, args.max_cpus // nthreads)
+        logger.info(f'nthreads={nthreads} num_workers={max_workers} strategies={strategies} objectives={objectives}')
+        args.quiet = True
+
+        proc_timeout = self.adaptive_timeout(flow_settings)
+
+        search = ParetoSearch(lo_freq, hi_freq, strategies, objectives, resolution, min_gap)
+        num_runs = 0
+        num_started = 0
+        flow_run_dirs = {}  # (clock_period, strategy) -> flow_run_dir
+
+        front_json_path = Path(args.xeda_run_dir) / \
+            f'pareto_{design_settings["name"]}_{flow_name}_{self.timestamp}.json'
+
+        def save_front():
+            front_json_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(front_json_path, 'w') as f:
+                json.dump(dict(objectives=['freq'] + objectives, strategies=strategies, front=search.front.sorted()),
+                          f, indent=4, default=str)
+
+        def record(variant, results, settings, flow_run_dir):
+            period, strategy = variant['clock_period'], variant['strategy']
+            point = self.make_point(variant, results, flow_run_dir, objectives)
+            added, removed = search.update(period, strategy, results, settings, point)
+            if added:
+                logger.info(f"[Pareto] New point on the front: {point}")
+            if retention:
+                for p in removed:
+                    retention.prune_dominated(p['flow_run_dir'])
+                if flow_run_dir and added:
+                    retention.add_successful(point['freq'], flow_run_dir)
+                elif flow_run_dir and point:
+                    retention.prune_dominated(flow_run_dir)
+                elif flow_run_dir:
+                    retention.prune_failed(flow_run_dir)
+            return added
+
+        for variant, results, fs, flow_run_dir, _ in self.harvest(flow_settings, design_settings, flow_name, nthreads, []):
+            if variant['strategy'] in strategies and variant['clock_period'] is not None:
+                record(variant, results, fs, flow_run_dir)
+
+        def next_candidate():
+            nonlocal num_started
+            if num_started >= max_runs:
+                return None
+            candidate = search.next_candidate()
+            if candidate is None:
+                return None
+            period, strategy = candidate
+            variant = dict(clock_period=period, strategy=strategy)
+            flow = self.setup_candidate(flow_settings, design_settings, flow_name, nthreads, variant)
+            flow_run_dirs[candidate] = flow.flow_run_dir
+            logger.info(f"[Pareto] Trying {period_to_freq(period):.2f} MHz (clock_period={period}) strategy={strategy}")
+            search.start(period, strategy)
+            num_started += 1
+            return candidate, flow
+
+        def on_cancel(key):
+            nonlocal num_started
+            num_started -= 1
+            search.discard(*key)
+
+        def on_done(key, results, fs, flow_run_dir):
+            nonlocal num_runs
+            num_runs += 1
+            period, strategy = key
+            if record(dict(clock_period=period, strategy=strategy), results, fs, flow_run_dir or flow_run_dirs.get(key)):
+                save_front()
+            logger.info(
+                f'[Pareto] Completed runs: {num_runs}. Points on the front: {len(search.front.points)}. Execution Time so far: {int(time.monotonic() - start_time) // 60} minute(s)')
+
+        try:
+            self.run_pool(self.worker_pool(flow_settings, max_workers, nthreads), proc_timeout,
+                          next_candidate, on_done, on_cancel)
+        except KeyboardInterrupt:
+            logger.exception('Received Keyboard Interrupt')
+        except Exception as e:
+            logger.exception(f'Received exception: {e}')
+            traceback.print_exc()
+        finally:
+            front = search.front.sorted()
+            if front:
+                self.print_front(front, objectives)
+                save_front()
+                logger.info(f"[Pareto] Front written to {front_json_path}")
+            else:
+                logger.warning("No successful results.")
+            logger.info(f'[Pareto] Total Execution Time: {int(time.monotonic() - start_time) // 60} minute(s)')
+            logger.info(f'[Pareto] Total Runs: {num_runs}')
+            if retention:
+                logger.info(f'[Pareto] Disk space freed by retention policy: {retention.freed_bytes / (1 << 20):.1f} MiB')
@@ -0,0 +1,91 @@
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Set
+
+logger = logging.getLogger()
+
+
+def parse_cpulist(cpulist: str) -> List[int]:
+    """'0-3,8,10-11' -> [0, 1, 2, 3, 8, 10, 11]"""
+    cpus = []
+    for part in cpulist.strip().split(','):
+        if not part:
+            continue
+        if '-' in part:
+            lo, hi = part.split('-')
+            cpus.extend(range(int(lo), int(hi) + 1))
+        else:
+            cpus.append(int(part))
+    return cpus
+
+
+def format_cpulist(cpus) -> str:
+    """[0, 1, 2, 3, 8] -> '0-3,8'"""
+    ranges = []
+    for cpu in sorted(cpus):
+        if ranges and cpu == ranges[-1][1] + 1:
+            ranges[-1][1] = cpu
+        else:
+            ranges.append([cpu, cpu])
+    return ','.join(str(lo) if lo == hi else f'{lo}-{hi}' for lo, hi in ranges)
+
+
+def numa_nodes() -> Dict[int, List[int]]:
+    """{node: [cpu, ...]} of the CPUs this process is allowed to run on. A single node (0) if the topology is unknown."""
+    allowed = set(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else set(range(os.cpu_count() or 1))
+    nodes = {}
+    for node_dir in Path('/sys/devices/system/node').glob('node[0-9]*'):
+        try:
+            cpus = [c for c in parse_cpulist((node_dir / 'cpulist').read_text()) if c in allowed]
+        except (OSError, ValueError):
+            continue
+        if cpus:
+            nodes[int(node_dir.name[4:])] = cpus
+    if not nodes or set().union(*nodes.values()) != allowed:
+        return {0: sorted(allowed)}
+    return nodes
+
+
+class CpuPlacement:
+    """
+    Assigns disjoint sets of CPUs to concurrent runs, keeping each set within a single NUMA node whenever one has enough free CPUs.
+    The tools of a run are pinned to its CPU set (see Flow.cpu_placement and Flow.run_flow).
+    """
+
+    def __init__(self, nodes: Optional[Dict[int, List[int]]] = None) -> None:
+        self.nodes = nodes or numa_nodes()
+        self.free: Dict[int, Set[int]] = {node: set(cpus) for node, cpus in self.nodes.items()}
+        self.lock = threading.Lock()
+
+    def allocate(self, ncpus: int) -> Optional[dict]:
+        """
+        Returns dict(cpus=[...], numa_nodes=[...]) or None if less than `ncpus` CPUs are free.
+        The smallest node which fits the run is used to keep larger nodes available for larger runs.
+        """
+        with self.lock:
+            fitting = [node for node, free in self.free.items() if len(free) >= ncpus]
+            if fitting:
+                node = min(fitting, key=lambda n: (len(self.free[n]), n))
+                cpus = sorted(self.free[node])[:ncpus]
+            elif sum(len(free) for free in self.free.values()) >= ncpus:
+                # spread over the nodes with the most free CPUs
+                cpus = []
+                for node in sorted(self.free, key=lambda n: -len(self.free[n])):
+                    cpus += sorted(self.free[node])[:ncpus - len(cpus)]
+                    if len(cpus) == ncpus:
+                        break
+            else:
+                return None
+            for free in self.free.values():
+                free.difference_update(cpus)
+        used_nodes = sorted(node for node, node_cpus in self.nodes.items() if set(node_cpus) & set(cpus))
+        return dict(cpus=cpus, numa_nodes=used_nodes)
+
+    def release(self, placement: Optional[dict]):
+        if not placement:
+            return
+        with self.lock:
+            for node, node_cpus in self.nodes.items():
+                self.free[node].update(c for c in placement['cpus'] if c in node_cpus)
@@ -0,0 +1,532 @@
+"""
+Distributed execution of flow runs on remote worker agents.
+
+A WorkerPool runs flows on local worker processes and on any number of worker agents (`xeda-agent`) that connect to it over TCP.
+Agents receive serialized flow specifications (flow class, effective flow and design settings), never pickled Flow objects.
+Flows run locally on the agent's host and results, along with the selected artifacts of the run directory, are sent back.
+Design sources are referenced by their absolute paths, so they need to be accessible at the same location from every host (e.g. a shared filesystem).
+A shared token is required unless the runner only listens on a loopback address. The token itself is never sent, but the traffic is not encrypted:
+use an SSH tunnel or a VPN on untrusted networks.
+
+Protocol: newline-delimited JSON messages
+    runner -> agent: {"type": "challenge", "nonce": ...}
+    agent -> runner: {"type": "register", "host": ..., "cpus": ..., "auth": hex(HMAC-SHA256(token, nonce))}
+    runner -> agent: {"type": "job", "id": ..., "spec": {...}}
+    runner -> agent: {"type": "cancel", "id": ...}
+    agent -> runner: {"type": "result", "id": ..., "results": {...} or null, "artifacts": {relative_path: base64(gzip(content))}, "error": ...}
+"""
+
+import argparse
+import base64
+import gzip
+import hashlib
+import hmac
+import importlib
+import ipaddress
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+import socket
+import threading
+import time
+from concurrent.futures import Future, TimeoutError
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Dict, List, Optional
+
+from pebble.pool.process import ProcessPool
+
+from ..debug import DebugLevel
+from ..flows.flow import DesignSource, FileResource, Flow
+from .default_runner import FlowRunner, become_subreaper, nukemall
+
+logger = logging.getLogger()
+
+DEFAULT_PORT = 7821
+DEFAULT_ARTIFACTS = ['results.json', 'settings.json', '*.log', '*.log.gz', '*.log.zst', 'reports/**/*']
+MAX_ARTIFACTS_SIZE = 256 << 20  # bytes
+
+
+class AgentLost(Exception):
+    """Connection to the remote agent running the flow was lost"""
+    pass
+
+
+def parse_address(address, default_host='127.0.0.1'):
+    """'host:port', ':port', 'port', or (host, port)"""
+    if isinstance(address, (tuple, list)):
+        return address[0], int(address[1])
+    address = str(address)
+    if ':' in address:
+        host, port = address.rsplit(':', 1)
+        return host or default_host, int(port)
+    return default_host, int(address)
+
+
+def is_loopback(host) -> bool:
+    """True if `host` (an address or a host name) only resolves to loopback addresses"""
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        pass
+    try:
+        addresses = {info[4][0] for info in socket.getaddrinfo(host, None)}
+    except OSError:
+        return False
+    return bool(addresses) and all(ipaddress.ip_address(a.split('%')[0]).is_loopback for a in addresses)
+
+
+def auth_digest(token: str, nonce: str) -> str:
+    return hmac.new(token.encode('utf-8'), nonce.encode('ascii'), hashlib.sha256).hexdigest()
+
+
+def settings_to_spec(obj):
+    """JSON-serializable representation of settings, preserving FileResource and DesignSource objects"""
+    if isinstance(obj, DesignSource):
+        return {'__xeda_class__': 'DesignSource', 'file': str(obj.file), 'type': obj.type, 'variant': obj.variant, 'standard': obj.standard}
+    if isinstance(obj, FileResource):
+        return {'__xeda_class__': 'FileResource', 'file': str(obj.file)}
+    if isinstance(obj, dict):
+        return {k: settings_to_spec(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [settings_to_spec(v) for v in obj]
+    if obj is None or isinstance(obj, (str, int, float, bool)):
+        return obj
+    return str(obj)
+
+
+def spec_to_settings(obj):
+    if isinstance(obj, dict):
+        cls = obj.get('__xeda_class__')
+        if cls == 'DesignSource':
+            return DesignSource(obj['file'], type=obj.get('type'), standard=obj.get('standard'), variant=obj.get('variant'))
+        if cls == 'FileResource':
+            return FileResource(obj['file'])
+        return {k: spec_to_settings(v) for k, v in obj.items()}
+    if isinstance(obj, list):
+        return [spec_to_settings(v) for v in obj]
+    return obj
+
+
+def flow_spec(flow: Flow, artifacts: List[str]):
+    flow_cls = flow.__class__
+    return dict(
+        flow_class=f'{flow_cls.__module__}:{flow_cls.__qualname__}',
+        flow_settings=settings_to_spec(flow.settings.flow),
+        design_settings=settings_to_spec(flow.settings.design),
+        xeda_run_dir=str(flow.xeda_run_dir),
+        cwd=os.getcwd(),
+        run_hash=flow.xedahash,
+        artifacts=artifacts,
+    )
+
+
+def collect_artifacts(run_dir: Path, patterns: List[str], max_size=MAX_ARTIFACTS_SIZE) -> Dict[str, str]:
+    artifacts = {}
+    total = 0
+    for pattern in patterns:
+        for path in sorted(run_dir.glob(pattern)):
+            rel = str(path.relative_to(run_dir))
+            if not path.is_file() or rel in artifacts:
+                continue
+            size = path.stat().st_size
+            if total + size > max_size:
+                logger.warning(f"[Agent] Skipping artifact {path}: total size of artifacts exceeds {max_size} bytes")
+                continue
+            total += size
+            artifacts[rel] = base64.b64encode(gzip.compress(path.read_bytes())).decode('ascii')
+    return artifacts
+
+
+def restore_artifacts(run_dir: Path, artifacts: Dict[str, str]):
+    run_dir.mkdir(parents=True, exist_ok=True)
+    for rel, content in artifacts.items():
+        rel_path = Path(rel)
+        if rel_path.is_absolute() or '..' in rel_path.parts:
+            logger.warning(f"[Remote] Ignoring artifact with invalid path: {rel}")
+            continue
+        path = run_dir / rel_path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(gzip.decompress(base64.b64decode(content)))
+
+
+class _Connection:
+    def __init__(self, sock: socket.socket) -> None:
+        self.sock = sock
+        self.rfile = sock.makefile('r', encoding='utf-8')
+        self.send_lock = threading.Lock()
+
+    def send(self, msg):
+        data = (json.dumps(msg) + '\n').encode('utf-8')
+        with self.send_lock:
+            self.sock.sendall(data)
+
+    def messages(self):
+        for line in self.rfile:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+    def close(self):
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+
+
+class _RemoteAgent:
+    def __init__(self, conn: _Connection, host: str, cpus: int, slots: int) -> None:
+        self.conn = conn
+        self.host = host
+        self.cpus = cpus
+        self.slots = slots
+        self.jobs = {}  # job_id -> (future, flow)
+
+    @property
+    def free_slots(self):
+        return self.slots - len(self.jobs)
+
+    def __str__(self):
+        return f'{self.host}[cpus={self.cpus}, slots={self.slots}]'
+
+
+class WorkerPool:
+    """
+    Runs flows on local worker processes and on remote agents.
+    Each host (including the local one) provides `cpus // nthreads` concurrent slots.
+    A new run is always placed on the host with the most free slots.
+    """
+
+    poll_interval = 1.0  # seconds
+
+    def __init__(self, local_workers: int, nthreads: int, listen=None, token: Optional[str] = None, artifacts: Optional[List[str]] = None,
+                 admission=None, placement=None) -> None:
+        if listen and not token and not is_loopback(parse_address(listen)[0]):
+            raise ValueError(f"A token (flow setting `remote_token` or $XEDA_AGENT_TOKEN) is required to listen on {listen}")
+        self.local_workers = max(0, int(local_workers))
+        self.admission = admission  # e.g. MemoryAdmission, decides if a new run can start on the local host
+        self.placement = placement  # CpuPlacement of the local runs
+        self.nthreads = max(1, int(nthreads))
+        self.token = token
+        self.artifacts = artifacts if artifacts is not None else DEFAULT_ARTIFACTS
+        self.local_pool = ProcessPool(max_workers=self.local_workers) if self.local_workers else None
+        self.local_busy = 0
+        self.agents: List[_RemoteAgent] = []
+        self.lock = threading.RLock()
+        self.job_ids = itertools.count()
+        self.server = None
+        self.closed = False
+        if listen:
+            host, port = parse_address(listen)
+            self.server = self._create_server(host, port)
+            self.address = self.server.getsockname()
+            logger.info(f"[Remote] Listening for worker agents on {self.address[0]}:{self.address[1]}")
+            threading.Thread(target=self._accept, name='xeda-accept', daemon=True).start()
+
+    @staticmethod
+    def _create_server(host, port):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((host, port))
+        sock.listen()
+        return sock
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+        self.join()
+
+    @property
+    def capacity(self) -> int:
+        with self.lock:
+            return self.local_workers + sum(a.slots for a in self.agents)
+
+    def _free_local(self) -> int:
+        free_local = self.local_workers - self.local_busy
+        if free_local > 0 and self.admission and not self.admission.admit(self.local_busy):
+            return 0
+        return free_local
+
+    def can_schedule(self) -> bool:
+        """True if a new run can start right now"""
+        with self.lock:
+            return self._free_local() > 0 or any(a.free_slots > 0 for a in self.agents)
+
+    def schedule(self, run_function, flow: Flow, timeout=None) -> Future:
+        with self.lock:
+            free_local = self._free_local()
+            agent = max(self.agents, key=lambda a: a.free_slots, default=None)
+            free_remote = agent.free_slots if agent else 0
+            if free_local > 0 and free_local >= free_remote:
+                self.local_busy += 1
+                if self.placement:
+                    flow.cpu_placement = self.placement.allocate(self.nthreads)
+                future = self.local_pool.schedule(run_function, args=[flow], timeout=timeout)
+                future.add_done_callback(lambda f: self._local_done(f, flow.cpu_placement))
+                return future
+            if free_remote <= 0:
+                raise RuntimeError("No free workers")
+            job_id = next(self.job_ids)
+            future = Future()
+            agent.jobs[job_id] = (future, flow)
+        logger.info(f"[Remote] Running {flow.name} in {flow.flow_run_dir} on {agent}")
+        try:
+            agent.conn.send(dict(type='job', id=job_id, spec=flow_spec(flow, self.artifacts)))
+        except OSError as e:
+            self._drop_agent(agent, e)
+        future.add_done_callback(lambda f: self._remote_done(agent, job_id, f))
+        if timeout:
+            timer = threading.Timer(timeout, self._remote_timeout, (agent, job_id, timeout))
+            timer.daemon = True
+            timer.start()
+        return future
+
+    def _local_done(self, _future, cpu_placement=None):
+        with self.lock:
+            self.local_busy -= 1
+            if self.placement:
+                self.placement.release(cpu_placement)
+
+    def _remote_done(self, agent: _RemoteAgent, job_id, future: Future):
+        with self.lock:
+            job = agent.jobs.pop(job_id, None)
+        if job and (future.cancelled() or isinstance(future.exception(), TimeoutError)):
+            try:
+                agent.conn.send(dict(type='cancel', id=job_id))
+            except OSError:
+                pass
+
+    def _remote_timeout(self, agent: _RemoteAgent, job_id, timeout):
+        with self.lock:
+            job = agent.jobs.get(job_id)
+        if job:
+            self._set_future(job[0], exception=TimeoutError('Task timeout', timeout))
+
+    @staticmethod
+    def _set_future(future: Future, result=None, exception=None):
+        # future might have been cancelled or timed-out concurrently
+        try:
+            if not future.done():
+                if exception:
+                    future.set_exception(exception)
+                else:
+                    future.set_result(result)
+        except Exception:
+            pass
+
+    def _accept(self):
+        while not self.closed:
+            try:
+                sock, addr = self.server.accept()
+            except OSError:
+                break
+            threading.Thread(target=self._serve_agent, args=(sock, addr), name=f'xeda-agent-{addr[0]}', daemon=True).start()
+
+    def _serve_agent(self, sock, addr):
+        conn = _Connection(sock)
+        agent = None
+        try:
+            nonce = os.urandom(16).hex()
+            conn.send(dict(type='challenge', nonce=nonce))
+            messages = conn.messages()
+            msg = next(messages, None)
+            if not msg or msg.get('type') != 'register' or \
+                    (self.token and not hmac.compare_digest(str(msg.get('auth')), auth_digest(self.token, nonce))):
+                logger.warning(f"[Remote] Rejected connection from {addr[0]}:{addr[1]}")
+                conn.close()
+                return
+            cpus = max(1, int(msg.get('cpus', 1)))
+            agent = _RemoteAgent(conn, msg.get('host', addr[0]), cpus, max(1, cpus // self.nthreads))
+            with self.lock:
+                self.agents.append(agent)
+            logger.info(f"[Remote] Worker agent {agent} registered from {addr[0]}:{addr[1]}")
+            for msg in messages:
+                if msg.get('type') == 'result':
+                    self._on_result(agent, msg)
+            self._drop_agent(agent, 'connection closed')
+        except Exception as e:
+            if agent:
+                self._drop_agent(agent, e)
+            else:
+                conn.close()
+
+    def _on_result(self, agent: _RemoteAgent, msg):
+        with self.lock:
+            job = agent.jobs.get(msg.get('id'))
+        if not job:
+            return
+        future, flow = job
+        if msg.get('error'):
+            logger.warning(f"[Remote] {flow.name} on {agent.host}: {msg['error']}")
+        try:
+            restore_artifacts(flow.flow_run_dir, msg.get('artifacts') or {})
+        except Exception as e:
+            logger.warning(f"[Remote] Failed to restore artifacts of {flow.flow_run_dir}: {e}")
+        results = msg.get('results')
+        if results and msg.get('run_hash') != flow.xedahash:
+            logger.warning(
+                f"[Remote] Run hash on {agent.host} ({msg.get('run_hash')}) differs from the local one ({flow.xedahash}). Are design sources on a shared filesystem?")
+        self._set_future(future, result=(results, flow.settings, flow.flow_run_dir))
+
+    def _drop_agent(self, agent: _RemoteAgent, reason):
+        with self.lock:
+            if agent not in self.agents:
+                return
+            self.agents.remove(agent)
+            jobs = list(agent.jobs.values())
+            agent.jobs.clear()
+        logger.warning(f"[Remote] Lost worker agent {agent}: {reason}")
+        for future, _ in jobs:
+            self._set_future(future, exception=AgentLost(f'lost connection to {agent.host}'))
+        agent.conn.close()
+
+    def close(self):
+        self.closed = True
+        if self.server:
+            self.server.close()
+        with self.lock:
+            agents = list(self.agents)
+        for agent in agents:
+            self._drop_agent(agent, 'pool closed')
+        if self.local_pool:
+            self.local_pool.close()
+
+    def stop(self):
+        self.close()
+        if self.local_pool:
+            self.local_pool.stop()
+
+    def join(self):
+        if self.local_pool:
+            self.local_pool.join()
+
+
+class AgentRunner(FlowRunner):
+    """sets up flows from serialized specifications, without any project file"""
+
+    def __init__(self, args) -> None:
+        self.args = args
+        self.timestamp = None
+        self.xeda_project = None
+        self.all_settings = None
+
+
+def load_flow_class(qualified_name: str):
+    module_name, cls_name = qualified_name.split(':')
+    return getattr(importlib.import_module(module_name), cls_name)
+
+
+def run_job(spec, xeda_run_dir=None):
+    """runs in a worker process of the agent"""
+    from .fmax import run_flow_fmax
+
+    if spec.get('cwd') and os.path.isdir(spec['cwd']):
+        os.chdir(spec['cwd'])
+    args = SimpleNamespace(xeda_run_dir=xeda_run_dir or spec['xeda_run_dir'], force_run_dir=None,
+                           debug=DebugLevel.NONE, verbose=False, quiet=True, force_rerun=False, use_stale=False)
+    runner = AgentRunner(args)
+    flow = runner.setup_flow(spec_to_settings(spec['flow_settings']), spec_to_settings(spec['design_settings']),
+                             load_flow_class(spec['flow_class']))
+    flow.no_console = True
+    results, _, flow_run_dir = run_flow_fmax(flow)
+    return dict(results=results, run_hash=flow.xedahash,
+                artifacts=collect_artifacts(Path(flow_run_dir), spec.get('artifacts', DEFAULT_ARTIFACTS)))
+
+
+class WorkerAgent:
+    """Connects to a WorkerPool and runs the flows it receives on the local host"""
+
+    def __init__(self, address, cpus: int, token: Optional[str] = None, xeda_run_dir: Optional[str] = None, once=False, retry_interval=5.0) -> None:
+        self.address = parse_address(address)
+        self.cpus = cpus
+        self.token = token
+        self.xeda_run_dir = xeda_run_dir
+        self.once = once
+        self.retry_interval = retry_interval
+
+    def run(self):
+        while True:
+            try:
+                sock = socket.create_connection(self.address)
+            except OSError as e:
+                logger.info(f"[Agent] Could not connect to {self.address[0]}:{self.address[1]}: {e}. Retrying in {self.retry_interval} seconds")
+                time.sleep(self.retry_interval)
+                continue
+            self.serve(_Connection(sock))
+            if self.once:
+                break
+            time.sleep(self.retry_interval)
+
+    def serve(self, conn: _Connection):
+        logger.info(f"[Agent] Connected to {self.address[0]}:{self.address[1]} with {self.cpus} CPUs")
+        futures = {}
+        pool = ProcessPool(max_workers=self.cpus)
+
+        def send_result(job_id, future):
+            futures.pop(job_id, None)
+            if future.cancelled():
+                return
+            msg = dict(type='result', id=job_id, results=None)
+            try:
+                msg.update(future.result())
+            except Exception as e:
+                msg['error'] = f'{e.__class__.__name__}: {e}'
+            try:
+                conn.send(msg)
+            except OSError as e:
+                logger.warning(f"[Agent] Failed to send results of job {job_id}: {e}")
+
+        try:
+            messages = conn.messages()
+            challenge = next(messages, None)
+            if not challenge or challenge.get('type') != 'challenge':
+                raise ValueError(f"unexpected message from the runner: {challenge}")
+            auth = auth_digest(self.token, challenge['nonce']) if self.token else None
+            conn.send(dict(type='register', host=socket.gethostname(), cpus=self.cpus, auth=auth))
+            for msg in messages:
+                if msg.get('type') == 'job':
+                    job_id = msg['id']
+                    future = pool.schedule(run_job, args=[msg['spec'], self.xeda_run_dir])
+                    futures[job_id] = future
+                    future.add_done_callback(lambda f, job_id=job_id: send_result(job_id, f))
+                elif msg.get('type') == 'cancel':
+                    future = futures.pop(msg['id'], None)
+                    if future:
+                        future.cancel()
+                        nukemall(orphans_only=True)
+        except (OSError, ValueError) as e:
+            logger.warning(f"[Agent] Connection error: {e}")
+        finally:
+            logger.info("[Agent] Disconnected")
+            pool.stop()
+            pool.join()
+            nukemall()
+            conn.close()
+
+
+def agent_main(args=None):
+    parser = argparse.ArgumentParser(
+        prog='xeda-agent', description='Xeda remote worker agent: runs flows scheduled by FmaxRunner/ParetoRunner on this host')
+    parser.add_argument('connect', metavar='HOST:PORT', help='address of the runner (flow setting `remote_listen`)')
+    parser.add_argument('--cpus', type=int, default=multiprocessing.cpu_count(),
+                        help='number of CPUs on this host available for flow runs')
+    parser.add_argument('--token', default=os.environ.get('XEDA_AGENT_TOKEN'),
+                        help='shared secret, must match the runner\'s `remote_token` (default: $XEDA_AGENT_TOKEN). '
+                             'Required unless the runner listens on a loopback address')
+    parser.add_argument('--xeda-run-dir', default=None,
+                        help='run flows in this directory instead of the runner\'s xeda_run_dir')
+    parser.add_argument('--once', action='store_true', help='exit once the runner disconnects')
+    parsed_args = parser.parse_args(args)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+    become_subreaper()
+    WorkerAgent(parsed_args.connect, parsed_args.cpus, parsed_args.token,
+                parsed_args.xeda_run_dir, parsed_args.once).run()
+
+
+if __name__ == '__main__':
+    agent_main()
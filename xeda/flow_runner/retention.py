@@ -0,0 +1,122 @@
+import gzip
+import logging
+import os
+import shutil
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+logger = logging.getLogger()
+
+
+class RetentionPolicy:
+    """
+    Limits the disk footprint of runners that execute many variants of the same flow (e.g. FmaxRunner).
+    All artifacts of the top `keep_top` successful runs (ranked by a score, higher is better) are kept.
+    As soon as a run is dominated (falls out of the top runs), only its results, settings, and compressed reports and logs are kept.
+    Failed runs lose their large artifacts (checkpoints, netlists, waveforms) while their logs and reports are kept compressed.
+    With keep_top=None, successful runs are not ranked: they are kept until the caller prunes them (e.g. ParetoRunner, when they leave the front).
+    """
+
+    keep_files = ('results.json', 'settings.json')
+    compress_suffixes = ('.rpt', '.xml', '.csv', '.log', '.txt', '.html', '.jou')
+    large_suffixes = ('.dcp', '.v', '.vhd', '.sdf', '.bit', '.edf', '.vcd', '.saif', '.wdb', '.fst', '.ghw')
+    large_file_size = 1 << 20  # bytes
+
+    def __init__(self, keep_top: Optional[int], reports_subdir_name: str = 'reports') -> None:
+        self.keep_top = max(1, int(keep_top)) if keep_top is not None else None
+        self.reports_subdir_name = reports_subdir_name
+        self.top: List[Tuple[float, Path]] = []
+        self.freed_bytes = 0
+
+    def add_successful(self, score: float, run_dir) -> List[Path]:
+        """
+        Register a successful run and prune the run(s) which are no longer among the top ones.
+        Returns list of pruned run directories.
+        """
+        run_dir = Path(run_dir)
+        if any(d == run_dir for _, d in self.top):
+            return []
+        self.top.append((score, run_dir))
+        self.top.sort(key=lambda x: x[0], reverse=True)
+        if self.keep_top is None:
+            return []
+        dominated = [d for _, d in self.top[self.keep_top:]]
+        self.top = self.top[:self.keep_top]
+        for d in dominated:
+            self.prune_dominated(d)
+        return dominated
+
+    def _is_report(self, rel_path: Path) -> bool:
+        return (rel_path.parts[0] == self.reports_subdir_name or rel_path.suffix == '.log') and rel_path.suffix in self.compress_suffixes
+
+    def _is_compressed_report(self, rel_path: Path) -> bool:
+        return rel_path.suffix == '.gz' and self._is_report(rel_path.with_suffix(''))
+
+    def _files(self, run_dir: Path):
+        for root, _, files in os.walk(run_dir):
+            for f in files:
+                path = Path(root) / f
+                yield path, path.relative_to(run_dir)
+
+    def _remove(self, path: Path):
+        try:
+            size = path.stat().st_size
+            path.unlink()
+            self.freed_bytes += size
+        except OSError as e:
+            logger.warning(f"[Retention] failed to remove {path}: {e}")
+
+    def _compress(self, path: Path):
+        gz_path = path.with_name(path.name + '.gz')
+        try:
+            size = path.stat().st_size
+            with open(path, 'rb') as f_in, gzip.open(gz_path, 'wb') as f_out:
+                shutil.copyfileobj(f_in, f_out)
+            path.unlink()
+            self.freed_bytes += size - gz_path.stat().st_size
+        except OSError as e:
+            logger.warning(f"[Retention] failed to compress {path}: {e}")
+
+    @staticmethod
+    def _remove_empty_dirs(run_dir: Path):
+        for root, dirs, files in os.walk(run_dir, topdown=False):
+            if not dirs and not files and Path(root) != run_dir:
+                try:
+                    os.rmdir(root)
+                except OSError:
+                    pass
+
+    def prune_dominated(self, run_dir):
+        """keep only results, settings, and compressed reports and logs"""
+        run_dir = Path(run_dir)
+        self.top = [(s, d) for s, d in self.top if d != run_dir]
+        if not run_dir.is_dir():
+            return
+        logger.info(f"[Retention] pruning dominated run {run_dir}")
+        for path, rel_path in list(self._files(run_dir)):
+            if len(rel_path.parts) == 1 and rel_path.name in self.keep_files:
+                continue
+            if self._is_compressed_report(rel_path):
+                continue
+            if self._is_report(rel_path):
+                self._compress(path)
+            else:
+                self._remove(path)
+        self._remove_empty_dirs(run_dir)
+
+    def prune_failed(self, run_dir):
+        """remove large artifacts of a failed run and compress its reports and logs"""
+        run_dir = Path(run_dir)
+        if not run_dir.is_dir():
+            return
+        logger.info(f"[Retention] pruning failed run {run_dir}")
+        for path, rel_path in list(self._files(run_dir)):
+            if len(rel_path.parts) == 1 and rel_path.name in self.keep_files:
+                continue
+            if self._is_compressed_report(rel_path):
+                continue
+            if self._is_report(rel_path):
+                self._compress(path)
+            elif path.suffix in self.large_suffixes or path.stat().st_size >= self.large_file_size:
+                self._remove(path)
+        self._remove_empty_dirs(run_dir)
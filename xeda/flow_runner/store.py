@@ -0,0 +1,243 @@
+"""
+Content-addressed store of run artifacts.
+
+Large immutable files which are identical across run directories (checkpoints, netlists, waveforms, logs, ...) are kept once
+in `<xeda_run_dir>/.xeda_store/objects` and the copies in the run directories are replaced by reflinks (on filesystems that
+support them) or hard links to the stored object.
+Each object has a `.refs` file listing the paths that were linked to it, which is used for reference counting.
+The store is pruned with `xeda-gc`.
+"""
+
+import argparse
+import errno
+import logging
+import os
+import re
+import shutil
+from pathlib import Path
+from typing import Iterable, List, Optional, Tuple
+
+from ..flows.flow import file_digest
+
+logger = logging.getLogger()
+
+FICLONE = 0x40049409  # linux/fs.h
+
+
+def reflink(src, dst):
+    """copy-on-write clone of `src` as `dst` (Linux, on filesystems with reflink support e.g. Btrfs, XFS)"""
+    import fcntl
+    with open(src, 'rb') as s, open(dst, 'wb') as d:
+        try:
+            fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+        except OSError:
+            d.close()
+            os.unlink(dst)
+            raise
+
+
+def parse_size(size: str) -> int:
+    """'500M', '20G', '1.5T', or plain bytes"""
+    match = re.match(r'^\s*([\d.]+)\s*([kmgt]?)i?b?\s*$', str(size), re.IGNORECASE)
+    if not match:
+        raise ValueError(f"Invalid size: {size}")
+    return int(float(match.group(1)) * 1024 ** ' kmgt'.index(match.group(2).lower() or ' '))
+
+
+def format_size(size: int) -> str:
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if size < 1024:
+            return f'{size:.1f} {unit}' if unit != 'B' else f'{size} B'
+        size /= 1024
+    return f'{size:.1f} TB'
+
+
+class ArtifactStore:
+    """
+    link: 'reflink', 'hardlink', or 'auto' (reflink when supported, otherwise hard link).
+        Hard-linked files share their content with the store: Flow.run_flow breaks the links before a run directory is reused.
+    min_size: smaller files are not worth deduplicating
+    """
+
+    def __init__(self, root, link: str = 'auto', min_size: int = 64 << 10) -> None:
+        assert link in ('auto', 'reflink', 'hardlink'), "link should be 'auto', 'reflink', or 'hardlink'"
+        self.root = Path(root)
+        self.objects_dir = self.root / 'objects'
+        self.link = link
+        self.min_size = min_size
+
+    def object_path(self, digest: str) -> Path:
+        return self.objects_dir / digest[:2] / digest[2:]
+
+    def objects(self) -> Iterable[Path]:
+        if self.objects_dir.exists():
+            for obj in self.objects_dir.glob('??/*'):
+                if obj.suffix not in ('.refs', '.tmp'):
+                    yield obj
+
+    def _link(self, src: Path, dst: Path):
+        """create `dst` sharing the content of `src`"""
+        if self.link != 'hardlink':
+            try:
+                reflink(src, dst)
+                shutil.copystat(src, dst)
+                return
+            except OSError as e:
+                if self.link == 'reflink':
+                    raise
+                logger.debug(f"[Store] reflink not supported ({e}), using hard links")
+                self.link = 'hardlink'
+        os.link(src, dst)
+
+    def _add_ref(self, obj: Path, path: Path):
+        st = path.stat()
+        with open(obj.with_name(obj.name + '.refs'), 'a') as f:
+            f.write(f'{path.resolve()}\t{st.st_ino}\t{st.st_mtime_ns}\n')
+
+    def ingest(self, path) -> Optional[str]:
+        """
+        Move the content of `path` into the store (unless an identical object already exists) and replace `path` by a link to it.
+        Returns the digest of the content or None if the file was not ingested.
+        """
+        path = Path(path)
+        if path.is_symlink() or not path.is_file():
+            return None
+        st = path.stat()
+        if st.st_size < self.min_size:
+            return None
+        digest = file_digest(path)
+        obj = self.object_path(digest)
+        tmp = path.with_name(f'.{path.name}.xeda_store.tmp')
+        try:
+            if not obj.exists():
+                obj.parent.mkdir(parents=True, exist_ok=True)
+                obj_tmp = obj.with_name(f'{obj.name}.{os.getpid()}.tmp')
+                self._link(path, obj_tmp)
+                os.replace(obj_tmp, obj)
+                if self.link == 'hardlink':
+                    self._add_ref(obj, path)
+                    return digest
+            elif os.path.samefile(obj, path):
+                return digest
+            self._link(obj, tmp)
+            os.replace(tmp, path)
+            self._add_ref(obj, path)
+            return digest
+        except OSError as e:
+            if tmp.exists():
+                tmp.unlink()
+            if e.errno == errno.EXDEV:
+                logger.debug(f"[Store] {path} is not on the same filesystem as {self.root}")
+            else:
+                logger.warning(f"[Store] Failed to ingest {path}: {e}")
+            return None
+
+    def ingest_run(self, run_dir, patterns: List[str]) -> Tuple[int, int]:
+        """ingest the files of a run directory matching the glob `patterns`. Returns (number of files, bytes) deduplicated"""
+        run_dir = Path(run_dir)
+        files = {p for pattern in patterns for p in run_dir.glob(pattern)}
+        num_files, num_bytes = 0, 0
+        for path in sorted(files):
+            if self.ingest(path):
+                num_files += 1
+                num_bytes += path.stat().st_size
+        if num_files:
+            logger.info(f"[Store] {num_files} artifact(s) ({format_size(num_bytes)}) of {run_dir} are now in {self.root}")
+        return num_files, num_bytes
+
+    def live_refs(self, obj: Path) -> List[str]:
+        """entries of the .refs file of `obj` which still point to a file with the object's content"""
+        refs_file = obj.with_name(obj.name + '.refs')
+        live = []
+        try:
+            with open(refs_file) as f:
+                lines = f.read().splitlines()
+        except FileNotFoundError:
+            return live
+        for line in dict.fromkeys(lines):
+            try:
+                path, ino, mtime_ns = line.split('\t')
+                st = os.stat(path)
+            except (OSError, ValueError):
+                continue
+            if st.st_ino == int(ino) and st.st_mtime_ns == int(mtime_ns):
+                live.append(line)
+        return live
+
+    def last_used(self, obj: Path) -> float:
+        refs_file = obj.with_name(obj.name + '.refs')
+        try:
+            return refs_file.stat().st_mtime
+        except FileNotFoundError:
+            return obj.stat().st_mtime
+
+    def remove(self, obj: Path):
+        for p in (obj, obj.with_name(obj.name + '.refs')):
+            try:
+                p.unlink()
+            except FileNotFoundError:
+                pass
+
+    def gc(self, max_size: Optional[int] = None, dry_run=False) -> Tuple[int, int]:
+        """
+        Evict the least recently used objects until the store is smaller than `max_size` bytes.
+        Unreferenced objects are evicted first. Without `max_size`, only the unreferenced objects are removed.
+        Evicting a referenced object doesn't affect the run directories, they just don't share its content anymore.
+        Returns (number of objects, bytes) evicted.
+        """
+        entries = []
+        total = 0
+        for obj in self.objects():
+            refs = self.live_refs(obj)
+            last_used = self.last_used(obj)
+            if not dry_run:
+                # compact the .refs file, keeping its timestamp
+                refs_file = obj.with_name(obj.name + '.refs')
+                if refs_file.exists():
+                    refs_file.write_text(''.join(r + '\n' for r in refs))
+                    os.utime(refs_file, (last_used, last_used))
+            size = obj.stat().st_size
+            total += size
+            entries.append((bool(refs), last_used, size, obj))
+        entries.sort(key=lambda e: (e[0], e[1]))
+        num_evicted, evicted_bytes = 0, 0
+        for referenced, _, size, obj in entries:
+            if max_size is None:
+                if referenced:
+                    break
+            elif total - evicted_bytes <= max_size:
+                break
+            if not dry_run:
+                self.remove(obj)
+            num_evicted += 1
+            evicted_bytes += size
+        logger.info(f"[Store] {'Would evict' if dry_run else 'Evicted'} {num_evicted} object(s) ({format_size(evicted_bytes)}), "
+                    f"{format_size(total - evicted_bytes)} left in {self.root}")
+        return num_evicted, evicted_bytes
+
+
+def break_links(run_dir):
+    """replace the hard-linked files of a run directory by private copies, so that tools don't modify files which are shared with the store"""
+    for root, _, files in os.walk(run_dir):
+        for name in files:
+            path = Path(root) / name
+            try:
+                if path.is_symlink() or path.stat().st_nlink < 2:
+                    continue
+                tmp = path.with_name(f'.{name}.xeda_store.tmp')
+                shutil.copy2(path, tmp)
+                os.replace(tmp, path)
+            except OSError as e:
+                logger.warning(f"Failed to unshare {path}: {e}")
+
+
+def gc_main(args=None):
+    parser = argparse.ArgumentParser(prog='xeda-gc', description='Evict least recently used objects from the artifact store')
+    parser.add_argument('--xeda-run-dir', default=os.environ.get('xeda_run_dir', 'xeda_run'),
+                        help='xeda run directory containing the store (default: xeda_run)')
+    parser.add_argument('--max-size', type=parse_size, default=None,
+                        help='size budget of the store, e.g. 50G. Without it, only unreferenced objects are removed')
+    parser.add_argument('--dry-run', action='store_true', help='only report what would be evicted')
+    parsed_args = parser.parse_args(args)
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    ArtifactStore(Path(parsed_args.xeda_run_dir) / '.xeda_store').gc(parsed_args.max_size, parsed_args.dry_run)
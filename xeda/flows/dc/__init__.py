@@ -4,7 +4,7 @@ import logging
 from pathlib import Path
 from typing import Mapping
 from types import SimpleNamespace
-from ..flow import SynthFlow
+from ..flow import SynthFlow, open_run_file
 import re
 import sys, os
 import toml
@@ -34,6 +34,7 @@ def get_hier(dct, dotted_path, default=None):
 
 
 class Dc(SynthFlow):
+    version_command = ['dc_shell-xg-t', '-version']
 
     def run(self):
         self.nthreads = min(self.nthreads, 16)
@@ -125,7 +126,7 @@ class Dc(SynthFlow):
         # placeholder for ordering
         self.results['path_groups'] = None
 
-        with open(reportfile_path) as rpt_file:
+        with open_run_file(reportfile_path) as rpt_file:
             content = rpt_file.read()
             sections = re.split(r'\n\s*\n', content)
 
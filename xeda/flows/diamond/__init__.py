@@ -5,6 +5,7 @@ from ..flow import Flow, SynthFlow
 
 class Diamond(Flow):
     reports_subdir_name = 'diamond_impl'
+    version_command = ['diamondc', '-version']
 
 
 class DiamondSynth(Diamond, SynthFlow):
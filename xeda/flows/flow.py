@@ -2,14 +2,20 @@
 
 import copy
 from datetime import datetime
+import gzip
+import io
 import json
 import os
 import re
 from pathlib import Path
+import shutil
+import signal
 import subprocess
 # from contextlib import contextmanager
+import threading
 import time
 from types import SimpleNamespace
+import zipfile
 from jinja2 import Environment, PackageLoader, StrictUndefined
 import logging
 from jinja2.loaders import ChoiceLoader
@@ -17,9 +23,11 @@ from progress import SHOW_CURSOR
 from progress.spinner import Spinner as Spinner
 import colored
 import hashlib
-from typing import Mapping, Union, Dict, List
+from typing import Mapping, Optional, Union, Dict, List
 
 from .settings import Settings
+from .hdl_deps import order_sources
+from .waveform import WAVEFORM_FORMATS, WaveformPipes, compressed_path, vcd_to_saif
 from ..utils import camelcase_to_snakecase, try_convert
 from ..debug import DebugLevel
 
@@ -41,14 +49,292 @@ class NonZeroExit(Exception):
     pass
 
 
-def final_kill(proc):
+class ToolAborted(NonZeroExit):
+    """Process was terminated as soon as one of the flow's abort conditions fired"""
+    pass
+
+
+# seconds between SIGTERM and SIGKILL when tearing down tools. pebble kills a cancelled worker 3 seconds after SIGTERM.
+KILL_TIMEOUT = 2.0
+
+# process groups of the tools currently run by run_process in this process (each tool is a session leader: pgid == pid)
+_running_groups = set()
+# run_process may be called from several threads of a flow (e.g. concurrent xsim runs), guards the updates of Flow.results
+_results_lock = threading.Lock()
+
+# version_command -> output, see Flow.tool_version
+_tool_versions = {}
+
+
+def running_process_groups():
+    return set(_running_groups)
+
+
+def process_table():
+    """{pid: (ppid, pgid, sid, state)} of all processes, from /proc (Linux only, empty otherwise)"""
+    table = {}
     try:
-        proc.terminate()
-        proc.wait()
-        proc.kill()
+        pids = [int(p) for p in os.listdir('/proc') if p.isdigit()]
+    except OSError:
+        return table
+    for pid in pids:
+        try:
+            with open(f'/proc/{pid}/stat') as f:
+                stat = f.read()
+        except OSError:
+            continue
+        # the command name (2nd field) can contain spaces and parentheses
+        fields = stat[stat.rfind(')') + 2:].split()
+        table[pid] = (int(fields[1]), int(fields[2]), int(fields[3]), fields[0])
+    return table
+
+
+def file_digest(path, chunk_size=1 << 20) -> str:
+    """sha256 of the content of a file"""
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+# timestamps written by the tools in the header of their text outputs: `(DATE "...")` of SDF and SAIF files, `// Date : ...` of netlists
+_TIMESTAMP_LINE_RE = re.compile(rb'^\s*(\(DATE\s|(//|--)\s*Date\s*:)')
+
+
+def stable_digest(path, header_lines=64, chunk_size=1 << 20) -> str:
+    """like file_digest, but ignoring the timestamps in the first `header_lines` lines, so that identical outputs of two runs match"""
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for _ in range(header_lines):
+            line = f.readline(chunk_size)
+            if not line:
+                break
+            if not _TIMESTAMP_LINE_RE.match(line):
+                h.update(line)
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+# archive of the files of a completed run directory, see flow_runner.archive
+RUN_ARCHIVE = 'run_archive.zip'
+
+
+def open_compressed(path, mode='rt'):
+    """open a .gz or .zst (requires the zstandard package) file"""
+    path = Path(path)
+    if path.suffix == '.zst':
+        import zstandard
+        return zstandard.open(path, mode, encoding='utf-8' if 't' in mode else None)
+    return gzip.open(path, mode, encoding='utf-8' if 't' in mode else None)
+
+
+def open_log(path, compression=None, mode='wt'):
+    """
+    open a log file for writing, compressed on the fly if `compression` is 'gzip' or 'zstd' (falls back to gzip without the zstandard package)
+    Returns (actual path, file)
+    """
+    path = Path(path)
+    encoding = 'utf-8' if 't' in mode else None
+    # a log of a previous run in another format would shadow the new one (see open_run_file)
+    for ext in ('', '.gz', '.zst'):
+        stale = path.with_name(path.name + ext)
+        if stale.exists():
+            stale.unlink()
+    if compression == 'zstd':
+        try:
+            import zstandard
+            path = path.with_name(path.name + '.zst')
+            return path, zstandard.open(path, mode, encoding=encoding)
+        except ImportError:
+            logger.warning("zstandard package is not installed, compressing logs with gzip")
+    if compression:
+        path = path.with_name(path.name + '.gz')
+        return path, gzip.open(path, mode, encoding=encoding)
+    return path, open(path, mode, encoding=encoding)
+
+
+def open_run_file(path, mode='rt'):
+    """
+    Open a file of a run directory for reading, whether it's still there as is, compressed (.gz or .zst, e.g. by Flow.compress_logs or
+    RetentionPolicy), or packed in the archive of its run directory (see RUN_ARCHIVE).
+    """
+    path = Path(path)
+    if path.exists():
+        return open(path, mode)
+    for ext in ('.gz', '.zst'):
+        compressed = path.with_name(path.name + ext)
+        if compressed.exists():
+            return open_compressed(compressed, mode)
+    for run_dir in path.parents:
+        archive = run_dir / RUN_ARCHIVE
+        if archive.exists():
+            # members are streamed, the archive file is closed once the member is
+            with zipfile.ZipFile(archive) as zf:
+                names = set(zf.namelist())
+                name = path.relative_to(run_dir).as_posix()
+                for member in (name, name + '.gz'):
+                    if member in names:
+                        f = zf.open(member)
+                        if member.endswith('.gz'):
+                            f = gzip.GzipFile(fileobj=f)
+                        return io.TextIOWrapper(f, encoding='utf-8') if 't' in mode else f
+            break
+    raise FileNotFoundError(f"No such file: '{path}'")
+
+
+def run_file_exists(path) -> bool:
+    try:
+        open_run_file(path, 'rb').close()
+        return True
+    except FileNotFoundError:
+        return False
+
+
+_PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+
+def process_rss(pid) -> int:
+    """resident memory (bytes) of a process, 0 if it's gone or on systems without /proc"""
+    try:
+        with open(f'/proc/{pid}/statm') as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+def process_cpu_ticks(pid) -> int:
+    """CPU time (clock ticks) used by a process and its waited-for children, 0 if it's gone or on systems without /proc"""
+    try:
+        with open(f'/proc/{pid}/stat') as f:
+            stat = f.read()
+        # utime, stime, cutime, cstime
+        return sum(int(x) for x in stat[stat.rfind(')') + 2:].split()[11:15])
+    except (OSError, ValueError):
+        return 0
+
+
+class ProcessWatchdog:
+    """
+    Monitors the process group of a tool from a background thread:
+        - keeps the peak of its total resident memory (`peak`, bytes)
+        - terminates it once `deadline` (time.monotonic()) has passed
+        - terminates it when it's stalled: no output (see `activity`) and no CPU time used by any of its processes for `stall_timeout` seconds
+    `fired` is the reason of the termination, if any.
+    """
+
+    def __init__(self, pgid, deadline=None, stall_timeout=None, interval=1.0) -> None:
+        self.pgid = pgid
+        self.deadline = deadline
+        self.stall_timeout = stall_timeout
+        self.interval = interval
+        self.peak = 0
+        self.fired = None
+        self.last_activity = time.monotonic()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='xeda-watchdog', daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def activity(self):
+        """the tool printed something"""
+        self.last_activity = time.monotonic()
+
+    def _run(self):
+        cpu_ticks = None
+        while True:
+            table = process_table()
+            members = [pid for pid, (_, pgid, _, state) in table.items() if pgid == self.pgid and state != 'Z']
+            self.peak = max(self.peak, sum(process_rss(pid) for pid in members))
+            now = time.monotonic()
+            ticks = sum(process_cpu_ticks(pid) for pid in members)
+            if not table or ticks != cpu_ticks:  # CPU usage can't be monitored without /proc
+                cpu_ticks = ticks
+                self.last_activity = now
+            if self.deadline and now >= self.deadline:
+                self.fired = 'timeout'
+            elif self.stall_timeout and now - self.last_activity >= self.stall_timeout:
+                self.fired = f'stall (no output and no CPU activity for {int(now - self.last_activity)} seconds)'
+            if self.fired:
+                logger.critical(f"[Watchdog] Terminating process group {self.pgid} due to {self.fired}")
+                terminate_process_groups([self.pgid])
+                break
+            if self._stop.wait(self.interval):
+                break
+
+
+def process_group_alive(pgid) -> bool:
+    """True if the process group has any member which is not a zombie"""
+    try:
+        os.killpg(pgid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    table = process_table()
+    if not table:
+        return True
+    return any(pg == pgid and state != 'Z' for _, pg, _, state in table.values())
+
+
+def kill_process_groups(pgids, sig=signal.SIGTERM):
+    for pgid in pgids:
+        try:
+            os.killpg(pgid, sig)
+        except (ProcessLookupError, PermissionError):
+            pass
+
+
+def terminate_process_groups(pgids, timeout=KILL_TIMEOUT, procs=()):
+    """
+    SIGTERM the process groups, then SIGKILL the ones still alive after `timeout` seconds.
+    procs: Popen objects among the group leaders, polled so that they don't linger as zombies
+    Returns the list of process groups which had to be killed.
+    """
+    pgids = list(pgids)
+    kill_process_groups(pgids, signal.SIGTERM)
+    deadline = time.monotonic() + timeout
+    while True:
+        for proc in procs:
+            proc.poll()
+        alive = [pg for pg in pgids if process_group_alive(pg)]
+        if not alive or time.monotonic() >= deadline:
+            break
+        time.sleep(0.05)
+    if alive:
+        logger.warning(f"Killing process group(s) {alive} which did not terminate within {timeout} seconds")
+        kill_process_groups(alive, signal.SIGKILL)
+    return alive
+
+
+def final_kill(proc, timeout=KILL_TIMEOUT):
+    """tear down the whole process group of `proc`, including processes left behind after `proc` itself exited"""
+    if proc is None:
+        return
+    try:
+        terminate_process_groups([proc.pid], timeout, procs=[proc])
+        if proc.poll() is None:
+            proc.kill()
         proc.wait()
-    except:
+    except OSError:
         pass
+    finally:
+        _running_groups.discard(proc.pid)
+
+
+def _terminate_running_groups(signum, frame):
+    """SIGTERM/SIGHUP handler: tear down the running tools, then die of the same signal"""
+    terminate_process_groups(list(_running_groups))
+    signal.signal(signum, signal.SIG_DFL)
+    os.kill(os.getpid(), signum)
+
 
 # @contextmanager
 # def process(*args, **kwargs):
@@ -77,7 +363,10 @@ class Flow():
     required_settings = {}
     default_settings = {}
     reports_subdir_name = 'reports'
-    timeout = 3600 * 2  # in seconds
+    abort_patterns: List[str] = []  # regexes of tool output lines after which the run is known to have failed
+    artifacts: List[str] = ['*.log', '*.log.gz', '*.log.zst']  # glob patterns (relative to flow_run_dir) of outputs which can be kept in the artifact store
+    version_command: List[str] = []  # command printing the version of the tool(s), see tool_version
+    compressed_logs: List[str] = ['*.log', '*.jou']  # logs written by the tools themselves, see compress_logs
     name = None
 
     @classmethod
@@ -111,6 +400,12 @@ class Flow():
         self.results = dict()
         self.results['success'] = False
 
+        # dict(cpus=[...], numa_nodes=[...]): the CPUs that the tools of this run are pinned to, assigned by the runner (see CpuPlacement)
+        self.cpu_placement = None
+        # node-local directory (e.g. on a tmpfs) where the flow is executed, set by the runner (see scratch_run_dir)
+        self.scratch_dir = None
+        self.scratch_min_free = 1 << 30  # bytes
+
         self.jinja_env = Environment(
             loader=ChoiceLoader(
                 [
@@ -139,17 +434,166 @@ class Flow():
         else:
             logger.warning(
                 f'Using existing run directory: {self.flow_run_dir}')
+            # files of a previous run may be hard links into the artifact store, which the tools must not overwrite in place
+            from ..flow_runner.store import break_links
+            break_links(self.flow_run_dir)
+            # archived files of a previous run would shadow missing outputs of this one (see open_run_file)
+            archive = self.flow_run_dir / RUN_ARCHIVE
+            if archive.exists():
+                archive.unlink()
 
         assert self.flow_run_dir.is_dir()
 
+        canonical_run_dir = self.flow_run_dir
+        scratch_run_dir = self.scratch_run_dir()
+        if scratch_run_dir:
+            shutil.rmtree(scratch_run_dir, ignore_errors=True)
+            scratch_run_dir.mkdir(parents=True)
+            logger.info(f"[Scratch] Running {self.name} in {scratch_run_dir}")
+            self.flow_run_dir = scratch_run_dir
+            self.reports_dir = scratch_run_dir / self.reports_subdir_name
+
         self.check_settings()
         self.dump_settings()
 
         self.timestamp = datetime.now().strftime("%Y-%m-%d-%H%M%S")
         self.init_time = time.monotonic()
-        self.run()
+        # tools inherit the CPU affinity of this process, which is dedicated to this run while it lasts (see CpuPlacement)
+        saved_affinity = None
+        if self.cpu_placement:
+            self.results['cpu_placement'] = self.cpu_placement
+            if hasattr(os, 'sched_setaffinity'):
+                saved_affinity = os.sched_getaffinity(0)
+                os.sched_setaffinity(0, self.cpu_placement['cpus'])
+        # tools run in their own session: make sure they don't outlive this process (e.g. a cancelled worker)
+        handlers = {}
+        if threading.current_thread() is threading.main_thread():
+            for sig in (signal.SIGTERM, signal.SIGHUP):
+                handlers[sig] = signal.signal(sig, _terminate_running_groups)
+        out_of_space = False
+        try:
+            self.run()
+        except Exception:
+            out_of_space = scratch_run_dir is not None and self.scratch_full(scratch_run_dir)
+            if not out_of_space:
+                raise
+        finally:
+            for sig, handler in handlers.items():
+                signal.signal(sig, handler)
+            if saved_affinity:
+                os.sched_setaffinity(0, saved_affinity)
+            if scratch_run_dir:
+                self.flow_run_dir = canonical_run_dir
+                self.reports_dir = canonical_run_dir / self.reports_subdir_name
+                try:
+                    self.sync_outputs(scratch_run_dir, canonical_run_dir)
+                finally:
+                    shutil.rmtree(scratch_run_dir, ignore_errors=True)
+        if out_of_space:
+            logger.warning(f"[Scratch] {self.name} failed with {self.scratch_dir} out of space, re-running in {self.flow_run_dir}")
+            self.scratch_dir = None
+            self.results = dict(success=False)
+            self.run_flow()
+
+    def compress_logs(self):
+        """
+        Compress the logs and journals written by the tools themselves (see `compressed_logs`) if flow setting `log_compression` is set.
+        Called by the runners once the reports were parsed. Standard output of the tools is compressed on the fly by run_process.
+        """
+        compression = self.settings.flow.get('log_compression')
+        if not compression:
+            return
+        for path in {p for pattern in self.compressed_logs for p in self.flow_run_dir.glob(pattern)}:
+            if path.is_symlink() or not path.is_file():
+                continue
+            try:
+                compressed, out = open_log(path.with_name(f'.{path.name}'), compression, 'wb')
+                with open(path, 'rb') as src, out:
+                    shutil.copyfileobj(src, out)
+                shutil.copystat(path, compressed)
+                os.replace(compressed, path.with_name(path.name + compressed.suffix))
+                path.unlink()
+            except OSError as e:
+                logger.warning(f"Failed to compress {path}: {e}")
+
+    def scratch_run_dir(self) -> Optional[Path]:
+        """
+        Run directory under `scratch_dir`, or None if running in scratch is not enabled or if the scratch filesystem is short of space,
+        i.e. has less than `scratch_min_free` bytes or less than the size of the previous run of this flow (if any) free.
+        """
+        if not self.scratch_dir:
+            return None
+        scratch_root = Path(self.scratch_dir) / f'xeda-{os.getuid()}'
+        try:
+            scratch_root.mkdir(parents=True, exist_ok=True)
+            free = shutil.disk_usage(scratch_root).free
+        except OSError as e:
+            logger.warning(f"[Scratch] {scratch_root} is not usable ({e}), running in {self.flow_run_dir}")
+            return None
+        previous = sum(p.stat().st_size for p in self.flow_run_dir.rglob('*') if p.is_file() and not p.is_symlink())
+        needed = max(self.scratch_min_free, int(previous * 1.2))
+        if free < needed:
+            logger.warning(f"[Scratch] Only {free >> 20} MiB free in {scratch_root} ({needed >> 20} MiB needed), "
+                           f"running in {self.flow_run_dir}")
+            return None
+        return scratch_root / f'{self.run_path.name}_{self.name}'
+
+    def scratch_full(self, scratch_run_dir: Path) -> bool:
+        """heuristic: a failed run most likely ran out of space if less than 1% (or 64 MiB) of the scratch filesystem is left"""
+        try:
+            usage = shutil.disk_usage(scratch_run_dir)
+        except OSError:
+            return False
+        return usage.free < max(usage.total // 100, 64 << 20)
+
+    def output_patterns(self) -> List[str]:
+        """glob patterns (relative to flow_run_dir) of the outputs of a run: declared artifacts (see `artifacts`), reports, and settings"""
+        return self.artifacts + [f'{self.reports_subdir_name}/**/*', 'settings.json']
+
+    def sync_outputs(self, src: Path, dst: Path):
+        """
+        Copy the outputs of a run executed in `src` back to the canonical run directory (see output_patterns).
+        Anything else (e.g. simulation snapshots, tool scratch files) is left behind, so files read by parse_reports or by dependent flows
+        should be declared in `artifacts`.
+        """
+        num_files, num_bytes = 0, 0
+        for path in sorted({p for pattern in self.output_patterns() for p in src.glob(pattern)}):
+            if path.is_symlink() or not path.is_file():
+                continue
+            size = path.stat().st_size
+            target = dst / path.relative_to(src)
+            target.parent.mkdir(parents=True, exist_ok=True)
+            tmp = target.with_name(f'.{target.name}.tmp')
+            shutil.copy2(path, tmp)
+            os.replace(tmp, target)
+            num_files += 1
+            num_bytes += size
+        logger.info(f"[Scratch] Copied {num_files} file(s) ({num_bytes >> 20} MiB) back to {dst}")
+
+    def upstream_flows(self) -> List['Flow']:
+        """completed dependencies of this flow and, recursively, their own dependencies"""
+        flows = []
+        for dep in self.completed_dependencies:
+            for f in [dep] + dep.upstream_flows():
+                if f not in flows:
+                    flows.append(f)
+        return flows
+
+    def consumed_artifacts(self) -> List[Path]:
+        """files produced by upstream flows (see upstream_flows) which this flow uses, other than its design sources"""
+        return []
 
     def gen_xeda_hash(self):
+        # Flows are fingerprinted on the content of what they consume from upstream flows rather than on the upstream run directories,
+        # which are named after the upstream run hash: an upstream re-run which produces identical outputs doesn't propagate.
+        upstream_dirs = {str(f.flow_run_dir): f'<{f.name}>' for f in self.upstream_flows() if f.flow_run_dir}
+
+        def normalize_path(s: str) -> str:
+            for d, placeholder in upstream_dirs.items():
+                if s == d or s.startswith(d + os.sep):
+                    return placeholder + s[len(d):]
+            return s
+
         def semantic_hash(data: JsonTree, hasher=hashlib.sha1) -> str:
             def get_digest(b: bytes):
                 return hasher(b).hexdigest()[:32]
@@ -163,15 +607,34 @@ class Flow():
                 elif hasattr(data, '__dict__'):
                     return sorted_dict_str(data.__dict__)
                 else:
-                    return str(data)
+                    return normalize_path(str(data))
 
             return get_digest(bytes(repr(sorted_dict_str(data)), 'UTF-8'))
 
         try:
-            return semantic_hash(self.settings)
+            consumed = self.consumed_artifacts()
+            if not consumed:
+                return semantic_hash(self.settings)
+            return semantic_hash(dict(settings=self.settings,
+                                      consumed={normalize_path(str(p)): stable_digest(p) for p in consumed}))
         except FileNotFoundError as e:
             self.fatal(f"Semantic hash failed: {e} ")
 
+    def tool_version(self) -> Optional[str]:
+        """output of `version_command`, or None if the flow does not declare one or the tool is not available"""
+        if not self.version_command:
+            return None
+        key = tuple(self.version_command)
+        if key not in _tool_versions:
+            try:
+                proc = subprocess.run(self.version_command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                      stdin=subprocess.DEVNULL, timeout=120, universal_newlines=True)
+                _tool_versions[key] = proc.stdout.strip() if proc.returncode == 0 else None
+            except (OSError, subprocess.TimeoutExpired) as e:
+                logger.debug(f"Failed to get the version of {self.version_command[0]}: {e}")
+                _tool_versions[key] = None
+        return _tool_versions[key]
+
     def check_settings(self):
         for req_key, req_type in self.required_settings.items():
             if req_key not in self.settings.flow:
@@ -226,9 +689,12 @@ class Flow():
         logger.info(f'dumping effective settings to {effective_settings_json}')
         self.dump_json(self.settings, effective_settings_json)
 
-    def copy_from_template(self, resource_name, **kwargs):
+    def copy_from_template(self, resource_name, script_filename=None, **kwargs):
+        """render template `resource_name` into `script_filename` (default: resource_name) inside flow_run_dir"""
         template = self.jinja_env.get_template(resource_name)
-        script_path = self.flow_run_dir / resource_name
+        if not script_filename:
+            script_filename = resource_name
+        script_path = self.flow_run_dir / script_filename
         logger.debug(f'generating {script_path.resolve()} from template.')
         rendered_content = template.render(flow=self.settings.flow,
                                            design=self.settings.design,
@@ -239,7 +705,7 @@ class Flow():
                                            **kwargs)
         with open(script_path, 'w') as f:
             f.write(rendered_content)
-        return resource_name
+        return script_filename
 
     def conv_to_relative_path(self, src):
         path = Path(src).resolve(strict=True)
@@ -249,14 +715,28 @@ class Flow():
         logger.critical(msg)
         raise FlowFatalException(msg)
 
-    def run_process(self, prog, prog_args, check=True, stdout_logfile=None, initial_step=None, force_echo=False, nolog=False):
+    def abort_conditions(self):
+        """
+        Conditions which make run_process terminate a tool as soon as the outcome of the run is known:
+            patterns: regexes from the `abort_patterns` class attribute and flow setting
+            max_errors, max_critical_warnings: flow settings, the tool is terminated once this many errors (critical warnings) were printed
+        """
+        patterns = self.abort_patterns + list(self.settings.flow.get('abort_patterns', []))
+        return ([re.compile(p) for p in patterns],
+                self.settings.flow.get('max_errors'),
+                self.settings.flow.get('max_critical_warnings'))
+
+    def run_process(self, prog, prog_args, check=True, stdout_logfile=None, initial_step=None, force_echo=False, nolog=False, cwd=None):
         prog_args = [str(a) for a in prog_args]
+        if not cwd:
+            cwd = self.flow_run_dir
         if nolog:
-            subprocess.check_call([prog] + prog_args, cwd=self.flow_run_dir)
+            subprocess.check_call([prog] + prog_args, cwd=cwd)
             return
         if not stdout_logfile:
             stdout_logfile = f'{prog}_stdout.log'
         proc = None
+        watchdog = None
         spinner = None
         unicode = True
         verbose = not self.args.quiet and (self.args.verbose or force_echo)
@@ -270,26 +750,59 @@ class Flow():
         warn_msg_re = re.compile(r'^\s*warning:?\s+', re.IGNORECASE)
         critwarn_msg_re = re.compile(
             r'^\s*critical\s+warning:?\s+', re.IGNORECASE)
+        abort_res, max_errors, max_critical_warnings = self.abort_conditions()
+        num_errors = 0
+        num_critical_warnings = 0
+        aborted = None
+
+        def abort_reason(line):
+            nonlocal num_errors, num_critical_warnings
+            if error_msg_re.match(line):
+                num_errors += 1
+                if max_errors and num_errors >= max_errors:
+                    return f'{num_errors} error(s)'
+            elif critwarn_msg_re.match(line):
+                num_critical_warnings += 1
+                if max_critical_warnings and num_critical_warnings >= max_critical_warnings:
+                    return f'{num_critical_warnings} critical warning(s)'
+            for r in abort_res:
+                if r.search(line):
+                    return f'abort pattern `{r.pattern}`'
+            return None
 
         def make_spinner(step):
-            if self.no_console:
+            # the spinner owns the console line: only for tools running in the main thread
+            if self.no_console or threading.current_thread() is not threading.main_thread():
                 return None
             return Spinner('⏳' + step + ' ' if unicode else step + ' ')
 
         redirect_std = self.args.debug < DebugLevel.HIGH
-        with open(stdout_logfile, 'w') as log_file:
+        # flow setting `log_compression`: 'gzip' or 'zstd'
+        stdout_logfile, log_file = open_log(stdout_logfile, self.settings.flow.get('log_compression'))
+        # flushing a compressed stream after every line would ruin the compression ratio
+        flush_interval = 1.0 if stdout_logfile.suffix in ('.gz', '.zst') else 0
+        last_flush = 0
+        with log_file:
             try:
                 logger.info(
-                    f'Running `{prog} {" ".join(prog_args)}` in {self.flow_run_dir}')
+                    f'Running `{prog} {" ".join(prog_args)}` in {cwd}')
                 with subprocess.Popen([prog, *prog_args],
-                                      cwd=self.flow_run_dir,
+                                      cwd=cwd,
                                       shell=False,
                                       stdout=subprocess.PIPE if redirect_std else None,
                                       bufsize=1,
                                       universal_newlines=True,
                                       encoding='utf-8',
-                                      errors='replace'
+                                      errors='replace',
+                                      start_new_session=True
                                       ) as proc:
+                    _running_groups.add(proc.pid)
+                    # no limits unless set: flow settings `timeout` (in seconds, wall-clock limit of the flow run) and
+                    # `stall_timeout` (in seconds, a tool is considered hung after this long without any output or CPU usage)
+                    timeout = self.settings.flow.get('timeout')
+                    watchdog = ProcessWatchdog(proc.pid,
+                                               deadline=(self.init_time or time.monotonic()) + timeout if timeout else None,
+                                               stall_timeout=self.settings.flow.get('stall_timeout')).start()
                     logger.info(
                         f'Started {proc.args[0]}[{proc.pid}].{(" Standard output is logged to: " + str(stdout_logfile)) if redirect_std else ""}')
 
@@ -301,13 +814,26 @@ class Flow():
                     if redirect_std:
                         if initial_step:
                             spinner = make_spinner(initial_step)
+                        line_number = 0
                         while True:
                             line = proc.stdout.readline()
                             if not line:
                                 end_step()
                                 break
+                            line_number += 1
+                            watchdog.activity()
                             log_file.write(line)
-                            log_file.flush()
+                            if time.monotonic() - last_flush >= flush_interval:
+                                log_file.flush()
+                                last_flush = time.monotonic()
+                            reason = abort_reason(line)
+                            if reason:
+                                end_step()
+                                aborted = dict(tool=prog, reason=reason, line=line.rstrip(), line_number=line_number,
+                                               logfile=str(stdout_logfile))
+                                logger.critical(f"[Abort] Terminating {prog}[{proc.pid}] due to {reason}: {line.strip()}")
+                                final_kill(proc)
+                                break
                             if verbose or echo_instructed:
                                 if disable_echo_re.match(line):
                                     echo_instructed = False
@@ -345,12 +871,31 @@ class Flow():
                     print(SHOW_CURSOR)
                 final_kill(proc)
             finally:
+                if watchdog:
+                    watchdog.stop()
                 final_kill(proc)
 
         if spinner:
             print(SHOW_CURSOR)
 
-        if proc.returncode != 0:
+        if watchdog and watchdog.fired and not aborted:
+            reason = f'flow timeout of {timeout} seconds' if watchdog.fired == 'timeout' else watchdog.fired
+            aborted = dict(tool=prog, reason=reason, logfile=str(stdout_logfile))
+        with _results_lock:
+            if watchdog and watchdog.peak:
+                self.results['peak_memory_mb'] = round(max(self.results.get('peak_memory_mb', 0), watchdog.peak / (1 << 20)), 1)
+            if aborted:
+                self.results['aborted'] = aborted
+
+        if aborted:
+            m = f'`{proc.args[0]}` was terminated due to {aborted["reason"]}'
+            if 'line' in aborted:
+                m += f' (line {aborted["line_number"]}: {aborted["line"]})'
+            logger.critical(
+                f'{m}. Please check `{stdout_logfile}` for error messages!')
+            if check:
+                raise ToolAborted(m)
+        elif proc.returncode != 0:
             m = f'`{proc.args[0]}` exited with returncode {proc.returncode}'
             logger.critical(
                 f'{m}. Please check `{stdout_logfile}` for error messages!')
@@ -358,17 +903,17 @@ class Flow():
                 raise NonZeroExit(m)
         else:
             logger.info(
-                f'Execution of {prog} in {self.flow_run_dir} completed with returncode {proc.returncode}')
+                f'Execution of {prog} in {cwd} completed with returncode {proc.returncode}')
 
     def parse_report_regex(self, reportfile_path, re_pattern, *other_re_patterns, dotall=True):
         # TODO fix debug and verbosity levels!
         high_debug = self.args.verbose
-        if not reportfile_path.exists():
+        if not run_file_exists(reportfile_path):
             logger.warning(
                 f'File {reportfile_path} does not exist! Most probably the flow run had failed.\n Please check log files in {self.flow_run_dir}'
             )
             return False
-        with open(reportfile_path) as rpt_file:
+        with open_run_file(reportfile_path) as rpt_file:
             content = rpt_file.read()
 
             flags = re.MULTILINE | re.IGNORECASE
@@ -459,14 +1004,18 @@ class Flow():
 
 class SimFlow(Flow):
     required_settings = {}
+    artifacts = Flow.artifacts + ['*.vcd', '*.vcd.gz', '*.saif', '*.fst', '*.ghw', '*.wdb']
 
     @property
     def sim_sources(self):
+        """RTL and testbench sources. If flow setting `order_sources` is true, sources are reordered based on their dependencies (see order_sources)."""
         tb_settings = self.settings.design["tb"]
         srcs = self.settings.design["rtl"]['sources']
         for src in tb_settings['sources']:
             if not src in srcs:
                 srcs.append(src)
+        if self.settings.flow.get('order_sources', False):
+            return order_sources(srcs)
         return srcs
 
     @property
@@ -505,6 +1054,31 @@ class SimFlow(Flow):
             vcd = 'debug_dump.vcd'
         return vcd
 
+    def waveform_pipes(self, vcd_files) -> WaveformPipes:
+        """
+        Context manager which converts the VCD dumps (paths relative to flow_run_dir) while the simulator is writing them,
+        if flow setting `waveform_compression` is 'fst' (or true) or 'gzip'. Otherwise the VCD files are left untouched.
+        """
+        fmt = self.settings.flow.get('waveform_compression')
+        if fmt is True:
+            fmt = 'fst'
+        return WaveformPipes([self.flow_run_dir / f for f in vcd_files if f] if fmt else [], fmt or 'fst')
+
+    def saif_vcd(self, saif: str, vcd: str = None) -> str:
+        """VCD dump to use for generating `saif`: `vcd` if specified, otherwise named after the SAIF file"""
+        return vcd or (Path(saif).stem + '.vcd')
+
+    def vcd_to_saif(self, vcd: str, saif: str):
+        """
+        Write the switching activity of the (possibly compressed) VCD dump `vcd` to `saif` (paths relative to flow_run_dir),
+        e.g. for simulators which can't produce SAIF themselves. Large dumps are processed using `nthreads` processes.
+        """
+        vcd_path = self.flow_run_dir / vcd
+        if self.settings.flow.get('waveform_compression'):
+            # 'fst' falls back to 'gzip' when vcd2fst is not available
+            vcd_path = next((p for p in (compressed_path(vcd_path, fmt) for fmt in WAVEFORM_FORMATS) if p.exists()), vcd_path)
+        vcd_to_saif(vcd_path, self.flow_run_dir / saif, jobs=self.nthreads, design=self.tb_top)
+
 
 class SynthFlow(Flow):
     required_settings = {'clock_period': float}
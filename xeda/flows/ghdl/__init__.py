@@ -1,9 +1,18 @@
 # © 2020 [Kamyar Mohajerani](mailto:kamyar@ieee.org)
 
-from ..flow import SimFlow, Flow
+import hashlib
+import json
+import logging
+from pathlib import Path
+
+from ..flow import SimFlow, Flow, NonZeroExit
+from ..hdl_deps import DependencyGraph, scan_file
+
+logger = logging.getLogger()
+
 
 class Ghdl(Flow):
-    pass
+    version_command = ['ghdl', '--version']
 
 class GhdlSim(Ghdl, SimFlow):
 
@@ -67,38 +76,176 @@ class GhdlSim(Ghdl, SimFlow):
                 run_options.append(f'--sdf={s.get("delay", "max")}={root}={s["file"]}')
 
         ghw = flow_settings.get('wave', flow_settings.get('ghw'))
-
-        if self.vcd:
-            run_options.append(f'--vcd={self.vcd}')
-        elif ghw:
+        if ghw:
             if not isinstance(ghw, str):
                 ghw = 'dump.ghw'
             if not ghw.endswith('.ghw'):
                 ghw += '.ghw'
-            run_options.append(f'--wave={ghw}')
 
-        tb_generics_opts = [f"-g{k}={v}" for k, v in tb_settings.get("generics", {}).items()]
-        
-        self.run_process('ghdl', ['remove'] + vhdl_std_opts,
+        # GHDL binds top-level generics at simulation time: all run configurations share a single elaboration
+        tb_generics = tb_settings.get("generics", {})
+        # GHDL can't write SAIF: it's generated from a VCD dump after the simulation
+        saif = flow_settings.get('saif')
+        run_configs = flow_settings.get('run_configs')
+        if not run_configs:
+            run_configs = [dict(name=None, generics=tb_generics, vcd=self.saif_vcd(saif, self.vcd) if saif else self.vcd, ghw=ghw, saif=saif)]
+        else:
+            for idx, rc in enumerate(run_configs):
+                rc['generics'] = {**tb_generics, **rc.get('generics', {})}
+                if not 'name' in rc:
+                    rc['name'] = f'run_{idx}'
+                if not 'vcd' in rc:
+                    rc['vcd'] = (rc['name'] + '_' + self.vcd) if self.vcd else None
+                if not 'ghw' in rc:
+                    rc['ghw'] = (rc['name'] + '_' + ghw) if ghw else None
+                if not 'saif' in rc:
+                    rc['saif'] = (rc['name'] + '_' + saif) if saif else None
+                if rc['saif'] and not rc['vcd']:
+                    rc['vcd'] = self.saif_vcd(rc['saif'])
+
+        lock = None
+        if flow_settings.get('incremental'):
+            # not imported at module level: flow_runner depends on flows
+            from ...flow_runner.lock import RunLock
+
+            workdir = self.incremental_workdir(analysis_options + warns)
+            workdir_opts = [f'--workdir={workdir}']
+            vhdl_std_opts = vhdl_std_opts + workdir_opts
+            elab_options += workdir_opts
+            # the work library is shared by all runs of the design (e.g. of a runner, or of concurrent xeda processes):
+            # it's locked until the simulations, which read it, are done
+            lock = RunLock(workdir.with_name(f'{workdir.name}.lock'))
+            lock.acquire()
+            if lock.waited:
+                logger.info(f"Waited for another run using the GHDL work library {workdir}")
+        try:
+            if lock:
+                self.analyze_incremental(workdir, analysis_options + warns, vhdl_std_opts)
+            else:
+                self.analyze_all(analysis_options + warns, vhdl_std_opts)
+
+            self.run_process('ghdl', ['make'] + elab_options + optimize + warns + lib_paths + self.sim_tops,
+                             initial_step='Elaborating design',
+                             stdout_logfile='ghdl_elaborate_stdout.log',
+                             check=True
+                             )
+
+            for rc in run_configs:
+                rc_run_options = list(run_options)
+                if rc.get('vcd'):
+                    rc_run_options.append(f'--vcd={rc["vcd"]}')
+                elif rc.get('ghw'):
+                    rc_run_options.append(f'--wave={rc["ghw"]}')
+                rc_generics_opts = [f"-g{k}={v}" for k, v in rc['generics'].items()]
+                with self.waveform_pipes([rc.get('vcd')]):
+                    self.run_process('ghdl', ['run'] + vhdl_std_opts + self.sim_tops + rc_run_options + rc_generics_opts, # GHDL supports primary_unit [secondary_unit] 
+                                     initial_step='Running simulation' + (f' {rc["name"]}' if rc['name'] else ''),
+                                     stdout_logfile=f'ghdl_run_{rc["name"]}_stdout.log' if rc['name'] else 'ghdl_run_stdout.log',
+                                     force_echo=True
+                                     )
+                if rc.get('saif'):
+                    self.vcd_to_saif(rc['vcd'], rc['saif'])
+        finally:
+            if lock:
+                lock.release()
+
+    def analyze_all(self, analysis_options, std_opts):
+        self.run_process('ghdl', ['remove'] + std_opts,
                          initial_step='Clean up previously-generated files and library',
                          stdout_logfile='ghdl_remove_stdout.log',
                          check=True
                          )
 
-        self.run_process('ghdl', ['import'] + analysis_options + warns + list(map(lambda x: str(x), self.sim_sources)),
+        self.run_process('ghdl', ['import'] + analysis_options + list(map(lambda x: str(x), self.sim_sources)),
                          initial_step='Analyzing VHDL files',
                          stdout_logfile='ghdl_analyze_stdout.log',
                          check=True
                          )
 
-        self.run_process('ghdl', ['make'] + elab_options + optimize + warns + lib_paths + self.sim_tops,
-                         initial_step='Elaborating design',
-                         stdout_logfile='ghdl_elaborate_stdout.log',
+    def incremental_workdir(self, analysis_options) -> Path:
+        """work library kept between runs of the same design with the same analysis options"""
+        options_hash = hashlib.sha1(' '.join(o for o in analysis_options if o != '-v').encode()).hexdigest()[:16]
+        return (self.xeda_run_dir / '.ghdl_work' / f'{self.settings.design["name"]}_{options_hash}').resolve()
+
+    def analyze_incremental(self, workdir: Path, analysis_options, std_opts):
+        """
+        Analyze only the sources which were modified since the previous run, and every source depending on them.
+        Per-file content hashes and the design units provided and used by each file are kept in a manifest inside the work library.
+        The library is rebuilt from scratch if the analysis options change, sources are removed, or incremental analysis fails.
+        The caller holds the lock of the work library.
+        std_opts: --std and --workdir options passed to `ghdl remove`
+        """
+        manifest_path = workdir / 'xeda_manifest.json'
+        sources = [src for src in self.sim_sources if src.type == 'vhdl']
+        files = [str(src.file) for src in sources]
+        options = [o for o in analysis_options if o != '-v']
+
+        manifest = {}
+        if manifest_path.exists() and list(workdir.glob('*.cf')):
+            try:
+                with open(manifest_path) as f:
+                    manifest = json.load(f)
+            except Exception as e:
+                logger.warning(f"Ignoring unreadable GHDL manifest {manifest_path}: {e}")
+        previous = manifest.get('files', {}) if manifest.get('options') == options else {}
+
+        units = {}
+        changed = []
+        for src, path in zip(sources, files):
+            entry = previous.get(path)
+            if entry and entry['hash'] == src.hash:
+                units[path] = (entry['provides'], entry['depends'])
+            else:
+                units[path] = scan_file(path)
+                changed.append(path)
+        graph = DependencyGraph(files, units)
+
+        def save_manifest():
+            manifest_files = {path: dict(hash=src.hash, provides=sorted(units[path][0]), depends=sorted(units[path][1]))
+                              for src, path in zip(sources, files)}
+            tmp_path = manifest_path.with_suffix('.tmp')
+            with open(tmp_path, 'w') as f:
+                json.dump(dict(options=options, files=manifest_files), f, indent=1)
+            tmp_path.replace(manifest_path)
+
+        removed = set(previous) - set(files)
+        if not previous or removed:
+            if removed:
+                logger.info(f"{len(removed)} source(s) were removed since the last run. Rebuilding the GHDL work library.")
+            else:
+                logger.info(f"Building the GHDL work library in {workdir}")
+            self.rebuild_workdir(workdir, analysis_options, std_opts, graph.topological_order())
+            save_manifest()
+            return
+
+        dirty = graph.topological_order(graph.transitive_dependents(changed))
+        if not dirty:
+            logger.info(f"All {len(files)} source(s) are up-to-date in {workdir}")
+            return
+        logger.info(f"Re-analyzing {len(dirty)} of {len(files)} source(s): {len(changed)} modified and {len(dirty) - len(changed)} dependent(s)")
+        try:
+            self.run_process('ghdl', ['-a'] + analysis_options + [f'--workdir={workdir}'] + dirty,
+                             initial_step='Analyzing modified VHDL files',
+                             stdout_logfile='ghdl_analyze_stdout.log',
+                             check=True
+                             )
+        except NonZeroExit:
+            logger.warning("Incremental analysis failed. Rebuilding the GHDL work library.")
+            self.rebuild_workdir(workdir, analysis_options, std_opts, graph.topological_order())
+        save_manifest()
+
+    def rebuild_workdir(self, workdir: Path, analysis_options, std_opts, files):
+        workdir.mkdir(parents=True, exist_ok=True)
+        manifest_path = workdir / 'xeda_manifest.json'
+        if manifest_path.exists():
+            manifest_path.unlink()
+        self.run_process('ghdl', ['remove'] + std_opts,
+                         initial_step='Clean up previously-generated files and library',
+                         stdout_logfile='ghdl_remove_stdout.log',
                          check=True
                          )
-
-        self.run_process('ghdl', ['run'] + vhdl_std_opts + self.sim_tops + run_options + tb_generics_opts, # GHDL supports primary_unit [secondary_unit] 
-                         initial_step='Running simulation',
-                         stdout_logfile='ghdl_run_stdout.log',
-                         force_echo=True
+        self.run_process('ghdl', ['import'] + analysis_options + [f'--workdir={workdir}'] + files,
+                         initial_step='Analyzing VHDL files',
+                         stdout_logfile='ghdl_analyze_stdout.log',
+                         check=True
                          )
@@ -0,0 +1,189 @@
+# © 2020 [Kamyar Mohajerani](mailto:kamyar@ieee.org)
+
+"""
+Lightweight (regex-based) scanner of HDL design units and their dependencies.
+Good enough to order analysis and to find the dependents of a modified file, not a parser.
+"""
+
+import logging
+import re
+from pathlib import Path
+from typing import Dict, Iterable, List, Set, Tuple
+
+logger = logging.getLogger()
+
+# libraries provided by the simulator/toolchain
+STANDARD_LIBRARIES = {'std', 'ieee', 'unisim', 'unimacro', 'unifast', 'simprim', 'xpm', 'secureip', 'vital2000'}
+
+_vhdl_comment_re = re.compile(r'--[^\n]*|/\*.*?\*/', re.DOTALL)
+_vhdl_string_re = re.compile(r'"(?:[^"\n]|"")*"')
+_vhdl_primary_re = re.compile(r'\b(entity|package|context)\s+(\w+)\s+is\b', re.IGNORECASE)
+_vhdl_package_body_re = re.compile(r'\bpackage\s+body\s+(\w+)\s+is\b', re.IGNORECASE)
+_vhdl_secondary_re = re.compile(r'\b(architecture|configuration)\s+(\w+)\s+of\s+(\w+)\s+is\b', re.IGNORECASE)
+_vhdl_use_re = re.compile(r'\b(?:use|context)\s+(\w+)\s*\.\s*(\w+)', re.IGNORECASE)
+_vhdl_instance_re = re.compile(r'\b(?:entity|configuration)\s+(\w+)\s*\.\s*(\w+)', re.IGNORECASE)
+
+
+def scan_vhdl(text: str) -> Tuple[Set[str], Set[str]]:
+    """returns (provided design units, used design units) of a VHDL source. Unit names are lowercase."""
+    text = _vhdl_string_re.sub('""', _vhdl_comment_re.sub('', text))
+    provides = set()
+    depends = set()
+    for _, name in _vhdl_primary_re.findall(text):
+        provides.add(name.lower())
+    for name in _vhdl_package_body_re.findall(text):
+        depends.add(name.lower())
+    for kind, name, primary in _vhdl_secondary_re.findall(text):
+        depends.add(primary.lower())
+        if kind.lower() == 'configuration':
+            provides.add(name.lower())
+    for lib, name in _vhdl_use_re.findall(text) + _vhdl_instance_re.findall(text):
+        if lib.lower() not in STANDARD_LIBRARIES and name.lower() != 'all':
+            depends.add(name.lower())
+    return provides, depends - provides
+
+
+_verilog_comment_re = re.compile(r'//[^\n]*|/\*.*?\*/', re.DOTALL)
+_verilog_string_re = re.compile(r'"(?:[^"\\\n]|\\.)*"')
+_verilog_unit_re = re.compile(r'^\s*(?:module|macromodule|interface|package|program|primitive)\s+(?:(?:static|automatic)\s+)?(\w+)', re.MULTILINE)
+_verilog_package_ref_re = re.compile(r'\b(\w+)\s*::')
+# `type [#(...)] instance_name [array_range] (`, keywords are filtered out as they are not provided by any file
+_verilog_instance_re = re.compile(r'^\s*(\w+)\s*(?:#\s*\([^;]*?\))?\s*\\?(\w+)\s*(?:\[[^\]]*\]\s*)?\(', re.MULTILINE)
+
+
+def scan_verilog(text: str) -> Tuple[Set[str], Set[str]]:
+    """returns (provided design units, used design units) of a Verilog/SystemVerilog source. Unit names are lowercase."""
+    text = _verilog_string_re.sub('""', _verilog_comment_re.sub('', text))
+    provides = {name.lower() for name in _verilog_unit_re.findall(text)}
+    depends = {name.lower() for name in _verilog_package_ref_re.findall(text)}
+    depends.update(t.lower() for t, _ in _verilog_instance_re.findall(text))
+    return provides, depends - provides
+
+
+_scan_cache = {}
+
+
+def scan_file(path, type: str = None) -> Tuple[Set[str], Set[str]]:
+    """type: 'vhdl' or 'verilog'. Inferred from the file extension if not specified."""
+    path = Path(path)
+    if type is None:
+        type = 'verilog' if path.suffix.lower() in ('.v', '.sv', '.vh', '.svh') else 'vhdl'
+    with open(path, errors='replace') as f:
+        text = f.read()
+    return scan_verilog(text) if type == 'verilog' else scan_vhdl(text)
+
+
+def scan_source(src) -> Tuple[Set[str], Set[str]]:
+    """scan a DesignSource, results are cached based on the content hash of the source"""
+    key = (str(src.file), src.hash)
+    if key not in _scan_cache:
+        _scan_cache[key] = scan_file(src.file, src.type if src.type in ('vhdl', 'verilog') else None)
+    return _scan_cache[key]
+
+
+def source_graph(sources) -> 'DependencyGraph':
+    """DependencyGraph of a list of DesignSource's, using the string representation of the file paths"""
+    hdl_sources = [src for src in sources if src.type in ('vhdl', 'verilog')]
+    return DependencyGraph([str(src.file) for src in hdl_sources], {str(src.file): scan_source(src) for src in hdl_sources})
+
+
+def order_sources(sources) -> list:
+    """
+    Reorder DesignSource's so that each source comes after the sources it depends on.
+    The original order is kept as much as possible, non-HDL sources stay at the end.
+    The scanner is not a parser: if the scan is ambiguous (a design unit found in several files) or finds a dependency cycle,
+    the sources are returned in their original order.
+    """
+    graph = source_graph(sources)
+    if not graph.reliable():
+        return list(sources)
+    by_file = {str(src.file): src for src in sources}
+    ordered = [by_file[f] for f in graph.topological_order()]
+    return ordered + [src for src in sources if src not in ordered]
+
+
+class DependencyGraph:
+    """
+    File-level dependency graph of a list of HDL sources.
+        units: {file: (provides, depends)}, as returned by scan_file
+    Dependencies on units which are not provided by any of the files (e.g. pre-compiled libraries) are ignored.
+    """
+
+    def __init__(self, files: List[str], units: Dict[str, Tuple[Iterable[str], Iterable[str]]]) -> None:
+        self.files = list(files)
+        provider = {}
+        self.ambiguous_units: Set[str] = set()
+        for f in self.files:
+            for u in units[f][0]:
+                if u in provider and provider[u] != f:
+                    logger.warning(f"Design unit '{u}' is defined in both {provider[u]} and {f}")
+                    self.ambiguous_units.add(u)
+                provider.setdefault(u, f)
+        self.dependencies: Dict[str, Set[str]] = {
+            f: {provider[u] for u in units[f][1] if u in provider and provider[u] != f} for f in self.files
+        }
+        self.dependents: Dict[str, Set[str]] = {f: set() for f in self.files}
+        for f, deps in self.dependencies.items():
+            for d in deps:
+                self.dependents[d].add(f)
+
+    def has_cycle(self) -> bool:
+        state = {}  # file -> 1: on the stack, 2: done
+
+        def visit(f) -> bool:
+            state[f] = 1
+            for d in self.dependencies[f]:
+                if state.get(d) == 1 or (d not in state and visit(d)):
+                    return True
+            state[f] = 2
+            return False
+
+        return any(f not in state and visit(f) for f in self.files)
+
+    def reliable(self) -> bool:
+        """whether the dependencies are unambiguous and acyclic. Otherwise a warning is logged and the original order should be kept."""
+        if self.ambiguous_units:
+            logger.warning(f"Keeping the given order of the sources: design unit(s) {', '.join(sorted(self.ambiguous_units))} "
+                           "are defined in more than one file")
+            return False
+        if self.has_cycle():
+            logger.warning("Keeping the given order of the sources: the scanned dependencies have a cycle")
+            return False
+        return True
+
+    def transitive_dependents(self, files: Iterable[str]) -> Set[str]:
+        """the given files and every file which directly or indirectly depends on them"""
+        result = set()
+        stack = list(files)
+        while stack:
+            f = stack.pop()
+            if f in result:
+                continue
+            result.add(f)
+            stack.extend(self.dependents.get(f, ()))
+        return result
+
+    def topological_order(self, subset: Iterable[str] = None) -> List[str]:
+        """
+        Dependencies first, otherwise keeping the original order of the sources.
+        Files in a dependency cycle are kept in their original order.
+        """
+        subset = set(self.files if subset is None else subset)
+        order = []
+        visited = set()
+        on_stack = set()
+
+        def visit(f):
+            if f in visited or f in on_stack:
+                return
+            on_stack.add(f)
+            for d in sorted(self.dependencies[f], key=self.files.index):
+                visit(d)
+            on_stack.discard(f)
+            visited.add(f)
+            if f in subset:
+                order.append(f)
+
+        for f in self.files:
+            visit(f)
+        return order
@@ -5,6 +5,7 @@ from ..flow import SimFlow
 
 
 class Modelsim(SimFlow):
+    version_command = ['vsim', '-version']
 
     def run(self):
         vcom_options = ['-lint']
@@ -33,6 +34,11 @@ class Modelsim(SimFlow):
             if not self.vcd:
                 flow_settings['vcd'] = 'timing_sim.vcd'
 
+        # Modelsim can't write SAIF: it's generated from the VCD dump after the simulation
+        saif = flow_settings.get('saif')
+        if saif and not self.vcd:
+            flow_settings['vcd'] = self.saif_vcd(saif)
+
         tb_generics_opts = ' '.join([f"-g{k}={v}" for k, v in tb_settings["generics"].items()])
 
         modelsimini = flow_settings.get('modelsimini')
@@ -52,7 +58,10 @@ class Modelsim(SimFlow):
         if modelsimini:
             modelsim_opts.extend(['-modelsimini', modelsimini])
         
-        self.run_process('vsim', modelsim_opts,
-                         stdout_logfile='modelsim_stdout.log',
-                         check=True
-                         )
+        with self.waveform_pipes([self.vcd]):
+            self.run_process('vsim', modelsim_opts,
+                             stdout_logfile='modelsim_stdout.log',
+                             check=True
+                             )
+        if saif:
+            self.vcd_to_saif(self.vcd, saif)
@@ -6,6 +6,7 @@ from ...utils import parse_csv
 
 class Quartus(Flow):
     required_settings = {'clock_period': float, 'fpga_part': str}
+    version_command = ['quartus_sh', '--version']
 
     def create_project(self, **kwargs):
 
@@ -0,0 +1,11 @@
+proc errorExit {errorString} {
+  puts "\n===========================( *ENABLE ECHO* )==========================="
+  puts "Error: $errorString"
+  exit 1
+}
+
+## run configuration `{{rc.name}}` in a standalone xsim process (xsim {{snapshot_name}} -tclbatch ...)
+
+{% include 'xsim_run_config.tcl' %}
+
+quit
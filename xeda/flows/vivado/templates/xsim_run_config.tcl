@@ -0,0 +1,62 @@
+{% if rc.saif %}
+puts "\n===========================( Setting up SAIF )==========================="
+if {[file exists {{rc.saif}}]} {
+    puts "deleting existing SAIF file {{rc.saif}}"
+    file delete -force -- {{rc.saif}}
+}
+open_saif {{rc.saif}}
+{% endif %}
+
+## TODO: WDB support
+## set wdb_file "xsim_waves"
+## open_wave_database ${wdb_file}
+
+{%- if rc.vcd %}
+puts "\n===========================( Setting up VCD )==========================="
+open_vcd {{rc.vcd}}
+## Vivado (tested on 2020.1) crashes if using * and shared/protected variables are present
+log_vcd [get_objects -r -filter { type == variable || type == signal || type == internal_signal || type == in_port || type == out_port || type == inout_port || type == port } *]
+{% endif -%}
+
+{%- if debug_traces %}
+ltrace on
+ptrace on
+{% endif -%}
+
+puts "\n===========================( Running simulation )==========================="
+puts "\n===========================( *ENABLE ECHO* )==========================="
+{% if flow.get('prerun_time') %}
+puts "Pre-run for {{flow.prerun_time}}"
+if { [catch {eval run {{flow.prerun_time}} } error]} {
+    errorExit $error
+}
+{% endif -%}
+
+{%- if rc.saif %}
+puts "Adding nets to be logged in SAIF"
+
+log_saif [get_objects -r -filter { type == signal || type == internal_signal || type == in_port || type == out_port || type == inout_port || type == port } /{{tb_top}}/{{design.tb.uut}}/*]
+{% endif -%}
+
+
+puts "Main Run\n"
+
+if { [catch {eval run {% if 'stop_time' in flow and flow.stop_time %} {{flow.stop_time}} {% else %} all {% endif %} } error]} {
+    errorExit $error
+}
+
+set fin_time [eval current_time]
+
+puts "\[Vivado\] Simulation finished at ${fin_time}"
+
+puts "\n===========================( *DISABLE ECHO* )==========================="
+{% if rc.vcd %}
+puts "\n===========================( Closing VCD file )==========================="
+flush_vcd
+close_vcd
+{% endif -%}
+
+{%- if rc.saif %}
+puts "\n===========================( Closing SAIF file )==========================="
+close_saif
+{% endif %}
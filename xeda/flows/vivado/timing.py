@@ -0,0 +1,245 @@
+"""
+Timing paths of Vivado runs.
+
+iter_timing_paths streams the full path reports of `report_timing -path_type full` (e.g. post_route/timing.rpt) into records:
+    slack, status, startpoint, endpoint, start_clock, end_clock, path_group, path_type ('setup', 'hold', ...),
+    requirement, data_path_delay, cell_delay, net_delay, logic_levels, logic_cells ({cell type: count}), clock_skew, clock_uncertainty
+Delays are in ns. VivadoSynth.parse_reports saves the records of a run in `timing_paths.json` next to the report.
+
+`xeda-timing` ranks the endpoints which are recurrently critical across the runs of `xeda_run_dir`, based on an index of the
+setup paths of all runs (`<xeda_run_dir>/timing_index.json`), which is refreshed incrementally.
+"""
+
+import argparse
+import json
+import logging
+import os
+import re
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+from ..flow import open_run_file, run_file_exists
+
+logger = logging.getLogger()
+
+TIMING_REPORT = 'timing.rpt'
+TIMING_PATHS = 'timing_paths.json'
+TIMING_INDEX = 'timing_index.json'
+
+SLACK_RE = re.compile(r'^Slack(?:\s+\((\w+)\))?\s*:\s*(-?[\d.]+|-?inf)')
+NS_RE = re.compile(r'(-?[\d.]+)\s*ns')
+DATA_PATH_RE = re.compile(r'(-?[\d.]+)ns\s+\(logic\s+(-?[\d.]+)ns.*route\s+(-?[\d.]+)ns')
+CLOCK_RE = re.compile(r'clocked by\s+(\S+)')
+
+
+def _ns(value: str) -> Optional[float]:
+    match = NS_RE.match(value)
+    return float(match.group(1)) if match else None
+
+
+def _parse_field(path: dict, key: str, value: str):
+    if key == 'Source':
+        path['startpoint'] = value
+    elif key == 'Destination':
+        path['endpoint'] = value
+    elif key == 'Path Group':
+        path['path_group'] = value
+    elif key == 'Path Type':
+        path['path_type'] = value.split()[0].lower() if value else None
+    elif key == 'Requirement':
+        path['requirement'] = _ns(value)
+    elif key == 'Data Path Delay':
+        match = DATA_PATH_RE.match(value)
+        if match:
+            path['data_path_delay'], path['cell_delay'], path['net_delay'] = (float(g) for g in match.groups())
+        else:
+            path['data_path_delay'] = _ns(value)
+    elif key == 'Logic Levels':
+        levels, _, cells = value.partition('(')
+        path['logic_levels'] = int(levels) if levels.strip().isdigit() else None
+        path['logic_cells'] = {t: int(n) for t, n in re.findall(r'(\w+)=(\d+)', cells)}
+    elif key == 'Clock Path Skew':
+        path['clock_skew'] = _ns(value)
+    elif key == 'Clock Uncertainty':
+        path['clock_uncertainty'] = _ns(value)
+
+
+def iter_timing_paths(report) -> Iterator[dict]:
+    """
+    Stream the paths of a timing report (plain, compressed, or archived, see open_run_file).
+    Only the summary of each path is parsed, its detailed delay table is skipped.
+    """
+    path = None
+    in_summary = False
+    last_key = None
+    with open_run_file(report) as f:
+        for line in f:
+            line = line.strip()
+            if line.startswith('Slack'):
+                match = SLACK_RE.match(line)
+                if match:
+                    if path:
+                        yield path
+                    path = dict(slack=float(match.group(2)), status=match.group(1))
+                    in_summary = True
+                    last_key = None
+                    continue
+            if not in_summary or not line:
+                continue
+            if line.startswith('Location'):
+                # start of the delay table
+                in_summary = False
+                continue
+            if line.startswith('('):
+                # continuation of Source/Destination: (rising edge-triggered cell FDRE clocked by clk {...})
+                match = CLOCK_RE.search(line)
+                if match and last_key in ('Source', 'Destination'):
+                    path['start_clock' if last_key == 'Source' else 'end_clock'] = match.group(1)
+                continue
+            key, sep, value = line.partition(':')
+            if sep:
+                last_key = key.strip()
+                _parse_field(path, last_key, value.strip())
+    if path:
+        yield path
+
+
+def save_timing_paths(report, path):
+    """parse `report` and save its paths as JSON. Returns the number of paths."""
+    paths = list(iter_timing_paths(report))
+    with open(path, 'w') as f:
+        json.dump(paths, f, indent=1)
+    return len(paths)
+
+
+class TimingIndex:
+    """
+    {run_dir: {mtime, design.name, flow.name, timestamp, paths}} of all runs with timing paths under `xeda_run_dir`, where `paths` are
+    the setup paths of the run as [endpoint, startpoint, slack, logic_levels, data_path_delay, net_delay], worst slack first.
+    Entries are keyed by the modification time of the results.json of their run, so only new or re-run runs are re-read.
+    """
+
+    def __init__(self, xeda_run_dir) -> None:
+        self.xeda_run_dir = Path(xeda_run_dir)
+        self.path = self.xeda_run_dir / TIMING_INDEX
+        self.entries: Dict[str, dict] = {}
+        try:
+            with open(self.path) as f:
+                self.entries = json.load(f)
+        except FileNotFoundError:
+            pass
+        except ValueError as e:
+            logger.warning(f"[Timing] Ignoring corrupted index {self.path}: {e}")
+
+    @staticmethod
+    def read_run(run_dir: Path) -> Optional[dict]:
+        paths_file = run_dir / 'reports' / 'post_route' / TIMING_PATHS
+        if not run_file_exists(paths_file):
+            return None
+        with open_run_file(paths_file) as f:
+            paths = json.load(f)
+        with open(run_dir / 'results.json') as f:
+            results = json.load(f)
+        setup = sorted((p for p in paths if p.get('path_type') == 'setup' and p.get('endpoint') and p.get('slack') is not None),
+                       key=lambda p: p['slack'])
+        entry = {k: results.get(k) for k in ('design.name', 'flow.name', 'timestamp')}
+        entry['paths'] = [[p['endpoint'], p.get('startpoint'), p['slack'], p.get('logic_levels'), p.get('data_path_delay'),
+                           p.get('net_delay')] for p in setup]
+        return entry
+
+    def update(self) -> int:
+        """refresh the entries of new, re-run, and removed runs, and save the index. Returns the number of runs which were (re)read."""
+        entries = {}
+        num_read = 0
+        for results_json in self.xeda_run_dir.glob('**/.xeda_run/*/*/results.json'):
+            run_dir = results_json.parent
+            key = str(run_dir.resolve())
+            mtime = results_json.stat().st_mtime
+            entry = self.entries.get(key)
+            if entry is None or entry.get('mtime') != mtime:
+                try:
+                    entry = self.read_run(run_dir)
+                except (OSError, ValueError) as e:
+                    logger.warning(f"[Timing] Failed to read the timing paths of {run_dir}: {e}")
+                    entry = None
+                if entry is None:
+                    continue
+                entry['mtime'] = mtime
+                num_read += 1
+            entries[key] = entry
+        if entries != self.entries:
+            self.entries = entries
+            tmp = self.path.with_name(f'.{self.path.name}.{os.getpid()}.tmp')
+            with open(tmp, 'w') as f:
+                json.dump(entries, f)
+            os.replace(tmp, self.path)
+        return num_read
+
+    def critical_endpoints(self, worst: int = 10, group_bits=False, design: Optional[str] = None) -> List[dict]:
+        """
+        Endpoints among the `worst` setup paths of each run, ranked by the number of runs in which they are, then by their worst slack.
+        group_bits: merge the bits of buses (e.g. data_reg[3]/D and data_reg[7]/D)
+        """
+        stats: Dict[str, dict] = {}
+        for entry in self.entries.values():
+            if design and entry.get('design.name') != design:
+                continue
+            seen = set()
+            for endpoint, startpoint, slack, levels, delay, net_delay in entry['paths'][:worst]:
+                if group_bits:
+                    endpoint = re.sub(r'\[\d+\]', '[*]', endpoint)
+                s = stats.setdefault(endpoint, dict(endpoint=endpoint, runs=0, paths=0, worst_slack=slack, slacks=[], levels=[],
+                                                    route=[], startpoints={}))
+                if endpoint not in seen:
+                    seen.add(endpoint)
+                    s['runs'] += 1
+                s['paths'] += 1
+                s['worst_slack'] = min(s['worst_slack'], slack)
+                s['slacks'].append(slack)
+                if levels is not None:
+                    s['levels'].append(levels)
+                if delay and net_delay is not None:
+                    s['route'].append(net_delay / delay)
+                s['startpoints'][startpoint] = s['startpoints'].get(startpoint, 0) + 1
+        ranked = []
+        for s in stats.values():
+            ranked.append(dict(endpoint=s['endpoint'], runs=s['runs'], paths=s['paths'], worst_slack=s['worst_slack'],
+                               mean_slack=sum(s['slacks']) / len(s['slacks']),
+                               logic_levels=sum(s['levels']) / len(s['levels']) if s['levels'] else None,
+                               route_pct=100 * sum(s['route']) / len(s['route']) if s['route'] else None,
+                               startpoint=max(s['startpoints'], key=s['startpoints'].get)))
+        ranked.sort(key=lambda r: (-r['runs'], r['worst_slack']))
+        return ranked
+
+
+def timing_main(args=None):
+    parser = argparse.ArgumentParser(prog='xeda-timing', description='Rank the endpoints which are critical in many runs')
+    parser.add_argument('--xeda-run-dir', default=os.environ.get('xeda_run_dir', 'xeda_run'),
+                        help='xeda run directory (default: xeda_run)')
+    parser.add_argument('--worst', type=int, default=10, help='number of worst setup paths of each run to consider (default: 10)')
+    parser.add_argument('--group-bits', action='store_true', help='merge the endpoints of the bits of a bus')
+    parser.add_argument('--design', help='only consider the runs of this design')
+    parser.add_argument('-n', type=int, default=20, help='number of endpoints to list (default: 20)')
+    parsed_args = parser.parse_args(args)
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+
+    index = TimingIndex(parsed_args.xeda_run_dir)
+    num_read = index.update()
+    logger.info(f"[Timing] {len(index.entries)} run(s) with timing paths ({num_read} newly indexed)")
+    ranked = index.critical_endpoints(parsed_args.worst, parsed_args.group_bits, parsed_args.design)[:parsed_args.n]
+    if not ranked:
+        return
+    columns = ['runs', 'paths', 'worst_slack', 'mean_slack', 'logic_levels', 'route_pct']
+    widths = [max(13, len(c) + 2) for c in columns]
+    endpoint_width = max(len('Endpoint'), *(len(r['endpoint']) for r in ranked)) + 2
+    hline = '-' * (endpoint_width + sum(widths))
+    print(hline)
+    print(f"{'Endpoint':<{endpoint_width}}" + ''.join(f'{c:>{w}}' for c, w in zip(columns, widths)))
+    print(hline)
+    for r in ranked:
+        cells = [f"{r['endpoint']:<{endpoint_width}}"]
+        for c, w in zip(columns, widths):
+            v = r[c]
+            cells.append(f'{v:>{w}.3f}' if isinstance(v, float) else f'{str(v if v is not None else "-"):>{w}}')
+        print(''.join(cells))
+    print(hline)
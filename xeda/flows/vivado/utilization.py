@@ -0,0 +1,235 @@
+"""
+Hierarchical utilization of Vivado runs (`report_utilization -hierarchical -format xml`).
+
+UtilizationTree keeps the instance tree of a design as flat numpy arrays, in the pre-order of the report (parents precede their
+descendants):
+    parent[i]: index of the parent of instance i (-1 for the top)
+    name[i], module[i]: indices into the `names` and `modules` string tables
+    values[i, j]: resources used by instance i, including its descendants, for column j (see COLUMNS)
+VivadoSynth.parse_reports saves it next to the report as `hierarchical_utilization.npz`, which is queried by `xeda-util`:
+top consumers, totals by module, and per-instance differences between two runs.
+"""
+
+import argparse
+import logging
+import re
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from ..flow import open_run_file, run_file_exists
+from .vivado import iter_report_rows
+
+logger = logging.getLogger()
+
+HIER_UTILIZATION_XML = 'hierarchical_utilization.xml'
+HIER_UTILIZATION = 'hierarchical_utilization.npz'
+
+COLUMNS = ('lut', 'lut_logic', 'lutram', 'srl', 'ff', 'ramb36', 'ramb18', 'uram', 'dsp')
+# report column headers (depend on the device family) -> column
+HEADERS = {'Total LUTs': 'lut', 'Logic LUTs': 'lut_logic', 'LUTRAMs': 'lutram', 'SRLs': 'srl', 'FFs': 'ff',
+           'RAMB36': 'ramb36', 'RAMB18': 'ramb18', 'URAM': 'uram', 'DSP48 Blocks': 'dsp', 'DSP Blocks': 'dsp'}
+# derived metrics
+METRICS = COLUMNS + ('bram',)
+
+
+def base_module(module: str) -> str:
+    """name of the module before uniquification by Vivado (e.g. fifo__parameterized2 -> fifo)"""
+    return re.sub(r'__parameterized\d+$', '', module)
+
+
+class UtilizationTree:
+    def __init__(self, names, modules, name, module, parent, values) -> None:
+        self.names = np.asarray(names, dtype=str)
+        self.modules = np.asarray(modules, dtype=str)
+        self.name = np.asarray(name, dtype=np.int32)
+        self.module = np.asarray(module, dtype=np.int32)
+        self.parent = np.asarray(parent, dtype=np.int32)
+        self.values = np.asarray(values, dtype=np.int64).reshape(len(self.parent), len(COLUMNS))
+        self._paths = None
+
+    def __len__(self) -> int:
+        return len(self.parent)
+
+    @classmethod
+    def from_xml(cls, report_xml) -> 'UtilizationTree':
+        """
+        The nesting of instances is given by the indentation of their names in the report.
+        The module of the top instance is reported as '(top)' and is replaced by the name of the top.
+        """
+        names: Dict[str, int] = {}
+        modules: Dict[str, int] = {}
+        name, module, parent, values = [], [], [], []
+        stack: List[Tuple[int, int]] = []  # (indentation, index) of the ancestors of the current row
+        cols = None
+        for _, _, header, cells in iter_report_rows(report_xml, keep_indent=True):
+            if cols is None:
+                if not header or header[0].strip() != 'Instance':
+                    continue
+                cols = [(i, COLUMNS.index(HEADERS[h.strip()])) for i, h in enumerate(header) if h.strip() in HEADERS]
+            if len(cells) < 2:
+                continue
+            inst = cells[0].lstrip()
+            indent = len(cells[0]) - len(inst)
+            while stack and stack[-1][0] >= indent:
+                stack.pop()
+            mod = cells[1].strip()
+            if not stack and mod.startswith('(') and mod.endswith(')'):
+                mod = inst
+            row = [0] * len(COLUMNS)
+            for i, c in cols:
+                try:
+                    row[c] = int(float(cells[i])) if i < len(cells) and cells[i] else 0
+                except ValueError:
+                    pass
+            parent.append(stack[-1][1] if stack else -1)
+            stack.append((indent, len(name)))
+            name.append(names.setdefault(inst, len(names)))
+            module.append(modules.setdefault(mod, len(modules)))
+            values.append(row)
+        if not name:
+            raise ValueError(f"No instances found in {report_xml}")
+        return cls(list(names), list(modules), name, module, parent, values)
+
+    @classmethod
+    def load(cls, path) -> 'UtilizationTree':
+        """load a saved tree, or parse a hierarchical_utilization.xml report"""
+        path = Path(path)
+        if path.suffix == '.xml':
+            return cls.from_xml(path)
+        with open_run_file(path, 'rb') as f:
+            with np.load(f, allow_pickle=False) as data:
+                return cls(*(data[k] for k in ('names', 'modules', 'name', 'module', 'parent', 'values')))
+
+    def save(self, path):
+        with open(path, 'wb') as f:
+            np.savez_compressed(f, names=self.names, modules=self.modules, name=self.name, module=self.module,
+                                parent=self.parent, values=self.values)
+
+    def metric(self, metric: str, exclusive=False) -> np.ndarray:
+        """
+        values of `metric` for all instances. 'bram' is in 36Kb tiles (RAMB36 + RAMB18 / 2)
+        exclusive: excluding the resources of the sub-instances
+        """
+        if metric == 'bram':
+            v = self.values[:, COLUMNS.index('ramb36')] + self.values[:, COLUMNS.index('ramb18')] / 2
+        else:
+            v = self.values[:, COLUMNS.index(metric)].copy()
+        if exclusive and len(v) > 1:
+            np.subtract.at(v, self.parent[1:], v[1:])
+        return v
+
+    def paths(self) -> List[str]:
+        """hierarchical names of the instances, relative to the top (the name of the top for the top itself)"""
+        if self._paths is None:
+            paths = []
+            for i, (p, n) in enumerate(zip(self.parent, self.name)):
+                n = str(self.names[n])
+                paths.append(n if p < 0 else n if self.parent[p] < 0 else f'{paths[p]}/{n}')
+            self._paths = paths
+        return self._paths
+
+    def module_of(self, i: int) -> str:
+        return str(self.modules[self.module[i]])
+
+    def top(self, metric='lut', n=10, exclusive=False) -> List[Tuple[str, str, float]]:
+        """the `n` largest consumers of `metric`: [(instance path, module, value)]"""
+        v = self.metric(metric, exclusive)
+        order = np.argsort(-v, kind='stable')[:n]
+        paths = self.paths()
+        return [(paths[i], self.module_of(i), v[i].item()) for i in order if v[i] > 0]
+
+    def by_module(self, metric='lut') -> List[Tuple[str, int, float]]:
+        """
+        [(module, number of instances, total)] sorted by total, where modules are merged with their parameterized variants.
+        Instances nested in an instance of the same module are not counted twice.
+        """
+        v = self.metric(metric)
+        base = [base_module(str(m)) for m in self.modules]
+        inst_base = [base[m] for m in self.module]
+        totals: Dict[str, List] = {}
+        for i, p in enumerate(self.parent):
+            b = inst_base[i]
+            a = p
+            while a >= 0 and inst_base[a] != b:
+                a = self.parent[a]
+            if a >= 0:
+                continue
+            t = totals.setdefault(b, [0, 0])
+            t[0] += 1
+            t[1] += v[i].item()
+        return sorted(((m, k, t) for m, (k, t) in totals.items()), key=lambda e: -e[2])
+
+    def diff(self, other: 'UtilizationTree', metric='lut', n: Optional[int] = None) -> List[Tuple[str, str, float, float]]:
+        """
+        [(instance path, module, value in self, value in other)] of the instances whose `metric` differ, largest changes first.
+        Instances are matched by path. Instances which only exist in one of the trees have a value of 0 in the other.
+        """
+        a = dict(zip(self.paths(), zip(self.metric(metric).tolist(), range(len(self)))))
+        b = dict(zip(other.paths(), zip(other.metric(metric).tolist(), range(len(other)))))
+        rows = []
+        for path in list(a) + [p for p in b if p not in a]:
+            va, ia = a.get(path, (0, None))
+            vb, ib = b.get(path, (0, None))
+            if va != vb:
+                module = self.module_of(ia) if ia is not None else other.module_of(ib)
+                rows.append((path, module, va, vb))
+        rows.sort(key=lambda r: -abs(r[3] - r[2]))
+        return rows[:n] if n else rows
+
+
+def find_report(path) -> Path:
+    """the saved tree or XML report of a run, given its run directory, reports directory, or the file itself"""
+    path = Path(path)
+    if path.is_file():
+        return path
+    for d in (path / 'reports' / 'post_route', path / 'post_route', path):
+        for name in (HIER_UTILIZATION, HIER_UTILIZATION_XML):
+            if run_file_exists(d / name):
+                return d / name
+    raise FileNotFoundError(f"No hierarchical utilization report found in {path}")
+
+
+def print_table(columns, rows):
+    rows = [[f'{v:g}' if isinstance(v, (int, float)) else str(v) for v in r] for r in rows]
+    widths = [max([12, len(c) + 2] + [len(r[j]) + 2 for r in rows]) for j, c in enumerate(columns)]
+    hline = '-' * sum(widths)
+    print(hline)
+    print(f'{columns[0]:<{widths[0]}}' + ''.join(f'{c:>{w}}' for c, w in zip(columns[1:], widths[1:])))
+    print(hline)
+    for r in rows:
+        print(f'{r[0]:<{widths[0]}}' + ''.join(f'{v:>{w}}' for v, w in zip(r[1:], widths[1:])))
+    print(hline)
+
+
+def utilization_main(args=None):
+    parser = argparse.ArgumentParser(prog='xeda-util', description='Query the hierarchical utilization of Vivado runs')
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.required = True
+    top_parser = subparsers.add_parser('top', help='largest consumers of a resource')
+    top_parser.add_argument('run', help='run directory, or hierarchical_utilization.{npz,xml}')
+    top_parser.add_argument('--exclusive', action='store_true', help="exclude the resources of sub-instances")
+    modules_parser = subparsers.add_parser('modules', help='totals by module')
+    modules_parser.add_argument('run', help='run directory, or hierarchical_utilization.{npz,xml}')
+    diff_parser = subparsers.add_parser('diff', help='per-instance differences between two runs')
+    diff_parser.add_argument('run', help='baseline run directory, or hierarchical_utilization.{npz,xml}')
+    diff_parser.add_argument('other', help='run directory, or hierarchical_utilization.{npz,xml}, to compare to the baseline')
+    for p in (top_parser, modules_parser, diff_parser):
+        p.add_argument('-m', '--metric', choices=METRICS, default='lut', help='resource (default: lut)')
+        p.add_argument('-n', type=int, default=20, help='number of rows (default: 20)')
+    parsed_args = parser.parse_args(args)
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+
+    tree = UtilizationTree.load(find_report(parsed_args.run))
+    metric = parsed_args.metric
+    if parsed_args.command == 'top':
+        print_table(['Instance', 'Module', metric], tree.top(metric, parsed_args.n, parsed_args.exclusive))
+    elif parsed_args.command == 'modules':
+        print_table(['Module', 'Instances', metric], tree.by_module(metric)[:parsed_args.n])
+    else:
+        other = UtilizationTree.load(find_report(parsed_args.other))
+        rows = [(path, module, va, vb, vb - va) for path, module, va, vb in tree.diff(other, metric, parsed_args.n)]
+        print_table(['Instance', 'Module', 'baseline', 'other', 'delta'], rows)
+        a, b = tree.metric(metric)[0].item(), other.metric(metric)[0].item()
+        print(f'Total {metric}: {a:g} -> {b:g} ({b - a:+g})')
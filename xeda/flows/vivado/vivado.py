@@ -3,7 +3,7 @@ import html
 import logging
 from xeda.utils import try_convert
 from xml.etree import ElementTree
-from ..flow import Flow, DebugLevel
+from ..flow import Flow, DebugLevel, open_run_file
 from functools import reduce
 
 logger = logging.getLogger()
@@ -31,12 +31,83 @@ def vivado_gen_convert(k, x, sim):
     return x
 
 
+def iter_report_rows(report_xml, sections=None, keep_indent=False):
+    """
+    Stream the table rows of a Vivado XML report (report_utilization, report_power, ... with -format xml) using iterparse.
+    Elements are discarded as soon as they are processed, so memory usage doesn't depend on the size of the report.
+    Yields (section_path, table_title, header, cells) for each row with cells:
+        section_path: tuple of the titles of the enclosing (nested) sections
+        header: contents of the tableheader cells of the table (seen so far)
+        cells: contents of the tablecell's of the row
+    sections: if specified, only the rows of these section paths are yielded (tuples of section titles, or strings for top-level sections)
+        and parsing stops as soon as all of them were read.
+    keep_indent: keep the leading whitespace of the cells, e.g. the indentation of the instances in hierarchical reports
+    """
+    if sections is not None:
+        sections = {(s,) if isinstance(s, str) else tuple(s) for s in sections}
+        remaining = set(sections)
+
+    def contents(cell):
+        s = cell.get('contents', '')
+        s = html.unescape(s) if '&' in s else s
+        return s.rstrip() if keep_indent else s.strip()
+
+    section_path = []
+    table_title = None
+    header = []
+    wanted = sections is None
+    stack = []  # open elements, except cells which are processed (and discarded) with their row
+    with open_run_file(report_xml, 'rb') as f:
+        for event, elem in ElementTree.iterparse(f, events=('start', 'end')):
+            tag = elem.tag
+            if tag == 'tablecell' or tag == 'tableheader':
+                continue
+            if event == 'start':
+                stack.append(elem)
+                if tag == 'section':
+                    section_path.append(elem.get('title'))
+                    wanted = sections is None or tuple(section_path) in sections
+                elif tag == 'table':
+                    table_title = elem.get('title')
+                    header = []
+                continue
+            stack.pop()
+            if tag == 'tablerow':
+                if wanted:
+                    cells = []
+                    for cell in elem:
+                        if cell.tag == 'tablecell':
+                            cells.append(contents(cell))
+                        elif cell.tag == 'tableheader':
+                            header.append(contents(cell))
+                    if cells:
+                        yield tuple(section_path), table_title, header, cells
+            elif tag == 'section':
+                if sections is not None:
+                    remaining.discard(tuple(section_path))
+                    if not remaining:
+                        return
+                section_path.pop()
+                wanted = sections is None or tuple(section_path) in sections
+            # discard processed elements
+            if stack and tag in ('tablerow', 'table', 'section'):
+                stack[-1].remove(elem)
+
+
 def vivado_generics(kvdict, sim):
     return ' '.join([f"-generic{'_top' if sim else ''} {k}={vivado_gen_convert(k, v, sim)}" for k, v in kvdict.items() if supported_vivado_generic(k, v, sim)])
 
 
 class Vivado(Flow):
     reports_subdir_name = 'reports'
+    version_command = ['vivado', '-version']
+
+    def abort_conditions(self):
+        patterns, max_errors, max_critical_warnings = super().abort_conditions()
+        # the run is going to fail at the end of the current step anyway
+        if max_critical_warnings is None and self.settings.flow.get('fail_critical_warning'):
+            max_critical_warnings = 1
+        return patterns, max_errors, max_critical_warnings
 
     def run_vivado(self, script_path, stdout_logfile=None):
         if stdout_logfile is None:
@@ -50,29 +121,20 @@ class Vivado(Flow):
                                 stdout_logfile=stdout_logfile)
 
     @staticmethod
-    def parse_xml_report(report_xml):
-        tree = ElementTree.parse(report_xml)
-
+    def parse_xml_report(report_xml, sections=None):
+        """
+        {section_title[:table_title]: {row key (first cell): {column header: value}}} of the tables of the top-level sections
+        sections: only parse these top-level sections (see iter_report_rows)
+        """
         data = {}
-        # components = {}
-
-        for section in tree.findall(f"./section"):
-            section_title = section.get("title")
-            for table in section.findall("./table"):
-                table_data = {}
-                header = [html.unescape(col.attrib['contents']).strip() for col in table.findall("./tablerow/tableheader")]
-                for tablerow in table.findall("./tablerow"):
-                    cells = [html.unescape(cell.attrib['contents']).strip() for cell in tablerow.findall("./tablecell")]
-                    if cells:
-                        # choose 0th element as "index data" (distinct key)
-                        cell_data = {h:c for h,c in zip(header[1:],cells[1:]) if c}
-                        cell_key = cells[0]
-                        if cell_data:
-                            table_data[cell_key] = try_convert(cell_data, to_str=False)
-                if table_data:
-                    table_title = table.get("title")
-                    title = section_title + ":" + table_title if table_title else section_title
-                    data[title] = table_data
+        for section_path, table_title, header, cells in iter_report_rows(report_xml, sections):
+            if len(section_path) != 1:
+                continue
+            # choose 0th element as "index data" (distinct key)
+            cell_data = {h: c for h, c in zip(header[1:], cells[1:]) if c}
+            if cell_data:
+                title = section_path[0] + ":" + table_title if table_title else section_path[0]
+                data.setdefault(title, {})[cells[0]] = try_convert(cell_data, to_str=False)
         return data
         
     @staticmethod
@@ -9,14 +9,12 @@ from pathlib import Path
 import re
 from types import SimpleNamespace
 from typing import List
-from xml.etree import ElementTree
-import html
 
 from ..flow import DesignSource, Flow
 from ...flows.settings import Settings
 from .vivado_sim import VivadoPostsynthSim
 from .vivado_synth import VivadoSynth
-from .vivado import Vivado
+from .vivado import Vivado, iter_report_rows
 
 logger = logging.getLogger()
 
@@ -26,6 +24,7 @@ class VivadoPower(Vivado):
     required_settings = {'clock_period'}
 
     default_saif_file = 'impl_timing.saif'
+    artifacts = Vivado.artifacts + ['*.xml']  # power reports of the run configurations
 
     @classmethod
     def prerequisite_flows(cls, flow_settings, _design_settings):
@@ -54,6 +53,14 @@ class VivadoPower(Vivado):
         self.power_report_filename = 'power_impl_timing.xml'
         super().__init__(settings, args, completed_dependencies)
 
+    def consumed_artifacts(self):
+        # the routed checkpoint (a zip archive with embedded timestamps) differs between re-runs even if the design doesn't:
+        # fingerprint the timing netlist and SDF which were written from it instead, along with the switching activity
+        netlist = [Path(str(src)) for src in self.postsynthsim_flow.settings.design['rtl']['sources']]
+        run_configs = self.postsynthsim_settings.get('run_configs') or [dict(saif=self.default_saif_file)]
+        return netlist + self.postsynthsim_flow.consumed_artifacts() + \
+            [self.postsynthsim_flow.flow_run_dir / rc['saif'] for rc in run_configs if rc.get('saif')]
+
     def run(self):
         run_configs = self.postsynthsim_settings.get('run_configs')
 
@@ -78,26 +85,23 @@ class VivadoPower(Vivado):
 
         return self.run_vivado(script_path, stdout_logfile='vivado_postsynth_power_stdout.log')
 
-    def parse_power_report(self, report_xml):
-        tree = ElementTree.parse(report_xml)
+    summary_sections = [('Summary',), ('Summary', 'On-Chip Components')]
 
+    def parse_power_report(self, report_xml):
+        """
+        Summary and on-chip components power. Parsing stops after the Summary section, the rest of the report
+        (e.g. the hierarchical breakdown of `report_power -hier all -verbose`) is not even read.
+        """
         results = {}
         components = {}
 
-        for tablerow in tree.findall("./section[@title='Summary']/table/tablerow"):
-            tablecells = tablerow.findall('tablecell')
-            key, value = (html.unescape(
-                x.attrib['contents']).strip() for x in tablecells)
-            results[key] = value
-
-        for tablerow in tree.findall("./section[@title='Summary']/section[@title='On-Chip Components']/table/tablerow"):
-            tablecells = tablerow.findall('tablecell')
-            if len(tablecells) >= 2:
-                contents = [html.unescape(
-                    x.attrib['contents']).strip() for x in tablecells]
-                key = contents[0]
-                value = contents[1]
-                components[key] = value
+        for section_path, _, _, cells in iter_report_rows(report_xml, self.summary_sections):
+            if len(cells) < 2:
+                continue
+            if section_path == ('Summary',):
+                results[cells[0]] = cells[1]
+            else:
+                components[cells[0]] = cells[1]
         results['Components Power'] = components
 
         return results
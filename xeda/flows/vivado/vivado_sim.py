@@ -3,13 +3,17 @@
 import logging
 import os
 import math
+import re
+import shutil
+from concurrent.futures import ThreadPoolExecutor
 from os.path import join
+from pathlib import Path
 from types import SimpleNamespace
 from typing import List
 
 from pkg_resources import require
 from ...utils import try_convert, unique
-from ..flow import DesignSource, Flow, SimFlow, DebugLevel
+from ..flow import DesignSource, FileResource, Flow, NonZeroExit, SimFlow, DebugLevel
 from ...flows.settings import Settings
 from .vivado_synth import VivadoSynth
 from .vivado import Vivado
@@ -81,9 +85,17 @@ class VivadoSim(Vivado, SimFlow):
         if elab_optimize and elab_optimize not in elab_flags:  # FIXME none of -Ox in elab_flags
             elab_flags.append(elab_optimize)
 
+        analyze_flags = flow_settings.get('analyze_flags', ['-relax'])
+        debug_traces = self.args.debug >= DebugLevel.HIGHEST or self.settings.flow.get('debug_traces')
+
+        parallel_runs = int(flow_settings.get('parallel_runs', 1))
+        shared_elaboration = len(self.elaboration_groups(run_configs)) < len(run_configs)
+        if len(run_configs) > 1 and (parallel_runs > 1 or shared_elaboration):
+            self.analyze_sources(analyze_flags)
+            return self.run_parallel(run_configs, unique(elab_flags), max(1, parallel_runs), debug_traces)
+
         script_path = self.copy_from_template(f'vivado_sim.tcl',
-                                              analyze_flags=' '.join(flow_settings.get(
-                                                  'analyze_flags', ['-relax'])),
+                                              analyze_flags=' '.join(analyze_flags),
                                               elab_flags=' '.join(
                                                   unique(elab_flags)),
                                               run_configs=run_configs,
@@ -94,10 +106,164 @@ class VivadoSim(Vivado, SimFlow):
                                               tb_top=self.tb_top,
                                               lib_name='work',
                                               sim_sources=self.sim_sources,
-                                              debug_traces=self.args.debug >= DebugLevel.HIGHEST or self.settings.flow.get(
-                                                  'debug_traces')
+                                              debug_traces=debug_traces
                                               )
-        return self.run_vivado(script_path)
+        with self.waveform_pipes([rc.get('vcd') for rc in run_configs]):
+            return self.run_vivado(script_path)
+
+    def output_patterns(self) -> List[str]:
+        """also the files written by the testbench, named by file name generics (see `runtime_generics_re`) of the run configurations"""
+        tb_generics = self.settings.design['tb'].get('generics', {})
+        run_configs = self.settings.flow.get('run_configs') or [dict(generics=tb_generics)]
+        runtime_generics_re = self.settings.flow.get('runtime_generics_re', r'^G_FNAME_')
+        outputs = [str(v) for rc in run_configs for k, v in {**tb_generics, **rc.get('generics', {})}.items()
+                   if isinstance(v, str) and not os.path.isabs(v) and re.match(runtime_generics_re, k)]
+        return super().output_patterns() + unique(outputs)
+
+    def is_runtime_generic(self, name, value) -> bool:
+        """
+        Generics which are file names (FileResource values or names matching flow setting `runtime_generics_re`, default: '^G_FNAME_')
+        can be bound at simulation time, see run_parallel. Only used when flow setting `share_elaboration` is true (default: false).
+        """
+        if not self.settings.flow.get('share_elaboration', False):
+            return False
+        return isinstance(value, FileResource) or bool(re.match(self.settings.flow.get('runtime_generics_re', r'^G_FNAME_'), name))
+
+    def elaboration_groups(self, run_configs) -> List[List[dict]]:
+        """group run configurations which only differ in the values of their runtime generics"""
+        groups = {}
+        for rc in run_configs:
+            generics = rc.get('generics', {})
+            key = tuple(sorted((k, str(v) if not self.is_runtime_generic(k, v) else None) for k, v in generics.items()))
+            groups.setdefault(key, []).append(rc)
+        return list(groups.values())
+
+    def run_parallel(self, run_configs, elab_flags, max_parallel, debug_traces):
+        """
+        Elaborate and simulate run configurations in their own xelab and xsim processes, with up to `max_parallel` processes running concurrently.
+        Sources should already be analyzed.
+        Every configuration gets its own xsim batch script, logs, and SAIF/VCD files.
+
+        With flow setting `share_elaboration`, run configurations which only differ in runtime generics (see is_runtime_generic) share a single snapshot,
+        elaborated with each runtime generic set to its own name (e.g. G_FNAME_PDI="G_FNAME_PDI").
+        Each of them is then simulated in its own directory (xsim_<name>), where these names are symbolic links to the actual input files.
+        Output files written under these names are moved back to the paths specified in the generics (relative to flow_run_dir).
+        """
+        saifs = [rc['saif'] for rc in run_configs if rc.get('saif')]
+        for rc in run_configs:
+            if rc.get('saif') and saifs.count(rc['saif']) > 1:
+                rc['saif'] = f"{rc['name']}_{rc['saif']}"
+
+        vhdl_std = self.settings.design.get('language', {}).get('vhdl', {}).get('standard')
+        elab_flags = ' '.join(elab_flags).split() + (['-93_mode'] if vhdl_std == '93' else [])
+        sim_flags = ' '.join(self.settings.flow.get('sim_flags', [])).split()
+
+        elaborations = []  # (snapshot, generics)
+        runs = []  # (run_config, snapshot, runtime generics)
+        for group in self.elaboration_groups(run_configs):
+            if len(group) == 1:
+                rc = group[0]
+                snapshot = f"{self.tb_top}_{rc['name']}"
+                elaborations.append((snapshot, rc['generics']))
+                runs.append((rc, snapshot, {}))
+            else:
+                snapshot = f"{self.tb_top}_shared_{group[0]['name']}"
+                generics = {k: (k if self.is_runtime_generic(k, v) else v) for k, v in group[0]['generics'].items()}
+                elaborations.append((snapshot, generics))
+                for rc in group:
+                    runs.append((rc, snapshot, {k: v for k, v in rc['generics'].items() if self.is_runtime_generic(k, v)}))
+                logger.info(f"Run configurations {', '.join(rc['name'] for rc in group)} share the elaborated snapshot {snapshot}")
+
+        def elaborate(snapshot, generics):
+            generics = [f'-generic_top {k}={v}' for k, v in generics.items()]
+            self.run_process('xelab', ['-s', snapshot, '-L', 'work'] + elab_flags + ['-log', f'xelab_{snapshot}.log'] +
+                             ' '.join(generics).split() + [f'work.{top}' for top in self.sim_tops],
+                             stdout_logfile=f'xelab_{snapshot}_stdout.log', check=True)
+
+        def simulate(rc, snapshot, runtime_generics):
+            name = rc['name']
+            cwd = self.flow_run_dir
+            if runtime_generics:
+                cwd = self.flow_run_dir / f'xsim_{name}'
+                cwd.mkdir(exist_ok=True)
+                if not (cwd / 'xsim.dir').exists():
+                    (cwd / 'xsim.dir').symlink_to(self.flow_run_dir / 'xsim.dir', target_is_directory=True)
+                for k, v in runtime_generics.items():
+                    link = cwd / k
+                    if link.is_symlink() or link.exists():
+                        link.unlink()
+                    target = v.file if isinstance(v, FileResource) else self.flow_run_dir / str(v)
+                    if target.exists():
+                        link.symlink_to(target)
+                # SAIF and VCD files stay in flow_run_dir
+                rc = dict(rc, **{k: str(self.flow_run_dir / rc[k]) for k in ('saif', 'vcd') if rc.get(k)})
+            script = self.copy_from_template('xsim_batch.tcl', script_filename=f"xsim_{name}.tcl",
+                                             rc=rc, snapshot_name=snapshot, tb_top=self.tb_top, debug_traces=debug_traces)
+            try:
+                with self.waveform_pipes([rc.get('vcd')]):
+                    self.run_process('xsim', [snapshot, '-tclbatch', self.flow_run_dir / script, '-log', self.flow_run_dir / f'xsim_{name}.log'] + sim_flags,
+                                     stdout_logfile=f'xsim_{name}_stdout.log', check=True, cwd=cwd)
+            finally:
+                for k, v in runtime_generics.items():
+                    output = cwd / k
+                    if output.is_file() and not output.is_symlink() and not isinstance(v, FileResource):
+                        shutil.move(str(output), str(self.flow_run_dir / str(v)))
+
+        logger.info(f"Running {len(run_configs)} run configurations ({len(elaborations)} elaborations), up to {max_parallel} in parallel")
+        run_results = {}
+        with ThreadPoolExecutor(max_workers=max_parallel) as executor:
+            elab_futures = {snapshot: executor.submit(elaborate, snapshot, generics) for snapshot, generics in elaborations}
+            elab_errors = {}
+            for snapshot, future in elab_futures.items():
+                try:
+                    future.result()
+                except Exception as e:
+                    logger.critical(f"Elaboration of {snapshot} failed: {e}")
+                    elab_errors[snapshot] = e
+            futures = {rc['name']: executor.submit(simulate, rc, snapshot, runtime_generics)
+                       for rc, snapshot, runtime_generics in runs if snapshot not in elab_errors}
+            for rc, snapshot, _ in runs:
+                name = rc['name']
+                try:
+                    if snapshot in elab_errors:
+                        raise elab_errors[snapshot]
+                    futures[name].result()
+                    run_results[name] = dict(success=True, snapshot=snapshot, log=f'xsim_{name}.log')
+                except Exception as e:
+                    logger.critical(f"Run configuration {name} failed: {e}")
+                    run_results[name] = dict(success=False, snapshot=snapshot, log=f'xsim_{name}.log', error=str(e))
+        self.results['run_configs'] = run_results
+        failed = [name for name, r in run_results.items() if not r['success']]
+        if failed:
+            raise NonZeroExit(f"{len(failed)} of {len(run_configs)} run configurations failed: {', '.join(failed)}")
+
+    def analyze_sources(self, analyze_flags):
+        """
+        Analyze sources outside of Vivado, in the order of sim_sources, with one xvhdl/xvlog process for each run of consecutive sources of
+        the same language. Processes are never run concurrently: they all write to the same library (xsim.dir/work), whose index doesn't
+        support concurrent writers.
+        """
+        vhdl_std = self.settings.design.get('language', {}).get('vhdl', {}).get('standard')
+        vhdl_flags = ['-2008'] if vhdl_std == '08' else ['-93_mode'] if vhdl_std == '93' else []
+        flags = ['-work', 'work'] + (['-verbose', '2'] if self.args.debug else []) + ' '.join(analyze_flags).split()
+
+        shutil.rmtree(self.flow_run_dir / 'xsim.dir', ignore_errors=True)
+
+        batches = []  # [(prog, extra flags), [files]]
+        for src in self.sim_sources:
+            if src.type == 'vhdl':
+                key = ('xvhdl', vhdl_flags)
+            elif src.type == 'verilog':
+                key = ('xvlog', ['-sv'] if src.variant == 'systemverilog' else [])
+            else:
+                continue
+            if batches and batches[-1][0] == key:
+                batches[-1][1].append(str(src.file))
+            else:
+                batches.append((key, [str(src.file)]))
+        logger.info(f"Analyzing {sum(len(files) for _, files in batches)} source(s) in {len(batches)} batch(es)")
+        for i, ((prog, extra_flags), files) in enumerate(batches):
+            self.run_process(prog, flags + extra_flags + files, stdout_logfile=f'{prog}_{i}.log', check=True)
 
 
 class VivadoPostsynthSim(VivadoSim):
@@ -164,3 +330,8 @@ class VivadoPostsynthSim(VivadoSim):
                                        '-pulse_r 0', '-pulse_int_r 0', '-pulse_e 0', '-pulse_int_e 0']
 
         VivadoSim.__init__(self, settings, args, completed_dependencies)
+
+    def consumed_artifacts(self):
+        # the netlist is a design source, i.e. already hashed by content
+        sdf = self.settings.flow.get('sdf')
+        return [Path(str(sdf['file'] if isinstance(sdf, dict) else sdf))] if sdf else []
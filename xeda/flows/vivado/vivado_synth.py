@@ -6,7 +6,10 @@ from collections import abc
 import copy
 import logging
 from typing import Union
-from ..flow import SynthFlow
+from xml.etree import ElementTree
+from ..flow import SynthFlow, run_file_exists
+from .timing import TIMING_PATHS, TIMING_REPORT, save_timing_paths
+from .utilization import HIER_UTILIZATION, HIER_UTILIZATION_XML, UtilizationTree
 from .vivado import Vivado, vivado_generics
 
 logger = logging.getLogger()
@@ -21,6 +24,7 @@ class VivadoSynth(Vivado, SynthFlow):
 
     synth_output_dir = 'output'
     checkpoints_dir = 'checkpoints'
+    artifacts = Vivado.artifacts + [f'{checkpoints_dir}/*.dcp', f'{synth_output_dir}/*']
 
     # see https://www.xilinx.com/support/documentation/sw_manuals/xilinx2020_1/ug904-vivado-implementation.pdf
     # and https://www.xilinx.com/support/documentation/sw_manuals/xilinx2020_1/ug901-vivado-synthesis.pdf
@@ -362,6 +366,20 @@ class VivadoSynth(Vivado, SynthFlow):
 
         self.results['_utilization'] = utilization
 
+        hier_report = reports_dir / HIER_UTILIZATION_XML
+        if run_file_exists(hier_report):
+            try:
+                UtilizationTree.from_xml(hier_report).save(reports_dir / HIER_UTILIZATION)
+            except (ElementTree.ParseError, ValueError, OSError) as e:
+                logger.warning(f"Failed to parse {hier_report}: {e}")
+
+        timing_report = reports_dir / TIMING_REPORT
+        if run_file_exists(timing_report):
+            try:
+                save_timing_paths(timing_report, reports_dir / TIMING_PATHS)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Failed to parse {timing_report}: {e}")
+
         if not failed:
             for res in self.blacklisted_resources:
                 res_util = self.results.get(res)
@@ -0,0 +1,572 @@
+# © 2020 [Kamyar Mohajerani](mailto:kamyar@ieee.org)
+
+"""
+Waveform (VCD) post-processing and streaming access.
+
+WaveformPipe: simulators write their VCD dump into a named pipe, which is converted on the fly to
+    FST (using `vcd2fst` from GTKWave) or to a gzip-compressed VCD, so the raw dump never touches the disk.
+VcdReader: streaming reader of VCD files (plain, gzip-compressed, or FST through `fst2vcd`) which never loads the whole dump into memory.
+switching_activity/vcd_to_saif: per-net toggle counts and T0/T1/TX durations of a VCD dump, written as SAIF (e.g. for vivado_power.tcl).
+"""
+
+import errno
+import gzip
+import io
+import logging
+import os
+import re
+import shutil
+import subprocess
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger()
+
+WAVEFORM_FORMATS = ('fst', 'gzip')
+
+
+def compressed_path(vcd_path, fmt: str) -> Path:
+    vcd_path = Path(vcd_path)
+    if fmt == 'fst':
+        return vcd_path.with_suffix('.fst')
+    return vcd_path.with_name(vcd_path.name + '.gz')
+
+
+class WaveformPipe:
+    """
+    Replace `vcd_path` by a named pipe (FIFO) while the simulator is running and convert its content on the fly.
+        fmt: 'fst' (requires vcd2fst, falls back to 'gzip' if not found) or 'gzip'
+        chunk_size: (gzip only) uncompressed size of each gzip member, a truncated output is readable up to its last complete member
+
+    Usage:
+        with WaveformPipe(flow_run_dir / 'dump.vcd', 'fst'):
+            run_simulator()
+    """
+
+    def __init__(self, vcd_path, fmt: str = 'fst', chunk_size: int = 64 << 20) -> None:
+        assert fmt in WAVEFORM_FORMATS, f"waveform format should be one of {WAVEFORM_FORMATS}"
+        self.vcd_path = Path(vcd_path)
+        self.fmt = fmt
+        if fmt == 'fst' and not shutil.which('vcd2fst'):
+            logger.warning("vcd2fst was not found in PATH. Compressing VCD using gzip instead.")
+            self.fmt = 'gzip'
+        self.output_path = compressed_path(self.vcd_path, self.fmt)
+        self.chunk_size = chunk_size
+        self.proc: Optional[subprocess.Popen] = None
+        self.thread: Optional[threading.Thread] = None
+        self.error = None
+        self.bytes_in = 0
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.finish()
+
+    def start(self):
+        if self.vcd_path.exists() or self.vcd_path.is_symlink():
+            self.vcd_path.unlink()
+        os.mkfifo(self.vcd_path)
+        logger.info(f"Streaming VCD dump {self.vcd_path} to {self.output_path}")
+        if self.fmt == 'fst':
+            self.proc = subprocess.Popen(['vcd2fst', str(self.vcd_path), str(self.output_path)],
+                                         stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        else:
+            self.thread = threading.Thread(target=self._gzip, name=f'vcd-gzip-{self.vcd_path.name}', daemon=True)
+            self.thread.start()
+
+    def _gzip(self):
+        try:
+            with open(self.vcd_path, 'rb') as fifo, open(self.output_path, 'wb') as out:
+                while True:
+                    # every chunk is a separate gzip member
+                    remaining = self.chunk_size
+                    with gzip.GzipFile(fileobj=out, mode='wb', compresslevel=6) as gz:
+                        while remaining > 0:
+                            data = fifo.read(min(1 << 20, remaining))
+                            if not data:
+                                return
+                            gz.write(data)
+                            remaining -= len(data)
+                            self.bytes_in += len(data)
+        except Exception as e:
+            self.error = e
+
+    def _converter_running(self) -> bool:
+        if self.proc:
+            return self.proc.poll() is None
+        return self.thread is not None and self.thread.is_alive()
+
+    def _release_reader(self):
+        """
+        If the simulator never opened the pipe, the converter is blocked on opening it (or has not opened it yet).
+        Unblock it by briefly opening and closing the write-end, which results in an empty dump.
+        """
+        while self._converter_running():
+            try:
+                fd = os.open(self.vcd_path, os.O_WRONLY | os.O_NONBLOCK)
+                os.close(fd)
+                return
+            except OSError as e:
+                if e.errno != errno.ENXIO:  # ENXIO: no reader (yet)
+                    logger.debug(f"releasing {self.vcd_path}: {e}")
+                    return
+                time.sleep(0.05)
+
+    def finish(self):
+        self._release_reader()
+        if self.proc:
+            _, stderr = self.proc.communicate()
+            if self.proc.returncode != 0:
+                self.error = f"vcd2fst exited with returncode {self.proc.returncode}: {stderr.decode(errors='replace').strip()}"
+        if self.thread:
+            self.thread.join()
+        try:
+            self.vcd_path.unlink()
+        except OSError:
+            pass
+        if self.error:
+            logger.error(f"Waveform conversion of {self.vcd_path} failed: {self.error}")
+        elif self.output_path.exists():
+            size_info = f" ({self.bytes_in} bytes of VCD compressed to {self.output_path.stat().st_size} bytes)" if self.bytes_in else ""
+            logger.info(f"Waveform written to {self.output_path}{size_info}")
+
+
+class WaveformPipes:
+    """WaveformPipe for multiple VCD files, e.g. one per run configuration"""
+
+    def __init__(self, vcd_paths, fmt: str = 'fst') -> None:
+        self.pipes = [WaveformPipe(p, fmt) for p in vcd_paths if p]
+
+    def __enter__(self):
+        for p in self.pipes:
+            p.start()
+        return self
+
+    def __exit__(self, *args):
+        for p in self.pipes:
+            p.finish()
+
+
+class VcdSignal:
+    def __init__(self, id: str, name: str, width: int, var_type: str) -> None:
+        self.id = id
+        self.name = name  # hierarchical name, with '/' separated scopes
+        self.width = width
+        self.var_type = var_type
+
+    def __repr__(self) -> str:
+        return f'VcdSignal({self.name}[{self.width}] id={self.id})'
+
+
+class VcdReader:
+    """
+    Streaming reader of Value Change Dump files (.vcd, .vcd.gz, or .fst through `fst2vcd`)
+
+    The header is parsed on construction:
+        timescale: (magnitude, unit) e.g. (1, 'ps')
+        signals: {id_code: [VcdSignal, ...]} (a single id_code can be shared by several signals)
+    Iterating over the reader yields value changes (time, id_code, value) in dump order.
+    Values are strings: '0', '1', 'x', 'z' for scalars, binary digits (without the leading 'b') for vectors, and the number for reals.
+    """
+
+    def __init__(self, path) -> None:
+        self.path = Path(path)
+        self.proc = None
+        if self.path.suffix == '.fst':
+            self.proc = subprocess.Popen(['fst2vcd', str(self.path)], stdout=subprocess.PIPE)
+            self.file = io.TextIOWrapper(self.proc.stdout, encoding='utf-8', errors='replace')
+        elif self.path.suffix == '.gz':
+            self.file = gzip.open(self.path, 'rt', encoding='utf-8', errors='replace')
+        else:
+            self.file = open(self.path, encoding='utf-8', errors='replace')
+        self.timescale: Tuple[int, str] = (1, 's')
+        self.signals: Dict[str, List[VcdSignal]] = {}
+        self.end_time = 0
+        self._parse_header()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self.file.close()
+        if self.proc:
+            self.proc.kill()
+            self.proc.wait()
+
+    def _tokens(self) -> Iterator[str]:
+        for line in self.file:
+            yield from line.split()
+
+    def _parse_header(self):
+        scopes = []
+        tokens = self._tokens()
+        for tok in tokens:
+            if tok == '$scope':
+                _, name = next(tokens), next(tokens)
+                scopes.append(name)
+                self._skip_to_end(tokens)
+            elif tok == '$upscope':
+                scopes.pop()
+                self._skip_to_end(tokens)
+            elif tok == '$var':
+                var_type, width, id_code, ref = next(tokens), next(tokens), next(tokens), next(tokens)
+                rest = self._skip_to_end(tokens)
+                if rest and rest[0].startswith('['):  # bit range as a separate token
+                    ref += rest[0]
+                name = '/'.join(scopes + [ref])
+                self.signals.setdefault(id_code, []).append(VcdSignal(id_code, name, int(width), var_type))
+            elif tok == '$timescale':
+                ts = ''.join(self._skip_to_end(tokens))
+                digits = ''.join(c for c in ts if c.isdigit())
+                self.timescale = (int(digits or 1), ts[len(digits):] or 's')
+            elif tok == '$enddefinitions':
+                self._skip_to_end(tokens)
+                break
+            elif tok.startswith('$'):
+                self._skip_to_end(tokens)
+        self._body_tokens = tokens
+
+    @staticmethod
+    def _skip_to_end(tokens) -> List[str]:
+        content = []
+        for tok in tokens:
+            if tok == '$end':
+                break
+            content.append(tok)
+        return content
+
+    def __iter__(self) -> Iterator[Tuple[int, str, str]]:
+        for time, id_code, value in _value_changes(self._body_tokens):
+            self.end_time = time
+            if id_code is not None:
+                yield time, id_code, value
+
+    @staticmethod
+    def body_offset(path) -> int:
+        """byte offset of the first value change section (after `$enddefinitions $end`) of an uncompressed VCD file"""
+        with open(path, 'rb') as f:
+            data = b''
+            offset = 0
+            while True:
+                chunk = f.read(1 << 20)
+                if not chunk:
+                    raise ValueError(f"{path} is not a valid VCD file: $enddefinitions not found")
+                data += chunk
+                i = data.find(b'$enddefinitions')
+                if i >= 0:
+                    j = data.find(b'$end', i + len(b'$enddefinitions'))
+                    if j >= 0:
+                        return offset + j + len(b'$end')
+                # keep the tail, in case the keywords are split between chunks
+                offset += max(0, len(data) - 64)
+                data = data[-64:]
+
+
+def _value_changes(tokens: Iterator[str], time: int = 0) -> Iterator[Tuple[int, Optional[str], Optional[str]]]:
+    """(time, id_code, value) from tokens of the body of a VCD. Timestamps are yielded as (time, None, None)."""
+    for tok in tokens:
+        c = tok[0]
+        if c == '#':
+            time = int(tok[1:])
+            yield time, None, None
+        elif c in '01xXzZ':
+            yield time, tok[1:], c.lower()
+        elif c in 'bBrR':
+            yield time, next(tokens), tok[1:].lower()
+        elif tok in ('$dumpvars', '$dumpall', '$dumpon', '$dumpoff', '$end'):
+            continue
+        elif c == '$':  # e.g. $comment
+            VcdReader._skip_to_end(tokens)
+
+
+# Switching activity (SAIF)
+
+_STATES = {'0': 0, '1': 1}  # anything else is 'X' (2)
+_NON_LOGIC_TYPES = ('real', 'realtime', 'event', 'string', 'parameter')
+_vector_name_re = re.compile(r'^(.*)\[(-?\d+):(-?\d+)\]$')
+
+
+def bit_channels(signals: Dict[str, List[VcdSignal]]):
+    """
+    Assign a channel (index) to every bit of every logic signal.
+    Returns (id_channels, nets) where id_channels: {id_code: (first_channel, width)} and nets: [(hierarchical bit name, channel)]
+    """
+    id_channels = {}
+    nets = []
+    n = 0
+    for id_code, sigs in signals.items():
+        sigs = [sig for sig in sigs if sig.var_type not in _NON_LOGIC_TYPES]
+        if not sigs:
+            continue
+        width = sigs[0].width
+        id_channels[id_code] = (n, width)
+        for sig in sigs:
+            if width == 1:
+                nets.append((sig.name, n))
+                continue
+            match = _vector_name_re.match(sig.name)
+            if match:
+                name, msb, lsb = match.group(1), int(match.group(2)), int(match.group(3))
+            else:
+                name, msb, lsb = sig.name, width - 1, 0
+            for i in range(width):
+                nets.append((f'{name}[{lsb + i if msb >= lsb else lsb - i}]', n + i))
+        n += width
+    return id_channels, nets
+
+
+class _ActivityWindow:
+    """
+    Accumulates per-channel state durations (T0, T1, TX) and toggle counts (TC) over a window of time.
+    Value changes are buffered and processed in NumPy batches.
+    The state of each channel before its first change in the window is unknown, see SwitchingActivity.merge.
+    """
+
+    def __init__(self, n_channels: int, start_time: int = 0, batch_size: int = 1 << 20) -> None:
+        self.n = n_channels
+        self.start_time = start_time
+        self.end_time = start_time
+        self.batch_size = batch_size
+        self.t = np.zeros(3 * n_channels, dtype=np.int64)  # index: 3 * channel + state
+        self.tc = np.zeros(n_channels, dtype=np.int64)
+        self.first_time = np.full(n_channels, -1, dtype=np.int64)
+        self.first_state = np.full(n_channels, 2, dtype=np.int8)
+        self.last_time = np.zeros(n_channels, dtype=np.int64)
+        self.last_state = np.full(n_channels, 2, dtype=np.int8)
+        self._times = []
+        self._channels = []
+        self._states = []
+        self._last_values = {}
+
+    def add(self, time: int, id_code: str, value: str, id_channels):
+        ch = id_channels.get(id_code)
+        if ch is None:
+            return
+        base, width = ch
+        if width == 1:
+            self._times.append(time)
+            self._channels.append(base)
+            self._states.append(_STATES.get(value, 2))
+        else:
+            if len(value) < width:
+                value = (value[0] if value[0] in 'xz' else '0') * (width - len(value)) + value
+            last = self._last_values.get(id_code)
+            self._last_values[id_code] = value
+            for j, v in enumerate(value):
+                if last is None or last[j] != v:
+                    self._times.append(time)
+                    self._channels.append(base + width - 1 - j)
+                    self._states.append(_STATES.get(v, 2))
+        if len(self._times) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self._times:
+            return
+        times = np.array(self._times, dtype=np.int64)
+        channels = np.array(self._channels, dtype=np.int64)
+        states = np.array(self._states, dtype=np.int8)
+        self._times, self._channels, self._states = [], [], []
+
+        order = np.argsort(channels, kind='stable')  # changes of each channel stay in time order
+        c, t, s = channels[order], times[order], states[order]
+        first_in_batch = np.ones(len(c), dtype=bool)
+        first_in_batch[1:] = c[1:] != c[:-1]
+        fi = np.nonzero(first_in_batch)[0]
+        li = np.append(fi[1:] - 1, len(c) - 1)
+
+        prev_t = np.empty_like(t)
+        prev_t[1:] = t[:-1]
+        prev_s = np.empty_like(s)
+        prev_s[1:] = s[:-1]
+        prev_t[fi] = self.last_time[c[fi]]
+        prev_s[fi] = self.last_state[c[fi]]
+
+        # the first change of a channel in the window starts its first known interval
+        valid = np.ones(len(c), dtype=bool)
+        new = fi[self.first_time[c[fi]] < 0]
+        valid[new] = False
+        self.first_time[c[new]] = t[new]
+        self.first_state[c[new]] = s[new]
+
+        cv, sv, psv = c[valid], s[valid], prev_s[valid]
+        self.t += np.bincount(3 * cv + psv, weights=t[valid] - prev_t[valid], minlength=3 * self.n).astype(np.int64)
+        toggles = (psv != sv) & (psv < 2) & (sv < 2)
+        self.tc += np.bincount(cv[toggles], minlength=self.n)
+
+        self.last_time[c[li]] = t[li]
+        self.last_state[c[li]] = s[li]
+
+    def close(self, end_time: int):
+        """flush and account for the intervals from the last change of each channel until end_time"""
+        self.flush()
+        self.end_time = end_time
+        seen = np.nonzero(self.first_time >= 0)[0]
+        np.add.at(self.t, 3 * seen + self.last_state[seen], end_time - self.last_time[seen])
+        return self
+
+
+class SwitchingActivity:
+    """
+    Per-net switching activity of a simulation:
+        T0, T1, TX: total time spent at logic 0, 1, and unknown (X/Z or before the first assignment)
+        TC: number of 0->1 and 1->0 transitions
+    Times are in units of `timescale`.
+    """
+
+    def __init__(self, nets, t, tc, duration: int, timescale: Tuple[int, str]) -> None:
+        self.nets = nets  # [(hierarchical name, channel)]
+        self.t = t.reshape(-1, 3)  # [channel, state]
+        self.tc = tc
+        self.duration = duration
+        self.timescale = timescale
+
+    @classmethod
+    def merge(cls, nets, windows: List[_ActivityWindow], timescale) -> 'SwitchingActivity':
+        """combine consecutive windows, resolving the unknown initial state of each window from the previous ones"""
+        n = len(windows[0].tc) if windows else 0
+        t = np.zeros(3 * n, dtype=np.int64)
+        tc = np.zeros(n, dtype=np.int64)
+        carry = np.full(n, 2, dtype=np.int64)
+        start = windows[0].start_time if windows else 0
+        for w in windows:
+            t += w.t
+            tc += w.tc
+            seen = w.first_time >= 0
+            idx = np.nonzero(seen)[0]
+            np.add.at(t, 3 * idx + carry[idx], w.first_time[idx] - w.start_time)
+            fs = w.first_state[idx].astype(np.int64)
+            tc[idx] += ((carry[idx] != fs) & (carry[idx] < 2) & (fs < 2))
+            idx = np.nonzero(~seen)[0]
+            np.add.at(t, 3 * idx + carry[idx], w.end_time - w.start_time)
+            carry[seen] = w.last_state[seen]
+        end = windows[-1].end_time if windows else 0
+        return cls(nets, t, tc, end - start, timescale)
+
+    def __getitem__(self, net_name):
+        for name, ch in self.nets:
+            if name == net_name:
+                t0, t1, tx = self.t[ch]
+                return dict(T0=int(t0), T1=int(t1), TX=int(tx), TC=int(self.tc[ch]))
+        raise KeyError(net_name)
+
+    def write_saif(self, path, design: str = ''):
+        """write a SAIF 2.0 (backward) file with one INSTANCE per VCD scope"""
+        tree = {}
+        for name, ch in self.nets:
+            *scopes, net = name.split('/')
+            node = tree
+            for scope in scopes:
+                node = node.setdefault(scope, {})
+            node.setdefault(None, []).append((net, ch))
+
+        def escape(name):
+            return re.sub(r'([\[\]\(\)/\\.:])', r'\\\1', name)
+
+        def write_instance(f, name, node, indent):
+            f.write(f'{indent}(INSTANCE {escape(name)}\n')
+            nets = node.get(None)
+            if nets:
+                f.write(f'{indent}  (NET\n')
+                for net, ch in nets:
+                    t0, t1, tx = self.t[ch]
+                    f.write(f'{indent}    ({escape(net)}\n{indent}      (T0 {t0}) (T1 {t1}) (TX {tx})\n'
+                            f'{indent}      (TC {self.tc[ch]}) (IG 0)\n{indent}    )\n')
+                f.write(f'{indent}  )\n')
+            for child, child_node in node.items():
+                if child is not None:
+                    write_instance(f, child, child_node, indent + '  ')
+            f.write(f'{indent})\n')
+
+        with open(path, 'w') as f:
+            f.write('(SAIFILE\n(SAIFVERSION "2.0")\n(DIRECTION "backward")\n')
+            f.write(f'(DESIGN {design})\n(DATE "{datetime.now().strftime("%a %b %d %H:%M:%S %Y")}")\n')
+            f.write('(VENDOR "xeda")\n(PROGRAM_NAME "xeda")\n(VERSION "1.0")\n(DIVIDER / )\n')
+            f.write(f'(TIMESCALE {self.timescale[0]} {self.timescale[1]})\n(DURATION {self.duration})\n')
+            for name, node in tree.items():
+                if name is not None:
+                    write_instance(f, name, node, '')
+            f.write(')\n')
+
+
+def _window_activity(path, start: int, end: int, first: bool, id_channels, n_channels: int, batch_size: int) -> Optional[_ActivityWindow]:
+    """
+    Switching activity of the part of an uncompressed VCD file between byte offsets `start` and `end`.
+    The window starts at the first timestamp line beginning at or after `start` (or at `start` for the first window),
+    and ends right before the first timestamp line beginning at or after `end`, so consecutive windows cover the whole dump.
+    Returns None if no timestamp starts inside [start, end).
+    """
+    with open(path, 'rb') as f:
+        f.seek(start - 1 if not first else start)
+        pos = start - 1 if not first else start
+        if not first:
+            pos += len(f.readline())  # the partial line belongs to the previous window
+        window = None
+        time = 0
+        for line in f:
+            line_start = pos
+            pos += len(line)
+            if window is None:
+                if first:
+                    window = _ActivityWindow(n_channels, 0, batch_size)
+                elif line.startswith(b'#'):
+                    if line_start >= end:
+                        return None
+                    time = int(line[1:])
+                    window = _ActivityWindow(n_channels, time, batch_size)
+                    continue
+                else:
+                    continue
+            if line_start >= end and line.startswith(b'#'):
+                return window.close(int(line[1:]))
+            for t, id_code, value in _value_changes(iter(line.decode('latin-1').split()), time):
+                time = t
+                if id_code is not None:
+                    window.add(t, id_code, value, id_channels)
+        return window.close(time) if window else None
+
+
+def switching_activity(vcd_path, jobs: int = 1, batch_size: int = 1 << 20, min_window_size: int = 32 << 20) -> SwitchingActivity:
+    """
+    Compute the switching activity of all logic signals in a VCD dump (.vcd, .vcd.gz, .fst) in a single streaming pass.
+    Uncompressed VCD files larger than `min_window_size` bytes are split into time windows which are processed by `jobs` worker processes.
+    """
+    vcd_path = Path(vcd_path)
+    with VcdReader(vcd_path) as reader:
+        id_channels, nets = bit_channels(reader.signals)
+        n = sum(w for _, w in id_channels.values())
+        timescale = reader.timescale
+        if jobs <= 1 or vcd_path.suffix != '.vcd' or vcd_path.stat().st_size < 2 * min_window_size:
+            window = _ActivityWindow(n, 0, batch_size)
+            for time, id_code, value in reader:
+                window.add(time, id_code, value, id_channels)
+            return SwitchingActivity.merge(nets, [window.close(reader.end_time)], timescale)
+
+    body = VcdReader.body_offset(vcd_path)
+    size = vcd_path.stat().st_size
+    num_windows = max(jobs, min(4 * jobs, (size - body) // min_window_size))
+    bounds = [body + (size - body) * i // num_windows for i in range(num_windows + 1)]
+    logger.info(f"Computing switching activity of {vcd_path} in {num_windows} windows using {jobs} processes")
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        windows = list(executor.map(_window_activity, [vcd_path] * num_windows, bounds[:-1], bounds[1:],
+                                    [i == 0 for i in range(num_windows)], [id_channels] * num_windows,
+                                    [n] * num_windows, [batch_size] * num_windows))
+    return SwitchingActivity.merge(nets, [w for w in windows if w is not None], timescale)
+
+
+def vcd_to_saif(vcd_path, saif_path, jobs: int = 1, design: str = '') -> SwitchingActivity:
+    activity = switching_activity(vcd_path, jobs)
+    activity.write_saif(saif_path, design)
+    logger.info(f"Switching activity of {len(activity.nets)} nets written to {saif_path}")
+    return activity
@@ -64,6 +64,9 @@ def get_board_data(board):
 
 
 class Yosys(SynthFlow):
+    version_command = ['yosys', '-V']
+    artifacts = SynthFlow.artifacts + ['netlist.json', 'yosys_rtl.json']
+
     def run(self):
         flow_settings = self.settings.flow
 
@@ -91,6 +94,8 @@ class Yosys(SynthFlow):
 
 
 class NextPnr(SynthFlow):
+    artifacts = SynthFlow.artifacts + ['config.txt']
+
     @classmethod
     def prerequisite_flows(cls, flow_settings, design_settings):
         board = flow_settings.get('board')
@@ -100,6 +105,9 @@ class NextPnr(SynthFlow):
         fpga_part = board_data['fpga']['part']
         return {Yosys: (dict(fpga=fpga_part, board=board, clock_period=flow_settings.get('clock_period')), {})}
 
+    def consumed_artifacts(self):
+        return [self.completed_dependencies[0].flow_run_dir / 'netlist.json']
+
     def run(self):
         rtl_settings = self.settings.design['rtl']
         flow_settings = self.settings.flow
@@ -157,6 +165,9 @@ class OpenFpgaLoader(SynthFlow):
         assert board, "board not specified!"
         return {NextPnr: (dict(board=board, clock_period=flow_settings.get('clock_period')), {})}
 
+    def consumed_artifacts(self):
+        return [self.completed_dependencies[0].flow_run_dir / 'config.txt']
+
     def run(self):
         board = self.settings.flow['board']
         board_data = get_board_data(board)
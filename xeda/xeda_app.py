@@ -14,7 +14,7 @@ import logging
 import pkg_resources
 
 from .debug import DebugLevel
-from .flow_runner import DefaultRunner, FlowRunner
+from .flow_runner import DefaultRunner, FlowRunner, become_subreaper, nukemall
 import toml
 import json
 import shtab
@@ -296,4 +296,8 @@ class XedaApp:
 
         runner = runner_cls(parsed_args, xeda_project, timestamp)
 
-        runner.launch()
+        become_subreaper()
+        try:
+            runner.launch()
+        finally:
+            nukemall()